@@ -0,0 +1,96 @@
+"""
+Script to give positions of instruments without a symbol their own key.
+
+Positions used to be unique per (user, instrument type, symbol), so every
+symbol-less lot of a type (all of a user's FDs, say) shared one position
+and the last lot's entered price valued all of them. This adds
+positions.instrument_key, widens the unique constraint to include it, and
+moves the transactions of each merged position to one position per
+investment lot (or per instrument name for ledger-only entries). Safe to
+re-run.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+from app import create_app, db
+from app.models import Investment, Position
+from app.utils.ledger import check_positions, get_position, instrument_key, rebuild_position, set_manual_price
+
+app = create_app()
+
+
+def add_key_column():
+    """Add instrument_key and the widened unique constraint. Returns False if already there."""
+    columns = [column['name'] for column in inspect(db.engine).get_columns('positions')]
+    if 'instrument_key' in columns:
+        return False
+
+    table = Position.__table__
+    with db.engine.begin() as conn:
+        if conn.dialect.name != 'sqlite':
+            conn.execute(text("ALTER TABLE positions ADD COLUMN instrument_key VARCHAR(210) NOT NULL DEFAULT ''"))
+            conn.execute(text("ALTER TABLE positions DROP CONSTRAINT uq_positions_user_instrument"))
+            conn.execute(text(
+                "ALTER TABLE positions ADD CONSTRAINT uq_positions_user_instrument "
+                "UNIQUE (user_id, instrument_type, symbol, instrument_key)"
+            ))
+            return True
+
+        # SQLite can't alter a constraint: copy into a new table and swap it in
+        # (the app leaves foreign key enforcement off, so the drop is allowed)
+        create = str(CreateTable(table).compile(conn)).replace('CREATE TABLE positions', 'CREATE TABLE positions_new', 1)
+        conn.exec_driver_sql(create)
+        copied = ', '.join(columns)
+        conn.exec_driver_sql(f"INSERT INTO positions_new ({copied}, instrument_key) SELECT {copied}, '' FROM positions")
+        conn.exec_driver_sql('DROP TABLE positions')
+        conn.exec_driver_sql('ALTER TABLE positions_new RENAME TO positions')
+        for index in table.indexes:
+            conn.execute(CreateIndex(index))
+    return True
+
+
+def split_positions():
+    """Move the transactions of symbol-less positions to keyed positions. Returns positions split."""
+    split = 0
+    for position in Position.query.filter_by(symbol='', instrument_key='').all():
+        targets = {}
+        for txn in position.transactions.all():
+            investment = db.session.get(Investment, txn.investment_id) if txn.investment_id else None
+            name = investment.instrument_name if investment else position.instrument_name
+            key = instrument_key('', name, txn.investment_id)
+            target = get_position(position.user_id, position.instrument_type, '', name, key)
+            txn.position_id = target.id
+            targets[target.id] = target
+            if investment is not None and investment.current_price is not None:
+                set_manual_price(target, investment.current_price, investment.last_updated)
+            elif investment is None and target.manual_price is None:
+                set_manual_price(target, position.manual_price, position.manual_priced_at)
+        db.session.flush()
+        db.session.delete(position)
+        for target in targets.values():
+            rebuild_position(target)
+        split += 1
+    return split
+
+
+with app.app_context():
+    try:
+        if add_key_column():
+            print("✓ Added instrument_key to positions")
+        else:
+            print("✓ positions.instrument_key already exists")
+
+        split = split_positions()
+        db.session.commit()
+        print(f"✓ Split {split} position(s) of instruments without a symbol")
+
+        mismatches = check_positions()
+        if mismatches:
+            print(f"✗ {len(mismatches)} position field(s) differ from a full replay")
+        else:
+            print(f"✓ {Position.query.count()} position snapshot(s) match their ledgers")
+
+        print("\n✅ Database migration completed successfully!")
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Migration failed: {e}")
@@ -0,0 +1,57 @@
+"""
+Script to add the quotes table and point existing stock holdings at it.
+
+Stock symbols on investments are normalized ('tcs' -> 'TCS.NS') so they
+join to their quote, and each symbol's quote is seeded from the most
+recently updated lot price until the next refresh replaces it. Quotes for
+symbols no market-priced lot holds (e.g. mutual-fund scheme codes seeded
+by earlier runs) are removed, since nothing would ever refresh them.
+"""
+from app import create_app, db
+from app.models import Investment, Quote
+from app.utils.price_refresher import MARKET_TYPES
+from app.utils.stock_prices import normalize_symbol
+
+app = create_app()
+
+with app.app_context():
+    try:
+        Quote.__table__.create(db.engine, checkfirst=True)
+        print("✓ quotes table ready")
+        
+        renamed = 0
+        for investment in Investment.query.filter(Investment.instrument_type == 'stock', Investment.symbol.isnot(None)).all():
+            symbol = normalize_symbol(investment.symbol)
+            if symbol and symbol != investment.symbol:
+                investment.symbol = symbol
+                renamed += 1
+        db.session.commit()
+        print(f"✓ Normalized {renamed} stock symbol(s)")
+        
+        seeded = 0
+        lots = Investment.query.filter(
+            Investment.instrument_type.in_(MARKET_TYPES),
+            Investment.symbol.isnot(None), Investment.symbol != '',
+            Investment.current_price.isnot(None)
+        ).order_by(Investment.last_updated).all()
+        latest = {lot.symbol: lot for lot in lots}
+        for symbol, lot in latest.items():
+            if db.session.get(Quote, symbol) is None:
+                updated_at = lot.last_updated or lot.created_at
+                db.session.add(Quote(symbol=symbol, price=lot.current_price, as_of=updated_at.date(), updated_at=updated_at))
+                seeded += 1
+        db.session.commit()
+        print(f"✓ Seeded {seeded} quote(s) from stored lot prices")
+        
+        market_symbols = db.session.query(Investment.symbol).filter(
+            Investment.instrument_type.in_(MARKET_TYPES), Investment.symbol.isnot(None)
+        )
+        removed = Quote.query.filter(Quote.symbol.notin_(market_symbols)).delete(synchronize_session=False)
+        db.session.commit()
+        print(f"✓ Removed {removed} quote(s) for symbols without market prices")
+        
+        print("\n✅ Database migration completed successfully!")
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Migration failed: {e}")
@@ -0,0 +1,46 @@
+"""
+Script to add composite indexes for per-user time-series reads.
+
+Creates the (owner, timestamp) indexes declared on habits, habit_logs,
+diet_entries, investments and investment_transactions, drops the
+single-column investment_transactions.user_id index they replace, and
+refreshes SQLite's planner statistics. Safe to re-run.
+"""
+from sqlalchemy import inspect, text
+
+from app import create_app, db
+from app.models import Habit, HabitLog, DietEntry, Investment, InvestmentTransaction
+
+app = create_app()
+
+with app.app_context():
+    try:
+        existing = {}
+        inspector = inspect(db.engine)
+        for model in (Habit, HabitLog, DietEntry, Investment, InvestmentTransaction):
+            existing[model.__tablename__] = {index['name'] for index in inspector.get_indexes(model.__tablename__)}
+
+        created = 0
+        for model in (Habit, HabitLog, DietEntry, Investment, InvestmentTransaction):
+            for index in model.__table__.indexes:
+                if index.name not in existing[model.__tablename__]:
+                    index.create(db.engine)
+                    created += 1
+                    print(f"✓ Created {index.name}")
+        print(f"✓ {created} index(es) created")
+
+        if 'ix_investment_transactions_user_id' in existing['investment_transactions']:
+            with db.engine.begin() as conn:
+                conn.execute(text('DROP INDEX ix_investment_transactions_user_id'))
+            print("✓ Dropped ix_investment_transactions_user_id (superseded by ix_investment_transactions_user_date)")
+
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.begin() as conn:
+                conn.execute(text('ANALYZE'))
+            print("✓ Updated planner statistics")
+
+        print("\n✅ Database migration completed successfully!")
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Migration failed: {e}")
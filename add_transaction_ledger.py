@@ -0,0 +1,35 @@
+"""
+Script to add the investment ledger tables and migrate existing lots.
+
+Each Investment row becomes a buy transaction on its position (one per
+symbol, or per lot for instruments without one), and position snapshots
+are built from the ledger. Lots already migrated are skipped, so it is
+safe to re-run.
+"""
+from app import create_app, db
+from app.models import InvestmentTransaction, Position
+from app.utils.ledger import check_positions, migrate_investments
+
+app = create_app()
+
+with app.app_context():
+    try:
+        Position.__table__.create(db.engine, checkfirst=True)
+        InvestmentTransaction.__table__.create(db.engine, checkfirst=True)
+        print("✓ positions and investment_transactions tables ready")
+        
+        migrated = migrate_investments()
+        db.session.commit()
+        print(f"✓ Recorded {migrated} investment lot(s) as buy transactions")
+        
+        mismatches = check_positions()
+        if mismatches:
+            print(f"✗ {len(mismatches)} position field(s) differ from a full replay")
+        else:
+            print(f"✓ {Position.query.count()} position snapshot(s) match their ledgers")
+        
+        print("\n✅ Database migration completed successfully!")
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Migration failed: {e}")
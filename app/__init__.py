@@ -6,8 +6,9 @@ from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
 from flask_mail import Mail
 from config import config
+from app.utils.read_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 bcrypt = Bcrypt()
@@ -19,7 +20,9 @@ def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
-    # Initialize extensions
+    # Initialize extensions (the read bind has to be configured before db creates its engines)
+    from app.utils.read_routing import read_router
+    read_router.init_app(app)
     db.init_app(app)
     migrate.init_app(app, db)
     CORS(app)
@@ -34,6 +37,21 @@ def create_app(config_name='default'):
     # Import models
     from app.models import User, Category, Habit, HabitLog, DietEntry, Investment
     
+    from app.utils.principal_cache import principal_cache
+    principal_cache.init_app(app)
+    
+    from app.utils.password_hasher import password_hasher
+    password_hasher.init_app(app)
+    
+    from app.utils.stock_prices import stock_prices
+    stock_prices.init_app(app)
+    
+    from app.utils.portfolio_summary import portfolio_cache
+    portfolio_cache.init_app(app)
+    
+    from app.utils.metrics import metrics
+    metrics.init_app(app)
+    
     @login_manager.user_loader
     def load_user(user_id):
         return User.query.get(int(user_id))
@@ -49,6 +67,10 @@ def create_app(config_name='default'):
     app.register_blueprint(personal_bp, url_prefix='/api/personal')
     app.register_blueprint(finance_bp, url_prefix='/api/finance')
     
+    # After the blueprints, so their views get the SQLITE_BUSY retry
+    from app.utils.sqlite_profile import sqlite_profile
+    sqlite_profile.init_app(app)
+    
     # Root endpoint - serve web UI
     @app.route('/')
     def index():
@@ -21,6 +21,7 @@ class User(db.Model, UserMixin):
     # Relationships
     habits = db.relationship('Habit', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     diet_entries = db.relationship('DietEntry', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    daily_nutrition = db.relationship('DailyNutrition', lazy='dynamic', cascade='all, delete-orphan')
     
     def to_dict(self):
         return {
@@ -55,6 +56,9 @@ class Category(db.Model):
 class Habit(db.Model):
     """Habit tracking model."""
     __tablename__ = 'habits'
+    __table_args__ = (
+        db.Index('ix_habits_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -70,6 +74,10 @@ class Habit(db.Model):
     # Relationship to logs
     logs = db.relationship('HabitLog', backref='habit', lazy='dynamic', cascade='all, delete-orphan')
     
+    # Persisted streak state (see app/utils/streak_state.py)
+    streak = db.relationship('HabitStreak', backref='habit', uselist=False, cascade='all, delete-orphan')
+    streak_runs = db.relationship('HabitStreakRun', lazy='dynamic', cascade='all, delete-orphan')
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -87,6 +95,10 @@ class Habit(db.Model):
 class HabitLog(db.Model):
     """Log entries for habit completion."""
     __tablename__ = 'habit_logs'
+    __table_args__ = (
+        # Covers per-habit date ranges and the grouped streak query (status is read, not filtered)
+        db.Index('ix_habit_logs_habit_completed', 'habit_id', 'completed_at', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), nullable=False)
@@ -104,9 +116,62 @@ class HabitLog(db.Model):
         }
 
 
+class HabitStreak(db.Model):
+    """Streak summary for a habit, updated incrementally as logs change."""
+    __tablename__ = 'habit_streaks'
+    
+    habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), primary_key=True)
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_completed = db.Column(db.Date)  # Most recent completed day
+    last_run_start = db.Column(db.Date)  # First day of the run ending at last_completed
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def current_streak(self, today):
+        """Length of the latest run if it ends today or yesterday, else 0."""
+        if not self.last_completed or (today - self.last_completed).days not in (0, 1):
+            return 0
+        return (self.last_completed - self.last_run_start).days + 1
+    
+    def to_dict(self, today=None):
+        today = today or datetime.utcnow().date()
+        current_streak = self.current_streak(today)
+        return {
+            'current_streak': current_streak,
+            'longest_streak': max(self.longest_streak, current_streak),
+            'last_completed': self.last_completed.isoformat() if self.last_completed else None
+        }
+
+
+class HabitStreakRun(db.Model):
+    """A maximal run of consecutive completed days for a habit."""
+    __tablename__ = 'habit_streak_runs'
+    __table_args__ = (
+        db.Index('ix_habit_streak_runs_habit_start', 'habit_id', 'start_date'),
+        db.Index('ix_habit_streak_runs_habit_end', 'habit_id', 'end_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    
+    @property
+    def length(self):
+        return (self.end_date - self.start_date).days + 1
+
+
 class DietEntry(db.Model):
     """Diet tracking model."""
     __tablename__ = 'diet_entries'
+    __table_args__ = (
+        db.Index('ix_diet_entries_user_consumed', 'user_id', 'consumed_at'),
+    )
+    
+    # Nutrient columns that summaries add up
+    NUTRIENT_FIELDS = (
+        'calories', 'protein', 'carbs', 'fats', 'sugar', 'fiber', 'saturated_fat',
+        'unsaturated_fat', 'calcium', 'iron', 'magnesium', 'sodium', 'potassium'
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -155,9 +220,102 @@ class DietEntry(db.Model):
         }
 
 
+class DailyNutrition(db.Model):
+    """Per-user, per-day nutrient totals kept in step with diet_entries."""
+    __tablename__ = 'daily_nutrition'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    calories = db.Column(db.Integer, nullable=False, default=0)
+    protein = db.Column(db.Float, nullable=False, default=0)
+    carbs = db.Column(db.Float, nullable=False, default=0)
+    fats = db.Column(db.Float, nullable=False, default=0)
+    sugar = db.Column(db.Float, nullable=False, default=0)
+    fiber = db.Column(db.Float, nullable=False, default=0)
+    saturated_fat = db.Column(db.Float, nullable=False, default=0)
+    unsaturated_fat = db.Column(db.Float, nullable=False, default=0)
+    calcium = db.Column(db.Float, nullable=False, default=0)
+    iron = db.Column(db.Float, nullable=False, default=0)
+    magnesium = db.Column(db.Float, nullable=False, default=0)
+    sodium = db.Column(db.Float, nullable=False, default=0)
+    potassium = db.Column(db.Float, nullable=False, default=0)
+
+
+class FoodCatalogItem(db.Model):
+    """Locally known food with per-serving nutrition, used for autocomplete."""
+    __tablename__ = 'food_catalog'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name_key = db.Column(db.String(200), unique=True, nullable=False)  # normalized food name
+    food_name = db.Column(db.String(200), nullable=False)
+    serving_type = db.Column(db.String(100))
+    serving_size = db.Column(db.Float)
+    source = db.Column(db.String(20), nullable=False)  # bundled, history, api
+    times_logged = db.Column(db.Integer, nullable=False, default=0)
+    calories = db.Column(db.Float, nullable=False, default=0)
+    protein = db.Column(db.Float, nullable=False, default=0)
+    carbs = db.Column(db.Float, nullable=False, default=0)
+    fats = db.Column(db.Float, nullable=False, default=0)
+    sugar = db.Column(db.Float, nullable=False, default=0)
+    fiber = db.Column(db.Float, nullable=False, default=0)
+    saturated_fat = db.Column(db.Float, nullable=False, default=0)
+    unsaturated_fat = db.Column(db.Float, nullable=False, default=0)
+    calcium = db.Column(db.Float, nullable=False, default=0)
+    iron = db.Column(db.Float, nullable=False, default=0)
+    magnesium = db.Column(db.Float, nullable=False, default=0)
+    sodium = db.Column(db.Float, nullable=False, default=0)
+    potassium = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class PriceBar(db.Model):
+    """Daily OHLC bar for a market symbol; rows are only ever appended."""
+    __tablename__ = 'price_bars'
+    
+    symbol = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    open = db.Column(db.Float)
+    high = db.Column(db.Float)
+    low = db.Column(db.Float)
+    close = db.Column(db.Float, nullable=False)
+    volume = db.Column(db.BigInteger)
+
+
+class PriceCoverage(db.Model):
+    """Contiguous calendar range of a symbol whose bars are stored in price_bars."""
+    __tablename__ = 'price_coverage'
+    
+    symbol = db.Column(db.String(50), primary_key=True)
+    first_day = db.Column(db.Date, nullable=False)
+    last_day = db.Column(db.Date, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Quote(db.Model):
+    """Latest market price per symbol, shared by every holding of it."""
+    __tablename__ = 'quotes'
+    
+    symbol = db.Column(db.String(50), primary_key=True)
+    price = db.Column(db.Float, nullable=False)
+    as_of = db.Column(db.Date, nullable=False)  # Trading day the price is from
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'symbol': self.symbol,
+            'price': self.price,
+            'as_of': self.as_of.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+
 class Investment(db.Model):
     """Investment tracking model."""
     __tablename__ = 'investments'
+    __table_args__ = (
+        db.Index('ix_investments_user_buy_date', 'user_id', 'buy_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -168,13 +326,35 @@ class Investment(db.Model):
     buy_price = db.Column(db.Float, nullable=False)  # Price per unit at purchase
     buy_date = db.Column(db.Date, nullable=False)  # Date of purchase
     total_invested = db.Column(db.Float, nullable=False)  # Total amount invested
-    current_price = db.Column(db.Float)  # Current price per unit (updated)
-    current_value = db.Column(db.Float)  # Current total value
+    current_price = db.Column(db.Float)  # Manually entered price per unit
+    current_value = db.Column(db.Float)  # Manually entered total value
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Market price for the symbol, loaded with the holding
+    quote = db.relationship('Quote', primaryjoin='foreign(Investment.symbol) == Quote.symbol', viewonly=True, lazy='joined')
+    
+    def live_quote(self):
+        """The symbol's quote, unless the price on the lot was entered more recently."""
+        if self.quote is None or (self.last_updated and self.last_updated > self.quote.updated_at):
+            return None
+        return self.quote
+    
+    @property
+    def market_price(self):
+        quote = self.live_quote()
+        return quote.price if quote else self.current_price
+    
+    @property
+    def market_value(self):
+        quote = self.live_quote()
+        return self.quantity * quote.price if quote else self.current_value
+    
     def to_dict(self):
+        quote = self.live_quote()
+        current_value = self.market_value
+        last_updated = quote.updated_at if quote else self.last_updated
         return {
             'id': self.id,
             'instrument_type': self.instrument_type,
@@ -184,11 +364,117 @@ class Investment(db.Model):
             'buy_price': self.buy_price,
             'buy_date': self.buy_date.isoformat() if self.buy_date else None,
             'total_invested': self.total_invested,
-            'current_price': self.current_price,
-            'current_value': self.current_value,
-            'returns': round((self.current_value - self.total_invested) if self.current_value else 0, 2),
-            'returns_percent': round(((self.current_value - self.total_invested) / self.total_invested * 100) if self.current_value and self.total_invested > 0 else 0, 2),
-            'last_updated': self.last_updated.isoformat() if self.last_updated else None,
+            'current_price': self.market_price,
+            'current_value': current_value,
+            'returns': round((current_value - self.total_invested) if current_value else 0, 2),
+            'returns_percent': round(((current_value - self.total_invested) / self.total_invested * 100) if current_value and self.total_invested > 0 else 0, 2),
+            'price_as_of': quote.as_of.isoformat() if quote else None,
+            'last_updated': last_updated.isoformat() if last_updated else None,
             'notes': self.notes,
             'created_at': self.created_at.isoformat()
         }
+
+
+class Position(db.Model):
+    """A user's holding in one instrument, kept in step with its ledger transactions."""
+    __tablename__ = 'positions'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'instrument_type', 'symbol', 'instrument_key', name='uq_positions_user_instrument'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    instrument_type = db.Column(db.String(50), nullable=False)
+    symbol = db.Column(db.String(50), nullable=False, default='')
+    instrument_key = db.Column(db.String(210), nullable=False, default='')  # Tells apart instruments without a symbol; see ledger.instrument_key
+    instrument_name = db.Column(db.String(200), nullable=False)
+    quantity = db.Column(db.Float, nullable=False, default=0)  # Units held
+    cost_basis = db.Column(db.Float, nullable=False, default=0)  # Cost of the open lots
+    realized_gain = db.Column(db.Float, nullable=False, default=0)  # From sells, FIFO
+    dividends = db.Column(db.Float, nullable=False, default=0)
+    lots = db.Column(db.JSON, nullable=False, default=list)  # Open FIFO lots: [day ordinal, quantity, unit cost]
+    manual_price = db.Column(db.Float)  # Entered price per unit, for instruments without quotes
+    manual_priced_at = db.Column(db.DateTime)
+    first_trade_date = db.Column(db.Date)
+    last_trade_date = db.Column(db.Date)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    quote = db.relationship('Quote', primaryjoin='foreign(Position.symbol) == Quote.symbol', viewonly=True, lazy='joined')
+    
+    def live_quote(self):
+        """The symbol's quote, unless a price was entered manually after it."""
+        if self.quote is None or (self.manual_priced_at and self.manual_priced_at > self.quote.updated_at):
+            return None
+        return self.quote
+    
+    @property
+    def market_value(self):
+        quote = self.live_quote()
+        if quote:
+            return self.quantity * quote.price
+        if self.manual_price is not None:
+            return self.quantity * self.manual_price
+        return self.cost_basis
+    
+    def to_dict(self):
+        quote = self.live_quote()
+        market_value = self.market_value
+        return {
+            'id': self.id,
+            'instrument_type': self.instrument_type,
+            'instrument_name': self.instrument_name,
+            'symbol': self.symbol,
+            'quantity': self.quantity,
+            'cost_basis': round(self.cost_basis, 2),
+            'current_price': quote.price if quote else self.manual_price,
+            'current_value': round(market_value, 2),
+            'unrealized_gain': round(market_value - self.cost_basis, 2),
+            'realized_gain': round(self.realized_gain, 2),
+            'dividends': round(self.dividends, 2),
+            'price_as_of': quote.as_of.isoformat() if quote else None,
+            'first_trade_date': self.first_trade_date.isoformat() if self.first_trade_date else None,
+            'last_trade_date': self.last_trade_date.isoformat() if self.last_trade_date else None,
+            'transaction_count': self.transaction_count
+        }
+
+
+class InvestmentTransaction(db.Model):
+    """One ledger entry: a buy, sell, dividend or split."""
+    __tablename__ = 'investment_transactions'
+    __table_args__ = (
+        db.Index('ix_investment_transactions_position_date', 'position_id', 'trade_date'),
+        db.Index('ix_investment_transactions_user_date', 'user_id', 'trade_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    position_id = db.Column(db.Integer, db.ForeignKey('positions.id'), nullable=False)
+    investment_id = db.Column(db.Integer, db.ForeignKey('investments.id'), index=True)  # Buy lot entered through /investments
+    kind = db.Column(db.String(20), nullable=False)  # buy, sell, dividend, split
+    trade_date = db.Column(db.Date, nullable=False)
+    quantity = db.Column(db.Float)  # Units bought or sold
+    price = db.Column(db.Float)  # Price per unit
+    amount = db.Column(db.Float, nullable=False, default=0)  # Cash flow: negative for buys, positive for sells and dividends
+    ratio = db.Column(db.Float)  # New units per old unit, for splits
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    position = db.relationship('Position', backref=db.backref('transactions', lazy='dynamic'))
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'position_id': self.position_id,
+            'investment_id': self.investment_id,
+            'instrument_type': self.position.instrument_type,
+            'symbol': self.position.symbol,
+            'kind': self.kind,
+            'trade_date': self.trade_date.isoformat(),
+            'quantity': self.quantity,
+            'price': self.price,
+            'amount': round(self.amount, 2),
+            'ratio': self.ratio,
+            'notes': self.notes,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
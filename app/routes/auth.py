@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify, session
 from flask_login import login_user, logout_user, login_required, current_user
-from app import db, bcrypt
+from app import db
 from flask_mail import Message
 import secrets
 from app.models import User
+from app.utils.principal_cache import principal_cache
+from app.utils.password_hasher import password_hasher, HasherBusy
 import jwt
 import datetime
 from functools import wraps
@@ -14,6 +16,13 @@ auth_bp = Blueprint('auth', __name__)
 logger = logging.getLogger(__name__)
 
 
+def hasher_busy_response():
+    """503 returned when the password hashing queue is saturated."""
+    response = jsonify({'error': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
 def token_required(f):
     """Decorator to require JWT token for API endpoints."""
     @wraps(f)
@@ -34,7 +43,7 @@ def token_required(f):
         try:
             # Decode the token
             payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-            current_user_obj = User.query.get(payload['user_id'])
+            current_user_obj = principal_cache.get(payload['user_id'], payload.get('iat'))
             
             if not current_user_obj:
                 return jsonify({'error': 'Invalid token'}), 401
@@ -68,7 +77,10 @@ def register():
         return jsonify({'error': 'Email already exists'}), 400
     
     # Create new user
-    hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+    try:
+        hashed_password = password_hasher.hash(data['password'])
+    except HasherBusy:
+        return hasher_busy_response()
     user = User(
         username=data['username'],
         email=data['email'],
@@ -82,9 +94,11 @@ def register():
     login_user(user)
     
     # Generate token
+    now = datetime.datetime.utcnow()
     token = jwt.encode({
         'user_id': user.id,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(days=7)
+        'iat': now,
+        'exp': now + datetime.timedelta(days=7)
     }, Config.SECRET_KEY, algorithm='HS256')
     
     return jsonify({
@@ -109,16 +123,26 @@ def login():
     # Find user by username or email
     user = User.query.filter((User.username == username_or_email) | (User.email == username_or_email)).first()
     
-    if not user or not bcrypt.check_password_hash(user.password_hash, password):
-        return jsonify({'error': 'Invalid username/email or password'}), 401
+    try:
+        if not user or not password_hasher.check(user.password_hash, password):
+            return jsonify({'error': 'Invalid username/email or password'}), 401
+        
+        # Upgrade the stored hash if the configured work factor has changed
+        if password_hasher.needs_rehash(user.password_hash):
+            user.password_hash = password_hasher.hash(password)
+            db.session.commit()
+    except HasherBusy:
+        return hasher_busy_response()
     
     # Log the user in
     login_user(user, remember=data.get('remember', False))
     
     # Generate token
+    now = datetime.datetime.utcnow()
     token = jwt.encode({
         'user_id': user.id,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(days=7)
+        'iat': now,
+        'exp': now + datetime.timedelta(days=7)
     }, Config.SECRET_KEY, algorithm='HS256')
     
     return jsonify({
@@ -281,7 +305,7 @@ def reset_password():
     try:
         # Update password
         logger.info(f'Updating password for user {user.email}')
-        user.password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+        user.password_hash = password_hasher.hash(new_password)
         # Clear reset token
         user.reset_token = None
         user.reset_token_expiry = None
@@ -291,6 +315,9 @@ def reset_password():
         logger.info(f'Password reset successful for user {user.email}')
         return jsonify({'success': True, 'message': 'Password reset successful. You can now login with your new password.'}), 200
     
+    except HasherBusy:
+        db.session.rollback()
+        return hasher_busy_response()
     except Exception as e:
         logger.error(f'Error resetting password: {str(e)}')
         db.session.rollback()
@@ -1,12 +1,31 @@
 """Finance routes for investment tracking."""
 from flask import Blueprint, request, jsonify
-from app.models import db, Investment
+from app.models import db, Investment, InvestmentTransaction, Position
 from app.routes.auth import token_required
-from datetime import datetime
+from app.utils.ledger import KINDS, LedgerError, migrate_user, record_investment, record_transaction, remove_transactions, set_manual_price
+from app.utils.portfolio_history import INTERVALS, MAX_RANGE_DAYS, portfolio_history
+from app.utils.portfolio_summary import portfolio_cache
+from app.utils.price_history import price_history
+from app.utils.returns import portfolio_returns
+from app.utils.sqlite_profile import retry_on_busy
+from app.utils.stock_prices import PriceFetchTimeout, normalize_symbol, stock_prices
+from datetime import date, datetime, timedelta
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import joinedload
 
 finance_bp = Blueprint('finance', __name__)
 
 
+def _migrate_lots(user_id):
+    """Record any of the user's lots missing from the ledger, before positions are read or written."""
+    try:
+        if migrate_user(user_id):
+            db.session.commit()
+    except IntegrityError:
+        # Another request migrated them first
+        db.session.rollback()
+
+
 @finance_bp.route('/investments', methods=['GET'])
 @token_required
 def get_investments():
@@ -17,8 +36,10 @@ def get_investments():
 
 @finance_bp.route('/investments', methods=['POST'])
 @token_required
+@retry_on_busy
 def create_investment():
     """Create a new investment."""
+    _migrate_lots(request.current_user.id)
     data = request.json
     
     # Validate required fields
@@ -36,12 +57,17 @@ def create_investment():
         buy_price = float(data['buy_price'])
         total_invested = quantity * buy_price
         
+        # Stock symbols are stored normalized so holdings join to their quote
+        symbol = data.get('symbol', '')
+        if data['instrument_type'] == 'stock':
+            symbol = normalize_symbol(symbol)
+        
         # Create investment
         investment = Investment(
             user_id=request.current_user.id,
             instrument_type=data['instrument_type'],
             instrument_name=data['instrument_name'],
-            symbol=data.get('symbol', ''),
+            symbol=symbol,
             quantity=quantity,
             buy_price=buy_price,
             buy_date=buy_date,
@@ -52,12 +78,18 @@ def create_investment():
         )
         
         db.session.add(investment)
+        db.session.flush()
+        record_investment(investment)
         db.session.commit()
         
         return jsonify(investment.to_dict()), 201
     
     except ValueError as e:
         return jsonify({'error': f'Invalid data format: {str(e)}'}), 400
+    except OperationalError:
+        # Let sqlite_profile retry SQLITE_BUSY; other database errors are a plain 500
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -65,6 +97,7 @@ def create_investment():
 
 @finance_bp.route('/investments/<int:investment_id>', methods=['PUT'])
 @token_required
+@retry_on_busy
 def update_investment(investment_id):
     """Update an investment's current price/value."""
     investment = Investment.query.filter_by(id=investment_id, user_id=request.current_user.id).first()
@@ -72,19 +105,28 @@ def update_investment(investment_id):
     if not investment:
         return jsonify({'error': 'Investment not found'}), 404
     
+    _migrate_lots(request.current_user.id)
     data = request.json
     
     try:
-        # Update current price if provided
+        # Update current price if provided; a current_value sets the matching price per unit
+        current_price = None
         if 'current_price' in data:
-            investment.current_price = float(data['current_price'])
-            investment.current_value = investment.quantity * investment.current_price
-            investment.last_updated = datetime.utcnow()
+            current_price = float(data['current_price'])
+        elif 'current_value' in data:
+            if not investment.quantity:
+                return jsonify({'error': 'Cannot set a value for a lot with no units; set current_price instead'}), 400
+            current_price = float(data['current_value']) / investment.quantity
         
-        # Allow manual current_value override
-        if 'current_value' in data:
-            investment.current_value = float(data['current_value'])
+        if current_price is not None:
+            investment.current_price = current_price
+            investment.current_value = investment.quantity * current_price
             investment.last_updated = datetime.utcnow()
+            
+            # The price applies to the whole position
+            txn = InvestmentTransaction.query.filter_by(investment_id=investment.id).first()
+            if txn:
+                set_manual_price(txn.position, investment.current_price, investment.last_updated)
         
         # Update notes if provided
         if 'notes' in data:
@@ -93,6 +135,10 @@ def update_investment(investment_id):
         db.session.commit()
         return jsonify(investment.to_dict())
     
+    except OperationalError:
+        # Let sqlite_profile retry SQLITE_BUSY; other database errors are a plain 500
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -100,6 +146,7 @@ def update_investment(investment_id):
 
 @finance_bp.route('/investments/<int:investment_id>', methods=['DELETE'])
 @token_required
+@retry_on_busy
 def delete_investment(investment_id):
     """Delete an investment."""
     investment = Investment.query.filter_by(id=investment_id, user_id=request.current_user.id).first()
@@ -108,165 +155,221 @@ def delete_investment(investment_id):
         return jsonify({'error': 'Investment not found'}), 404
     
     try:
+        remove_transactions(InvestmentTransaction.query.filter_by(investment_id=investment.id).all())
         db.session.delete(investment)
         db.session.commit()
         return jsonify({'message': 'Investment deleted successfully'})
+    except LedgerError as e:
+        db.session.rollback()
+        return jsonify({'error': f'Cannot delete this lot: {e}'}), 400
+    except OperationalError:
+        # Let sqlite_profile retry SQLITE_BUSY; other database errors are a plain 500
+        db.session.rollback()
+        raise
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@finance_bp.route('/transactions', methods=['GET'])
+@token_required
+def get_transactions():
+    """Get the user's ledger, newest first, optionally for one position."""
+    _migrate_lots(request.current_user.id)
+    query = InvestmentTransaction.query.filter_by(user_id=request.current_user.id)
+    position_id = request.args.get('position_id', type=int)
+    if position_id is not None:
+        query = query.filter_by(position_id=position_id)
+    # to_dict reads each transaction's position; load them in the same query
+    transactions = query.options(joinedload(InvestmentTransaction.position)).order_by(
+        InvestmentTransaction.trade_date.desc(), InvestmentTransaction.id.desc()
+    ).all()
+    return jsonify([txn.to_dict() for txn in transactions])
+
+
+@finance_bp.route('/transactions', methods=['POST'])
+@token_required
+@retry_on_busy
+def create_transaction():
+    """Record a buy, sell, dividend or split and update the position."""
+    _migrate_lots(request.current_user.id)
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'error': 'Request body is required'}), 400
+    
+    required_fields = ['instrument_type', 'symbol', 'kind', 'trade_date']
+    for field in required_fields:
+        if field not in data:
+            return jsonify({'error': f'Missing required field: {field}'}), 400
+    if data['kind'] not in KINDS:
+        return jsonify({'error': f"Kind must be one of: {', '.join(KINDS)}"}), 400
+    
+    symbol = data['symbol']
+    if data['instrument_type'] == 'stock':
+        symbol = normalize_symbol(symbol)
+    
+    try:
+        txn = record_transaction(
+            request.current_user.id,
+            data['instrument_type'],
+            symbol,
+            data['kind'],
+            datetime.strptime(data['trade_date'], '%Y-%m-%d').date(),
+            quantity=float(data['quantity']) if data.get('quantity') is not None else None,
+            price=float(data['price']) if data.get('price') is not None else None,
+            amount=float(data['amount']) if data.get('amount') is not None else None,
+            ratio=float(data['ratio']) if data.get('ratio') is not None else None,
+            instrument_name=data.get('instrument_name'),
+            notes=data.get('notes', '')
+        )
+        db.session.commit()
+        return jsonify({'transaction': txn.to_dict(), 'position': txn.position.to_dict()}), 201
+    
+    except LedgerError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': f'Invalid data format: {str(e)}'}), 400
+    except OperationalError:
+        # Let sqlite_profile retry SQLITE_BUSY; other database errors are a plain 500
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
+@finance_bp.route('/transactions/<int:transaction_id>', methods=['DELETE'])
+@token_required
+@retry_on_busy
+def delete_transaction(transaction_id):
+    """Delete a ledger entry and replay its position."""
+    txn = InvestmentTransaction.query.filter_by(id=transaction_id, user_id=request.current_user.id).first()
+    
+    if not txn:
+        return jsonify({'error': 'Transaction not found'}), 404
+    if txn.investment_id is not None:
+        return jsonify({'error': 'This buy belongs to an investment lot; delete the investment instead'}), 400
+    
+    try:
+        remove_transactions([txn])
+        db.session.commit()
+        return jsonify({'message': 'Transaction deleted successfully'})
+    except LedgerError as e:
+        db.session.rollback()
+        return jsonify({'error': f'Cannot delete this transaction: {e}'}), 400
+    except OperationalError:
+        # Let sqlite_profile retry SQLITE_BUSY; other database errors are a plain 500
+        db.session.rollback()
+        raise
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@finance_bp.route('/positions', methods=['GET'])
+@token_required
+def get_positions():
+    """Get the user's positions with cost basis and realized/unrealized gains."""
+    _migrate_lots(request.current_user.id)
+    positions = Position.query.filter_by(user_id=request.current_user.id).order_by(Position.instrument_type, Position.symbol).all()
+    if request.args.get('open', 'false').lower() == 'true':
+        positions = [position for position in positions if position.quantity > 0]
+    return jsonify([position.to_dict() for position in positions])
+
+
 @finance_bp.route('/portfolio/summary', methods=['GET'])
 @token_required
 def get_portfolio_summary():
     """Get portfolio summary with totals and allocation."""
-    investments = Investment.query.filter_by(user_id=request.current_user.id).all()
+    _migrate_lots(request.current_user.id)
+    return jsonify(portfolio_cache.get(request.current_user.id))
+
+
+@finance_bp.route('/portfolio/history', methods=['GET'])
+@token_required
+def get_portfolio_history():
+    """Get invested amount, market value and P&L per day, week or month."""
+    interval = request.args.get('interval', 'day')
+    if interval not in INTERVALS:
+        return jsonify({'error': "Interval must be 'day', 'week', or 'month'"}), 400
     
-    if not investments:
-        return jsonify({
-            'total_invested': 0,
-            'current_value': 0,
-            'total_returns': 0,
-            'returns_percent': 0,
-            'count': 0,
-            'allocation': []
-        })
+    try:
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else date.today()
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     
-    total_invested = sum(inv.total_invested for inv in investments)
-    current_value = sum(inv.current_value or inv.total_invested for inv in investments)
-    total_returns = current_value - total_invested
-    returns_percent = (total_returns / total_invested * 100) if total_invested > 0 else 0
+    if start is not None:
+        if start > end:
+            return jsonify({'error': 'start must be on or before end'}), 400
+        if (end - start).days >= MAX_RANGE_DAYS:
+            return jsonify({'error': f'Range cannot exceed {MAX_RANGE_DAYS} days'}), 400
     
-    # Calculate allocation by instrument type
-    allocation = {}
-    for inv in investments:
-        inv_value = inv.current_value or inv.total_invested
-        if inv.instrument_type not in allocation:
-            allocation[inv.instrument_type] = {
-                'invested': 0,
-                'current_value': 0,
-                'count': 0
-            }
-        allocation[inv.instrument_type]['invested'] += inv.total_invested
-        allocation[inv.instrument_type]['current_value'] += inv_value
-        allocation[inv.instrument_type]['count'] += 1
+    _migrate_lots(request.current_user.id)
+    try:
+        history = portfolio_history(request.current_user.id, start, end, interval)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Portfolio history error: {type(e).__name__}: {e}")
+        return jsonify({'success': False, 'error': 'Could not load price history for your holdings'}), 200
     
-    # Convert to list with percentages
-    allocation_list = []
-    for inst_type, data in allocation.items():
-        allocation_list.append({
-            'instrument_type': inst_type,
-            'invested': round(data['invested'], 2),
-            'current_value': round(data['current_value'], 2),
-            'percentage': round((data['current_value'] / current_value * 100) if current_value > 0 else 0, 2),
-            'count': data['count']
-        })
+    return jsonify({'success': True, **history})
+
+
+@finance_bp.route('/portfolio/returns', methods=['GET'])
+@token_required
+def get_portfolio_returns():
+    """Get annualized returns (XIRR and CAGR) per position, per instrument type and overall."""
+    _migrate_lots(request.current_user.id)
+    try:
+        as_of = datetime.strptime(request.args['as_of'], '%Y-%m-%d').date() if request.args.get('as_of') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     
-    return jsonify({
-        'total_invested': round(total_invested, 2),
-        'current_value': round(current_value, 2),
-        'total_returns': round(total_returns, 2),
-        'returns_percent': round(returns_percent, 2),
-        'count': len(investments),
-        'allocation': sorted(allocation_list, key=lambda x: x['current_value'], reverse=True)
-    })
+    if as_of and as_of > date.today():
+        return jsonify({'error': 'as_of cannot be in the future'}), 400
+    
+    return jsonify(portfolio_returns(request.current_user.id, as_of))
 
 
 @finance_bp.route('/stock/price', methods=['POST'])
 @token_required
 def get_stock_price():
-    """Fetch stock price from Yahoo Finance."""
-    import yfinance as yf
-    from datetime import datetime, timedelta
-    
+    """Fetch stock price from Yahoo Finance (cached per symbol and date)."""
     data = request.json
-    symbol = data.get('symbol', '').upper()
+    # Add .NS for NSE stocks if not already present
+    symbol = normalize_symbol(data.get('symbol', ''))
     buy_date = data.get('buy_date')
     
     if not symbol:
         return jsonify({'error': 'Symbol is required'}), 400
     
     try:
-        # Add .NS for NSE stocks if not already present
-        if not symbol.endswith(('.NS', '.BO')):
-            symbol = f"{symbol}.NS"
-        
-        print(f"\n=== Yahoo Finance Debug ===")
-        print(f"Requesting data for: {symbol}")
-        
-        # Create ticker object with session to handle rate limits
-        import requests
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
-        
-        ticker = yf.Ticker(symbol, session=session)
-        
-        # Try to get historical data first (more reliable)
-        stock_name = symbol.replace('.NS', '').replace('.BO', '')
-        current_price = None
-        buy_price = None
-        
-        # Get historical data for last 30 days for current price
-        print("Fetching historical data for period='1mo'...")
-        try:
-            hist = ticker.history(period='1mo')
-            print(f"History shape: {hist.shape}")
-            print(f"History columns: {hist.columns.tolist()}")
-            print(f"History empty: {hist.empty}")
-            if not hist.empty:
-                print(f"Last 3 rows:\n{hist.tail(3)}")
-        except Exception as hist_error:
-            print(f"History fetch error: {type(hist_error).__name__}: {hist_error}")
-            raise
-        
-        if hist.empty:
-            print(f"ERROR: No historical data returned for {symbol}")
-            raise Exception(f'No data available for {symbol}. The symbol may be invalid or delisted.')
-        
-        # Get most recent close price as current price
-        current_price = hist['Close'].iloc[-1]
-        print(f"Current price extracted: {current_price}")
-        
-        # Try to get stock name from info (may fail due to rate limiting)
-        try:
-            print("Attempting to fetch ticker info...")
-            info = ticker.info
-            stock_name = info.get('longName', info.get('shortName', stock_name))
-            print(f"Stock name from info: {stock_name}")
-        except Exception as info_error:
-            print(f"Info fetch failed (expected if rate limited): {type(info_error).__name__}: {info_error}")
-            pass  # Use default name if info fails
+        quote = stock_prices.latest(symbol)
+        current_price = quote['price']
+        stock_name = stock_prices.name(symbol, default=symbol.replace('.NS', '').replace('.BO', ''))
         
         # Get historical price for buy date if provided
         buy_price = current_price  # Default to current price
         if buy_date:
             try:
-                # Parse buy date
-                buy_date_obj = datetime.strptime(buy_date, '%Y-%m-%d')
-                # Fetch historical data (get a few days buffer)
-                start_date = buy_date_obj - timedelta(days=7)
-                end_date = buy_date_obj + timedelta(days=1)
-                
-                hist_buy = ticker.history(start=start_date, end=end_date)
-                
-                if not hist_buy.empty:
-                    # Get the closest date to buy_date
-                    hist_date = buy_date_obj.strftime('%Y-%m-%d')
-                    if hist_date in hist_buy.index.strftime('%Y-%m-%d').tolist():
-                        buy_price = hist_buy.loc[hist_buy.index.strftime('%Y-%m-%d') == hist_date, 'Close'].values[0]
-                    else:
-                        # Get the first available close price
-                        buy_price = hist_buy['Close'].iloc[0]
+                buy_date_obj = datetime.strptime(buy_date, '%Y-%m-%d').date()
+                # Closest trading day on or before the buy date, from the local store
+                if buy_date_obj < date.fromisoformat(quote['as_of']):
+                    close = price_history.close_on_or_before(symbol, buy_date_obj, fetch=True)
+                    db.session.commit()
+                    if close:
+                        buy_price = close[1]
             except Exception as e:
+                db.session.rollback()
+                price_history.forget(symbol)
                 print(f"Error fetching historical price for buy date: {type(e).__name__}: {e}")
                 # If historical fetch fails, use current price
                 pass
         
-        print(f"Final prices - Buy: {buy_price}, Current: {current_price}")
-        print("=== Success ===\n")
-        
         return jsonify({
             'success': True,
             'symbol': symbol,
@@ -276,15 +379,20 @@ def get_stock_price():
             'currency': 'INR'
         })
     
+    except PriceFetchTimeout as e:
+        print(f"Stock price timeout for {symbol}: {e}")
+        response = jsonify({
+            'success': False,
+            'error': 'The price service is slow to respond. Please try again shortly.'
+        })
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
     except Exception as e:
         error_msg = str(e)
         error_type = type(e).__name__
         
-        print(f"\n=== ERROR ===")
-        print(f"Error type: {error_type}")
-        print(f"Error message: {error_msg}")
-        print(f"Full exception: {e}")
-        print("=============\n")
+        print(f"Stock price error for {symbol}: {error_type}: {error_msg}")
         
         # Check for rate limiting
         if '429' in error_msg or 'Too Many Requests' in error_msg:
@@ -297,3 +405,41 @@ def get_stock_price():
             'success': False,
             'error': f'Could not fetch data for {symbol}. Error: {error_type} - {error_msg}'
         }), 200
+
+
+@finance_bp.route('/stock/history', methods=['GET'])
+@token_required
+def get_stock_history():
+    """
+    Daily OHLC bars for a symbol, served from the local price store.
+    
+    Nothing is downloaded here: held symbols are backfilled by the price
+    refresher and backfill_prices.py, and coverage tells the client which
+    dates the store has.
+    """
+    symbol = normalize_symbol(request.args.get('symbol', ''))
+    if not symbol:
+        return jsonify({'error': 'Symbol is required'}), 400
+    
+    try:
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else date.today()
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else end - timedelta(days=365)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    if start > end:
+        return jsonify({'error': 'start must be on or before end'}), 400
+    
+    try:
+        bars = price_history.bars(symbol, start, end)
+        coverage = price_history.coverage(symbol)
+    except Exception as e:
+        print(f"Price history error for {symbol}: {type(e).__name__}: {e}")
+        return jsonify({'success': False, 'error': f'Could not load price history for {symbol}'}), 200
+    
+    return jsonify({
+        'success': True,
+        'symbol': symbol,
+        'bars': bars,
+        'coverage': {'start': coverage[0].isoformat(), 'end': coverage[1].isoformat()} if coverage else None
+    })
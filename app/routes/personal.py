@@ -1,13 +1,29 @@
 from flask import Blueprint, request, jsonify
 from app import db
-from app.models import Habit, HabitLog, DietEntry
-from app.utils.helpers import calculate_streak, parse_date
+from app.models import Habit, HabitLog, HabitStreak, DietEntry, DailyNutrition
+from app.utils.helpers import parse_date, summarize_diet_entries, format_diet_summary
+from app.utils.streak_state import (
+    on_log_added, on_log_deleted, get_streak_state, add_completed_day, remove_completed_day
+)
+from app.utils.streak_engine import compute_user_streaks, habit_streak_info
+from app.utils.diet_totals import (
+    GRANULARITIES, daily_nutrient_totals, day_totals, rollup_daily_totals, rollup_values, nutrient_snapshot, apply_to_rollup
+)
 from app.utils.nutrition_api import nutrition_api
+from app.utils.food_catalog import food_catalog
 from app.routes.auth import token_required
-from datetime import datetime
-from sqlalchemy import func, desc
+from app.utils.sqlite_profile import retry_on_busy
+from datetime import datetime, timedelta
+from sqlalchemy import desc, bindparam, and_, or_
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+import logging
 
 personal_bp = Blueprint('personal', __name__)
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_OPERATIONS = 1000
+BATCH_LOOKUP_CHUNK = 200  # (habit, day) pairs per existing-log query, well under SQLite's expression depth limit
+MAX_SUMMARY_RANGE_DAYS = 3660
 
 
 # ==================== HABITS ====================
@@ -22,6 +38,7 @@ def get_profile():
 
 @personal_bp.route('/profile', methods=['PUT'])
 @token_required
+@retry_on_busy
 def update_profile():
     """Update user profile (calorie goal)."""
     data = request.get_json()
@@ -42,17 +59,24 @@ def update_profile():
 def get_habits():
     """Get all habits for the current user with optional filtering."""
     is_active = request.args.get('active', type=str)
+    with_streaks = request.args.get('streaks', 'false').lower() == 'true'
     
     query = Habit.query.filter_by(user_id=request.current_user.id)
     if is_active is not None:
         query = query.filter_by(is_active=is_active.lower() == 'true')
     
     habits = query.order_by(desc(Habit.created_at)).all()
-    return jsonify([habit.to_dict() for habit in habits])
+    if not with_streaks:
+        return jsonify([habit.to_dict() for habit in habits])
+    
+    # One grouped query for every habit's streak
+    streaks = compute_user_streaks(request.current_user.id, habits)
+    return jsonify([dict(habit.to_dict(), streak=streaks[habit.id]) for habit in habits])
 
 
 @personal_bp.route('/habits', methods=['POST'])
 @token_required
+@retry_on_busy
 def create_habit():
     """Create a new habit."""
     data = request.get_json()
@@ -69,6 +93,7 @@ def create_habit():
         target_count=data.get('target_count', 1),
         is_active=data.get('is_active', True)
     )
+    habit.streak = HabitStreak(longest_streak=0)
     
     db.session.add(habit)
     db.session.commit()
@@ -76,6 +101,48 @@ def create_habit():
     return jsonify(habit.to_dict()), 201
 
 
+@personal_bp.route('/habits/calendar', methods=['GET'])
+@token_required
+def get_habit_calendar():
+    """Get habit log statuses for a month as {date: {habit_id: status}}."""
+    today = datetime.utcnow().date()
+    year = request.args.get('year', today.year, type=int)
+    month = request.args.get('month', today.month, type=int)
+    habit_ids = request.args.get('habit_ids', '')
+    
+    if not 1 <= month <= 12 or not 1 <= year < 9999:
+        return jsonify({'error': 'Invalid year or month'}), 400
+    
+    try:
+        habit_ids = [int(habit_id) for habit_id in habit_ids.split(',') if habit_id.strip()]
+    except ValueError:
+        return jsonify({'error': 'habit_ids must be a comma-separated list of integers'}), 400
+    
+    # Half-open [start, end) range so the completed_at index can be used
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    
+    query = db.session.query(HabitLog.habit_id, HabitLog.completed_at, HabitLog.status).join(
+        Habit, Habit.id == HabitLog.habit_id
+    ).filter(
+        Habit.user_id == request.current_user.id,
+        HabitLog.completed_at >= start,
+        HabitLog.completed_at < end
+    )
+    if habit_ids:
+        query = query.filter(HabitLog.habit_id.in_(habit_ids))
+    
+    # Ordered oldest first so the latest log of a day wins
+    calendar = {}
+    for habit_id, completed_at, status in query.order_by(HabitLog.completed_at, HabitLog.id):
+        calendar.setdefault(completed_at.date().isoformat(), {})[habit_id] = status or 'completed'
+    
+    response = jsonify(calendar)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
 @personal_bp.route('/habits/<int:id>', methods=['GET'])
 @token_required
 def get_habit(id):
@@ -83,13 +150,10 @@ def get_habit(id):
     habit = Habit.query.filter_by(id=id, user_id=request.current_user.id).first_or_404()
     habit_data = habit.to_dict()
     
-    # Calculate streak
-    logs = HabitLog.query.filter_by(habit_id=id).order_by(desc(HabitLog.completed_at)).all()
-    streak_info = calculate_streak(logs)
-    habit_data['streak'] = streak_info
+    habit_data['streak'] = habit_streak_info(habit)
     
     # Get recent logs
-    recent_logs = logs[:10]  # Last 10 logs
+    recent_logs = HabitLog.query.filter_by(habit_id=id).order_by(desc(HabitLog.completed_at)).limit(10).all()
     habit_data['recent_logs'] = [log.to_dict() for log in recent_logs]
     
     return jsonify(habit_data)
@@ -97,6 +161,7 @@ def get_habit(id):
 
 @personal_bp.route('/habits/<int:id>', methods=['PUT'])
 @token_required
+@retry_on_busy
 def update_habit(id):
     """Update a habit."""
     habit = Habit.query.filter_by(id=id, user_id=request.current_user.id).first_or_404()
@@ -123,6 +188,7 @@ def update_habit(id):
 
 @personal_bp.route('/habits/<int:id>', methods=['DELETE'])
 @token_required
+@retry_on_busy
 def delete_habit(id):
     """Delete a habit."""
     habit = Habit.query.filter_by(id=id, user_id=request.current_user.id).first_or_404()
@@ -134,6 +200,7 @@ def delete_habit(id):
 
 @personal_bp.route('/habits/<int:id>/log', methods=['POST'])
 @token_required
+@retry_on_busy
 def log_habit(id):
     """Log a habit completion."""
     habit = Habit.query.filter_by(id=id, user_id=request.current_user.id).first_or_404()
@@ -155,25 +222,25 @@ def log_habit(id):
     )
     
     db.session.add(log)
+    on_log_added(log)
     db.session.commit()
     
     # Return log with updated streak
-    logs = HabitLog.query.filter_by(habit_id=id).order_by(desc(HabitLog.completed_at)).all()
-    streak_info = calculate_streak(logs)
-    
     return jsonify({
         'log': log.to_dict(),
-        'streak': streak_info
+        'streak': habit_streak_info(habit)
     }), 201
 
 
 @personal_bp.route('/habits/<int:habit_id>/logs/<int:log_id>', methods=['DELETE'])
 @token_required
+@retry_on_busy
 def delete_habit_log(habit_id, log_id):
     """Delete a habit log entry."""
     habit = Habit.query.filter_by(id=habit_id, user_id=request.current_user.id).first_or_404()
     log = HabitLog.query.filter_by(id=log_id, habit_id=habit_id).first_or_404()
     db.session.delete(log)
+    on_log_deleted(log)
     db.session.commit()
     
     return jsonify({'message': 'Log deleted successfully'}), 200
@@ -181,6 +248,7 @@ def delete_habit_log(habit_id, log_id):
 
 @personal_bp.route('/habits/logs/<int:log_id>', methods=['DELETE'])
 @token_required
+@retry_on_busy
 def delete_habit_log_by_id(log_id):
     """Delete a habit log entry by log ID only."""
     log = HabitLog.query.filter_by(id=log_id).first_or_404()
@@ -189,11 +257,138 @@ def delete_habit_log_by_id(log_id):
     habit = Habit.query.filter_by(id=log.habit_id, user_id=request.current_user.id).first_or_404()
     
     db.session.delete(log)
+    on_log_deleted(log)
     db.session.commit()
     
     return jsonify({'message': 'Log deleted successfully'}), 200
 
 
+@personal_bp.route('/habits/logs/batch', methods=['POST'])
+@token_required
+@retry_on_busy
+def batch_upsert_habit_logs():
+    """
+    Upsert many habit logs, keyed by (habit_id, date), in one transaction.
+    
+    Body: {"operations": [{"habit_id": 1, "date": "YYYY-MM-DD",
+                           "status": "completed|failed|skipped|none", "notes": "..."}]}
+    A status of "none" removes the habit's logs for that day.
+    """
+    data = request.get_json() or {}
+    operations = data.get('operations')
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per request'}), 400
+    
+    # Last operation for a (habit_id, day) wins
+    wanted = {}
+    for op in operations:
+        try:
+            habit_id = int(op['habit_id'])
+            day = datetime.fromisoformat(op['date']).date()
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Each operation needs an integer habit_id and an ISO date'}), 400
+        status = op.get('status') or 'none'
+        if status not in ['completed', 'failed', 'skipped', 'none']:
+            return jsonify({'error': f'Invalid status: {status}'}), 400
+        wanted[(habit_id, day)] = (status, op.get('notes'))
+    
+    # Ownership is checked once for every habit in the batch
+    habit_ids = {habit_id for habit_id, _ in wanted}
+    habits = Habit.query.filter(Habit.id.in_(habit_ids), Habit.user_id == request.current_user.id).all()
+    if len(habits) != len(habit_ids):
+        return jsonify({'error': 'Habit not found'}), 404
+    
+    # Existing logs for exactly the affected (habit, day) pairs, newest first per day
+    existing = {}
+    keys = list(wanted)
+    for start in range(0, len(keys), BATCH_LOOKUP_CHUNK):
+        day_filters = [
+            and_(
+                HabitLog.habit_id == habit_id,
+                HabitLog.completed_at >= datetime.combine(day, datetime.min.time()),
+                HabitLog.completed_at < datetime.combine(day + timedelta(days=1), datetime.min.time())
+            )
+            for habit_id, day in keys[start:start + BATCH_LOOKUP_CHUNK]
+        ]
+        rows = db.session.query(HabitLog.id, HabitLog.habit_id, HabitLog.completed_at, HabitLog.status, HabitLog.notes).filter(
+            or_(*day_filters)
+        ).order_by(desc(HabitLog.completed_at), desc(HabitLog.id))
+        for row in rows:
+            existing.setdefault((row.habit_id, row.completed_at.date()), []).append(row)
+    
+    # Build the streak state before any write so it reflects the old logs
+    for habit_id in habit_ids:
+        get_streak_state(habit_id)
+    
+    inserts, updates, delete_ids, added_days, removed_days = [], [], [], [], []
+    for (habit_id, day), (status, notes) in wanted.items():
+        logs = existing.get((habit_id, day), [])
+        was_completed = any(log.status in ['completed', None] for log in logs)
+        
+        if status == 'none':
+            delete_ids.extend(log.id for log in logs)
+        elif logs:
+            # Keep the newest log for the day and drop any others
+            updates.append({
+                'b_id': logs[0].id,
+                'b_status': status,
+                'b_notes': logs[0].notes if notes is None else notes
+            })
+            delete_ids.extend(log.id for log in logs[1:])
+        else:
+            inserts.append({
+                'habit_id': habit_id,
+                'completed_at': datetime.combine(day, datetime.min.time()) + timedelta(hours=12),
+                'notes': notes or '',
+                'status': status
+            })
+        
+        is_completed = status == 'completed'
+        if is_completed and not was_completed:
+            added_days.append((habit_id, day))
+        elif was_completed and not is_completed:
+            removed_days.append((habit_id, day))
+    
+    table = HabitLog.__table__
+    try:
+        if delete_ids:
+            db.session.execute(table.delete().where(table.c.id.in_(delete_ids)))
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('b_id')).values(
+                    status=bindparam('b_status'), notes=bindparam('b_notes')
+                ),
+                updates
+            )
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+        
+        for habit_id, day in added_days:
+            add_completed_day(habit_id, day)
+        for habit_id, day in removed_days:
+            remove_completed_day(habit_id, day)
+        
+        db.session.commit()
+    except OperationalError:
+        # Let sqlite_profile retry SQLITE_BUSY; other database errors are a plain 500
+        db.session.rollback()
+        raise
+    except Exception:
+        db.session.rollback()
+        logger.exception('Batch habit log upsert failed for user %s', request.current_user.id)
+        return jsonify({'error': 'Failed to save habit logs'}), 500
+    
+    return jsonify({
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'deleted': len(delete_ids),
+        'streaks': {habit.id: habit_streak_info(habit) for habit in habits}
+    }), 200
+
+
 # ==================== DIET ====================
 
 @personal_bp.route('/diet/lookup', methods=['POST'])
@@ -210,6 +405,14 @@ def lookup_nutrition():
     # Get nutrition data from API (returns list of results)
     result = nutrition_api.lookup_food(food_name)
     
+    # Keep any foods the lookup added to the local catalog
+    try:
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        food_catalog.invalidate()
+        logger.error(f'Failed to save looked-up foods to the catalog: {e}')
+    
     return jsonify(result), 200
 
 
@@ -227,8 +430,12 @@ def get_diet_entries():
     
     if date:
         try:
-            target_date = datetime.fromisoformat(date).date()
-            query = query.filter(func.date(DietEntry.consumed_at) == target_date)
+            day_start = datetime.combine(datetime.fromisoformat(date).date(), datetime.min.time())
+            # Half-open [start, end) range so the consumed_at index can be used
+            query = query.filter(
+                DietEntry.consumed_at >= day_start,
+                DietEntry.consumed_at < day_start + timedelta(days=1)
+            )
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use ISO format (YYYY-MM-DD)'}), 400
     
@@ -238,6 +445,7 @@ def get_diet_entries():
 
 @personal_bp.route('/diet', methods=['POST'])
 @token_required
+@retry_on_busy
 def create_diet_entry():
     """Create a new diet entry."""
     data = request.get_json()
@@ -309,6 +517,7 @@ def create_diet_entry():
     )
     
     db.session.add(entry)
+    apply_to_rollup(nutrient_snapshot(entry))
     db.session.commit()
     
     return jsonify(entry.to_dict()), 201
@@ -324,10 +533,12 @@ def get_diet_entry(id):
 
 @personal_bp.route('/diet/<int:id>', methods=['PUT'])
 @token_required
+@retry_on_busy
 def update_diet_entry(id):
     """Update a diet entry."""
     entry = DietEntry.query.filter_by(id=id, user_id=request.current_user.id).first_or_404()
     data = request.get_json()
+    before = nutrient_snapshot(entry)
     
     if 'meal_type' in data:
         entry.meal_type = data['meal_type']
@@ -348,6 +559,10 @@ def update_diet_entry(id):
     if 'consumed_at' in data:
         entry.consumed_at = parse_date(data['consumed_at'])
     
+    after = nutrient_snapshot(entry)
+    if after != before:
+        apply_to_rollup(before, sign=-1)
+        apply_to_rollup(after)
     db.session.commit()
     
     return jsonify(entry.to_dict())
@@ -355,10 +570,12 @@ def update_diet_entry(id):
 
 @personal_bp.route('/diet/<int:id>', methods=['DELETE'])
 @token_required
+@retry_on_busy
 def delete_diet_entry(id):
     """Delete a diet entry."""
     entry = DietEntry.query.filter_by(id=id, user_id=request.current_user.id).first_or_404()
     db.session.delete(entry)
+    apply_to_rollup(nutrient_snapshot(entry), sign=-1)
     db.session.commit()
     
     return jsonify({'message': 'Diet entry deleted successfully'}), 200
@@ -370,54 +587,110 @@ def get_diet_summary():
     """Get nutritional summary for a specific date."""
     date_str = request.args.get('date', datetime.utcnow().strftime('%Y-%m-%d'))
     
-    # Query entries for the specific date
-    query = DietEntry.query.filter_by(user_id=request.current_user.id)
-    
     if date_str:
         try:
             target_date = datetime.fromisoformat(date_str).date()
-            query = query.filter(func.date(DietEntry.consumed_at) == target_date)
         except ValueError:
             return jsonify({'error': 'Invalid date format'}), 400
+        totals = day_totals(request.current_user.id, target_date)
+    else:
+        # No date: totals over every day in the rollup
+        totals = {field: 0 for field in DietEntry.NUTRIENT_FIELDS}
+        totals['total_entries'] = 0
+        for row in DailyNutrition.query.filter_by(user_id=request.current_user.id):
+            for field, value in rollup_values(row).items():
+                totals[field] += value
     
-    entries = query.all()
-    
-    total_calories = sum(e.calories or 0 for e in entries)
-    total_protein = sum(e.protein or 0 for e in entries)
-    total_carbs = sum(e.carbs or 0 for e in entries)
-    total_fats = sum(e.fats or 0 for e in entries)
-    total_sugar = sum(e.sugar or 0 for e in entries)
-    total_fiber = sum(e.fiber or 0 for e in entries)
-    total_saturated_fat = sum(e.saturated_fat or 0 for e in entries)
-    total_unsaturated_fat = sum(e.unsaturated_fat or 0 for e in entries)
-    total_calcium = sum(e.calcium or 0 for e in entries)
-    total_iron = sum(e.iron or 0 for e in entries)
-    total_magnesium = sum(e.magnesium or 0 for e in entries)
-    total_sodium = sum(e.sodium or 0 for e in entries)
-    total_potassium = sum(e.potassium or 0 for e in entries)
-    
-    # Get user's calorie goal and calculate percentage
-    user = request.current_user
-    calorie_goal = user.calorie_goal or 2000
-    calorie_percentage = round((total_calories / calorie_goal) * 100, 1) if calorie_goal > 0 else 0
+    return jsonify(format_diet_summary(totals, request.current_user.calorie_goal))
+
+
+@personal_bp.route('/diet/summary/range', methods=['GET'])
+@token_required
+def get_diet_summary_range():
+    """Get nutrient totals and calorie-goal adherence per day, week or month."""
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': "Granularity must be 'day', 'week', or 'month'"}), 400
+    
+    try:
+        end = datetime.fromisoformat(request.args['end']).date() if request.args.get('end') else datetime.utcnow().date()
+        start = datetime.fromisoformat(request.args['start']).date() if request.args.get('start') else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use ISO format (YYYY-MM-DD)'}), 400
+    
+    if start > end:
+        return jsonify({'error': 'start must be on or before end'}), 400
+    if (end - start).days >= MAX_SUMMARY_RANGE_DAYS:
+        return jsonify({'error': f'Range cannot exceed {MAX_SUMMARY_RANGE_DAYS} days'}), 400
+    
+    calorie_goal = request.current_user.calorie_goal or 2000
+    # end is inclusive for callers, exclusive for the query
+    stop = end + timedelta(days=1)
+    daily = daily_nutrient_totals(request.current_user.id, start, stop)
     
     return jsonify({
-        'total_entries': len(entries),
-        'total_calories': total_calories,
-        'total_protein': round(total_protein, 1),
-        'total_carbs': round(total_carbs, 1),
-        'total_fats': round(total_fats, 1),
-        'total_sugar': round(total_sugar, 1),
-        'total_fiber': round(total_fiber, 1),
-        'total_saturated_fat': round(total_saturated_fat, 1),
-        'total_unsaturated_fat': round(total_unsaturated_fat, 1),
-        'total_calcium': round(total_calcium, 1),
-        'total_iron': round(total_iron, 1),
-        'total_magnesium': round(total_magnesium, 1),
-        'total_sodium': round(total_sodium, 1),
-        'total_potassium': round(total_potassium, 1),
-        'average_calories_per_entry': total_calories / len(entries) if entries else 0,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity,
         'calorie_goal': calorie_goal,
-        'calorie_percentage': calorie_percentage
+        'buckets': rollup_daily_totals(daily, start, stop, granularity, calorie_goal)
     })
 
+# ==================== DASHBOARD ====================
+
+@personal_bp.route('/dashboard', methods=['GET'])
+@token_required
+def get_dashboard():
+    """Get everything the dashboard needs in one response, with a fixed number of queries."""
+    user = request.current_user
+    date_str = request.args.get('date', datetime.utcnow().strftime('%Y-%m-%d'))
+    
+    try:
+        target_date = datetime.fromisoformat(date_str).date()
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use ISO format (YYYY-MM-DD)'}), 400
+    
+    day_start = datetime.combine(target_date, datetime.min.time())
+    day_end = day_start + timedelta(days=1)
+    
+    # Habits and their streaks: one habit query plus one grouped log query
+    habits = Habit.query.filter_by(user_id=user.id).order_by(desc(Habit.created_at)).all()
+    active_habits = [habit for habit in habits if habit.is_active]
+    streaks = compute_user_streaks(user.id, active_habits)
+    
+    # Today's status per habit (latest log of the day wins)
+    today_status = {}
+    if active_habits:
+        rows = db.session.query(HabitLog.habit_id, HabitLog.status).join(
+            Habit, Habit.id == HabitLog.habit_id
+        ).filter(
+            Habit.user_id == user.id,
+            HabitLog.completed_at >= day_start,
+            HabitLog.completed_at < day_end
+        ).order_by(HabitLog.completed_at, HabitLog.id)
+        for habit_id, status in rows:
+            today_status[habit_id] = status or 'completed'
+    
+    habit_list = []
+    for habit in active_habits:
+        habit_data = habit.to_dict()
+        habit_data['streak'] = streaks[habit.id]
+        habit_data['today_status'] = today_status.get(habit.id)
+        habit_list.append(habit_data)
+    
+    # Today's diet entries; the summary is computed from the same rows
+    entries = DietEntry.query.filter(
+        DietEntry.user_id == user.id,
+        DietEntry.consumed_at >= day_start,
+        DietEntry.consumed_at < day_end
+    ).order_by(desc(DietEntry.consumed_at)).all()
+    
+    return jsonify({
+        'date': target_date.isoformat(),
+        'profile': user.to_dict(),
+        'total_habits': len(habits),
+        'habits': habit_list,
+        'completed_today': sum(1 for status in today_status.values() if status == 'completed'),
+        'diet_entries': [entry.to_dict() for entry in entries],
+        'diet_summary': summarize_diet_entries(entries, user.calorie_goal)
+    })
@@ -438,38 +438,23 @@ function loadDietForDate() {
 
 async function loadDashboard() {
     try {
-        // Load habits
-        const habitsRes = await fetch(`${API_BASE}/api/personal/habits`, {
+        // Habits, streaks and today's diet in a single request
+        const today = new Date().toISOString().split('T')[0];
+        const response = await fetch(`${API_BASE}/api/personal/dashboard?date=${today}`, {
             headers: getAuthHeaders()
         });
-        const habits = await habitsRes.json();
+        const dashboard = await response.json();
         
-        document.getElementById('totalHabits').textContent = habits.length;
+        document.getElementById('totalHabits').textContent = dashboard.total_habits;
         
         // Calculate longest streak
-        let longestStreak = 0;
-        for (const habit of habits) {
-            const detailRes = await fetch(`${API_BASE}/api/personal/habits/${habit.id}`, {
-                headers: getAuthHeaders()
-            });
-            const detail = await detailRes.json();
-            if (detail.streak && detail.streak.longest_streak > longestStreak) {
-                longestStreak = detail.streak.longest_streak;
-            }
-        }
+        const longestStreak = dashboard.habits.reduce(
+            (longest, habit) => Math.max(longest, habit.streak.longest_streak), 0
+        );
         document.getElementById('longestStreak').textContent = longestStreak;
         
-        // Load today's diet
-        const today = new Date().toISOString().split('T')[0];
-        const dietRes = await fetch(`${API_BASE}/api/personal/diet?date=${today}`, {
-            headers: getAuthHeaders()
-        });
-        const dietEntries = await dietRes.json();
-        
-        document.getElementById('todayMeals').textContent = dietEntries.length;
-        
-        const totalCals = dietEntries.reduce((sum, entry) => sum + (entry.calories || 0), 0);
-        document.getElementById('todayCalories').textContent = totalCals;
+        document.getElementById('todayMeals').textContent = dashboard.diet_summary.total_entries;
+        document.getElementById('todayCalories').textContent = dashboard.diet_summary.total_calories;
         
     } catch (error) {
         console.error('Dashboard load error:', error);
@@ -1107,27 +1092,19 @@ async function renderCalendar() {
 }
 
 async function fetchMonthHabitLogs(year, month) {
-    const logs = {};
+    let logs = {};
     
     try {
-        for (const habit of allHabits) {
-            if (!visibleHabitIds.has(habit.id)) continue;
-            
-            const response = await fetch(`${API_BASE}/api/personal/habits/${habit.id}`, {
-                headers: getAuthHeaders()
-            });
-            const habitData = await response.json();
-            
-            // Process recent logs - store status information
-            habitData.recent_logs.forEach(log => {
-                const logDate = new Date(log.completed_at);
-                if (logDate.getFullYear() === year && logDate.getMonth() === month) {
-                    const dateStr = logDate.toISOString().split('T')[0];
-                    if (!logs[dateStr]) logs[dateStr] = {};
-                    // Store status: completed, failed, or skipped
-                    logs[dateStr][habit.id] = log.status || 'completed';
-                }
-            });
+        const habitIds = allHabits.filter(habit => visibleHabitIds.has(habit.id)).map(habit => habit.id);
+        if (habitIds.length === 0) return logs;
+        
+        // One range query for the whole month; the browser revalidates with the ETag
+        const response = await fetch(
+            `${API_BASE}/api/personal/habits/calendar?year=${year}&month=${month + 1}&habit_ids=${habitIds.join(',')}`,
+            { headers: getAuthHeaders() }
+        );
+        if (response.ok) {
+            logs = await response.json();
         }
     } catch (error) {
         console.error('Error fetching habit logs:', error);
@@ -1169,27 +1146,18 @@ async function openHabitLogModal(dateStr, formattedDate) {
     document.getElementById('logNotes').value = '';
     
     // Fetch existing logs for this date to pre-check habits
-    const loggedHabits = {}; // { habitId: { status: 'completed'/'failed', logId: X } }
+    const loggedHabits = {}; // { habitId: { status: 'completed'/'failed' } }
     try {
-        const logs = await Promise.all(
-            allHabits.map(async habit => {
-                const response = await fetch(`${API_BASE}/api/personal/habits/${habit.id}`, {
-                    headers: getAuthHeaders()
-                });
-                const data = await response.json();
-                
-                // Check if habit was logged on this date
-                const log = data.recent_logs.find(log => {
-                    const logDate = new Date(log.completed_at).toISOString().split('T')[0];
-                    return logDate === dateStr;
-                });
-                
-                if (log) {
-                    loggedHabits[habit.id] = { status: log.status || 'completed', logId: log.id };
-                }
-                return log ? habit.id : null;
-            })
-        );
+        const [year, month] = dateStr.split('-').map(Number);
+        const response = await fetch(`${API_BASE}/api/personal/habits/calendar?year=${year}&month=${month}`, {
+            headers: getAuthHeaders()
+        });
+        const calendar = response.ok ? await response.json() : {};
+        const dayLogs = calendar[dateStr] || {};
+        
+        Object.entries(dayLogs).forEach(([habitId, status]) => {
+            loggedHabits[habitId] = { status };
+        });
     } catch (error) {
         console.error('Error fetching existing logs:', error);
     }
@@ -1282,72 +1250,46 @@ async function submitHabitLog() {
     let successCount = 0;
     let errorCount = 0;
     
-    // Process each habit
+    // Collect every change and send them as one batch
+    const operations = [];
     for (const habit of allHabits) {
         const currentStatus = habitStatusMap[habit.id];
         const previousLog = initiallyLogged[habit.id];
         
-        // If status is 'none', delete any existing log
         if (currentStatus === 'none' || currentStatus === undefined) {
+            // Remove any existing log
             if (previousLog) {
-                try {
-                    const deleteResponse = await fetch(`${API_BASE}/api/personal/habits/logs/${previousLog.logId}`, {
-                        method: 'DELETE',
-                        headers: getAuthHeaders()
-                    });
-                    
-                    if (deleteResponse.ok) {
-                        successCount++;
-                    } else {
-                        errorCount++;
-                    }
-                } catch (error) {
-                    console.error(`Error removing habit ${habit.id}:`, error);
-                    errorCount++;
-                }
+                operations.push({ habit_id: habit.id, date: dateStr, status: 'none' });
             }
         } else if (currentStatus === 'completed' || currentStatus === 'failed') {
-            // If there's an existing log with a different status, delete it first
-            if (previousLog && previousLog.status !== currentStatus) {
-                try {
-                    await fetch(`${API_BASE}/api/personal/habits/logs/${previousLog.logId}`, {
-                        method: 'DELETE',
-                        headers: getAuthHeaders()
-                    });
-                } catch (error) {
-                    console.error(`Error removing old log for habit ${habit.id}:`, error);
-                }
-            }
-            
-            // If no existing log or status changed, create a new one
             if (!previousLog || previousLog.status !== currentStatus) {
-                try {
-                    const response = await fetch(`${API_BASE}/api/personal/habits/${habit.id}/log`, {
-                        method: 'POST',
-                        headers: getAuthHeaders(),
-                        body: JSON.stringify({ 
-                            completed_at: `${dateStr}T12:00:00`,
-                            notes: notes || '',
-                            status: currentStatus
-                        })
-                    });
-                    
-                    if (response.ok) {
-                        successCount++;
-                    } else {
-                        errorCount++;
-                    }
-                } catch (error) {
-                    console.error(`Error logging habit ${habit.id}:`, error);
-                    errorCount++;
-                }
+                operations.push({ habit_id: habit.id, date: dateStr, status: currentStatus, notes: notes || '' });
             } else {
-                // Already has the correct status, just update notes if needed
+                // Already has the correct status
                 successCount++;
             }
         }
     }
     
+    if (operations.length > 0) {
+        try {
+            const response = await fetch(`${API_BASE}/api/personal/habits/logs/batch`, {
+                method: 'POST',
+                headers: getAuthHeaders(),
+                body: JSON.stringify({ operations })
+            });
+            
+            if (response.ok) {
+                successCount += operations.length;
+            } else {
+                errorCount += operations.length;
+            }
+        } catch (error) {
+            console.error('Error saving habit logs:', error);
+            errorCount += operations.length;
+        }
+    }
+    
     // Clear the status map for next use
     window.habitStatusMap = {};
     
@@ -2042,31 +1984,20 @@ async function loadCalorieAnalytics() {
         const startDate = new Date();
         startDate.setDate(startDate.getDate() - parseInt(days) + 1);
         
-        // Get user profile for calorie goal
-        const profileResponse = await fetch(`${API_BASE}/api/personal/profile`, {
-            headers: getAuthHeaders()
-        });
-        const profile = await profileResponse.json();
-        const calorieGoal = profile.calorie_goal || 2000;
-        
-        // Fetch diet data for date range
-        const dateData = [];
-        const promises = [];
+        const toDateStr = d => d.toISOString().split('T')[0];
         
-        for (let d = new Date(startDate); d <= endDate; d.setDate(d.getDate() + 1)) {
-            const dateStr = d.toISOString().split('T')[0];
-            promises.push(
-                fetch(`${API_BASE}/api/personal/diet/summary?date=${dateStr}`, {
-                    headers: getAuthHeaders()
-                }).then(res => res.json()).then(data => ({
-                    date: dateStr,
-                    calories: data.total_calories || 0
-                }))
-            );
-        }
+        // One request returns per-day totals and the calorie goal
+        const response = await fetch(
+            `${API_BASE}/api/personal/diet/summary/range?start=${toDateStr(startDate)}&end=${toDateStr(endDate)}&granularity=day`,
+            { headers: getAuthHeaders() }
+        );
+        const summary = await response.json();
+        const calorieGoal = summary.calorie_goal || 2000;
         
-        const results = await Promise.all(promises);
-        results.sort((a, b) => new Date(a.date) - new Date(b.date));
+        const results = summary.buckets.map(bucket => ({
+            date: bucket.period_start,
+            calories: bucket.total_calories || 0
+        }));
         
         // Calculate statistics
         const totalCalories = results.reduce((sum, day) => sum + day.calories, 0);
@@ -0,0 +1,337 @@
+"""
+Date-range nutrient totals for diet summaries and analytics.
+
+Totals are read from the daily_nutrition rollup, which the diet routes keep
+in step with diet_entries inside the same transaction. Days without a
+rollup row (databases not yet rebuilt with rebuild_daily_nutrition.py) are
+summed from diet_entries, and the first write to such a day seeds its row
+from them.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import DietEntry, DailyNutrition
+from app.utils.helpers import as_date
+
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def daily_totals_from_entries(user_id=None, start=None, end=None):
+    """
+    Sum every nutrient per day straight from diet_entries.
+
+    Used to build and verify the rollup; request paths read daily_nutrition.
+
+    Args:
+        user_id: Optional owner filter
+        start: Optional first day (inclusive)
+        end: Optional last day (exclusive)
+
+    Returns:
+        dict mapping (user_id, date) to {'total_entries': n, <nutrient>: total, ...}
+    """
+    day = func.date(DietEntry.consumed_at)
+    sums = [func.coalesce(func.sum(getattr(DietEntry, field)), 0) for field in DietEntry.NUTRIENT_FIELDS]
+    query = db.session.query(DietEntry.user_id, day, func.count(DietEntry.id), *sums)
+    if user_id is not None:
+        query = query.filter(DietEntry.user_id == user_id)
+    if start is not None:
+        query = query.filter(DietEntry.consumed_at >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        query = query.filter(DietEntry.consumed_at < datetime.combine(end, datetime.min.time()))
+
+    totals = {}
+    for row in query.group_by(DietEntry.user_id, day):
+        values = dict(zip(DietEntry.NUTRIENT_FIELDS, row[3:]))
+        values['total_entries'] = row[2]
+        totals[(row[0], as_date(row[1]))] = values
+    return totals
+
+
+def daily_nutrient_totals(user_id, start, end):
+    """
+    Read per-day totals from the daily_nutrition rollup.
+
+    Days in the range without a rollup row are summed from diet_entries.
+
+    Args:
+        user_id: Owner of the entries
+        start: First day (inclusive)
+        end: Last day (exclusive)
+
+    Returns:
+        dict mapping date to {'total_entries': n, <nutrient>: total, ...}
+    """
+    rows = DailyNutrition.query.filter(
+        DailyNutrition.user_id == user_id,
+        DailyNutrition.day >= start,
+        DailyNutrition.day < end
+    ).all()
+    daily = {row.day: rollup_values(row) for row in rows}
+
+    missing = [start + timedelta(days=offset) for offset in range((end - start).days)]
+    missing = [day for day in missing if day not in daily]
+    if missing:
+        from_entries = daily_totals_from_entries(user_id, missing[0], missing[-1] + timedelta(days=1))
+        for (_, day), totals in from_entries.items():
+            daily.setdefault(day, totals)
+    return daily
+
+
+def day_totals(user_id, day):
+    """
+    Totals for one day, from the rollup or straight from diet_entries.
+
+    Days without a rollup row are summed from diet_entries, so databases
+    created before daily_nutrition existed (or not yet rebuilt) still
+    report their entries.
+
+    Returns:
+        {'total_entries': n, <nutrient>: total, ...}
+    """
+    row = db.session.get(DailyNutrition, (user_id, day))
+    if row is not None:
+        return rollup_values(row)
+    totals = daily_totals_from_entries(user_id, day, day + timedelta(days=1)).get((user_id, day))
+    if totals is None:
+        totals = {field: 0 for field in DietEntry.NUTRIENT_FIELDS}
+        totals['total_entries'] = 0
+    return totals
+
+
+def _forget_seeded_days(session, *args):
+    session.info.pop('seeded_rollup_days', None)
+
+
+# A seeded day only stands for the transaction that seeded it
+event.listen(Session, 'after_commit', _forget_seeded_days)
+event.listen(Session, 'after_rollback', _forget_seeded_days)
+
+
+def rollup_values(row):
+    """Return a DailyNutrition row as a totals dict."""
+    values = {field: getattr(row, field) for field in DietEntry.NUTRIENT_FIELDS}
+    values['total_entries'] = row.entry_count
+    return values
+
+
+def nutrient_snapshot(entry):
+    """
+    Capture the rollup key and nutrient values of a diet entry.
+
+    Take the snapshot before mutating an entry so the old values can be
+    subtracted afterwards.
+    """
+    return (
+        entry.user_id,
+        entry.consumed_at.date(),
+        {field: getattr(entry, field) or 0 for field in DietEntry.NUTRIENT_FIELDS}
+    )
+
+
+def _seed_rollup_day(user_id, day):
+    """
+    Create a missing rollup row for a day from its diet_entries.
+
+    The entries are read after the session's pending changes are flushed,
+    so the row already reflects this transaction. Returns True if the day
+    was seeded now or earlier in the transaction; its deltas are then
+    skipped.
+    """
+    seeded = db.session.info.setdefault('seeded_rollup_days', set())
+    if (user_id, day) in seeded:
+        return True
+    table = DailyNutrition.__table__
+    db.session.flush()
+    exists = db.session.execute(
+        table.select().with_only_columns(table.c.day).where(table.c.user_id == user_id, table.c.day == day)
+    ).first()
+    if exists is not None:
+        return False
+
+    totals = daily_totals_from_entries(user_id, day, day + timedelta(days=1)).get((user_id, day))
+    if totals is not None:
+        row = dict(rollup_row_values(totals), user_id=user_id, day=day)
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table)
+            # A concurrent writer created the row first; apply this change to it as a delta
+            if db.session.execute(insert.values(**row).on_conflict_do_nothing()).rowcount == 0:
+                return False
+        else:
+            db.session.execute(table.insert(), [row])
+    seeded.add((user_id, day))
+    return True
+
+
+def apply_to_rollup(snapshot, sign=1):
+    """
+    Add (sign=1) or subtract (sign=-1) an entry snapshot from daily_nutrition.
+
+    Call after making the change to the entry in the session. A day with
+    no rollup row yet is seeded from diet_entries instead (see
+    _seed_rollup_day).
+
+    Uses INSERT ... ON CONFLICT DO UPDATE where the dialect supports it, so
+    concurrent writers for the same day never race on the row insert.
+    """
+    user_id, day, values = snapshot
+    if _seed_rollup_day(user_id, day):
+        return
+    deltas = {field: sign * value for field, value in values.items()}
+    table = DailyNutrition.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table).values(user_id=user_id, day=day, entry_count=sign, **deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'day'],
+            set_={column: table.c[column] + stmt.excluded[column] for column in ('entry_count',) + DietEntry.NUTRIENT_FIELDS}
+        )
+        db.session.execute(stmt)
+    else:
+        row = db.session.get(DailyNutrition, (user_id, day))
+        if row is None:
+            row = DailyNutrition(user_id=user_id, day=day, entry_count=0, **{field: 0 for field in values})
+            db.session.add(row)
+        row.entry_count += sign
+        for field, delta in deltas.items():
+            setattr(row, field, getattr(row, field) + delta)
+        db.session.flush()
+
+    if sign < 0:
+        db.session.execute(table.delete().where(
+            table.c.user_id == user_id, table.c.day == day, table.c.entry_count <= 0
+        ))
+
+
+def rebuild_rollup(user_id=None):
+    """
+    Recompute daily_nutrition from diet_entries.
+
+    Args:
+        user_id: Optional user to rebuild; all users if omitted
+
+    Returns:
+        Number of rollup rows written
+    """
+    table = DailyNutrition.__table__
+    delete = table.delete()
+    if user_id is not None:
+        delete = delete.where(table.c.user_id == user_id)
+    db.session.execute(delete)
+
+    rows = [
+        dict(rollup_row_values(values), user_id=key[0], day=key[1])
+        for key, values in daily_totals_from_entries(user_id).items()
+    ]
+    if rows:
+        db.session.execute(table.insert(), rows)
+    return len(rows)
+
+
+def rollup_row_values(values):
+    """Map a totals dict onto DailyNutrition column values."""
+    row = {field: values[field] for field in DietEntry.NUTRIENT_FIELDS}
+    row['entry_count'] = values['total_entries']
+    return row
+
+
+def verify_rollup(user_id=None, tolerance=0.01):
+    """
+    Compare daily_nutrition with totals recomputed from diet_entries.
+
+    Returns:
+        List of (user_id, day, rollup_values, recomputed_values) mismatches
+    """
+    expected = daily_totals_from_entries(user_id)
+    query = DailyNutrition.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    actual = {(row.user_id, row.day): rollup_values(row) for row in query}
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        have, want = actual.get(key), expected.get(key)
+        if have is None or want is None or any(abs(have[field] - want[field]) > tolerance for field in want):
+            mismatches.append((key[0], key[1], have, want))
+    return mismatches
+
+
+def bucket_start(day, granularity):
+    """Return the first day of the bucket that contains day."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+
+def rollup_daily_totals(daily, start, end, granularity, calorie_goal):
+    """
+    Fold per-day totals into day/week/month buckets.
+
+    A logged day is "within goal" when it has calories and stays at or
+    under calorie_goal, matching the analytics view.
+
+    Args:
+        daily: Output of daily_nutrient_totals
+        start: First day (inclusive)
+        end: Last day (exclusive)
+        granularity: 'day', 'week' or 'month'
+        calorie_goal: User's daily calorie goal
+
+    Returns:
+        List of bucket dicts in date order, including empty buckets
+    """
+    buckets = []
+    current = bucket_start(start, granularity)
+    while current < end:
+        following = _next_bucket(current, granularity)
+        bucket = {field: 0 for field in DietEntry.NUTRIENT_FIELDS}
+        bucket['total_entries'] = 0
+        days_logged = days_within_goal = 0
+
+        day = max(current, start)
+        while day < min(following, end):
+            totals = daily.get(day)
+            if totals:
+                for field, value in totals.items():
+                    bucket[field] += value
+                if totals['calories'] > 0:
+                    days_logged += 1
+                    if totals['calories'] <= calorie_goal:
+                        days_within_goal += 1
+            day += timedelta(days=1)
+
+        summary = {
+            'period_start': current.isoformat(),
+            'total_entries': bucket['total_entries'],
+            'total_calories': bucket['calories']
+        }
+        for field in DietEntry.NUTRIENT_FIELDS[1:]:
+            summary[f'total_{field}'] = round(bucket[field], 1)
+        summary.update({
+            'days_logged': days_logged,
+            'days_within_goal': days_within_goal,
+            'adherence_percent': round(days_within_goal / days_logged * 100, 1) if days_logged else 0,
+            'average_daily_calories': round(bucket['calories'] / days_logged, 1) if days_logged else 0
+        })
+        buckets.append(summary)
+        current = following
+
+    return buckets
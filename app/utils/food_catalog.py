@@ -0,0 +1,403 @@
+"""
+Local food catalog with an in-memory autocomplete index.
+
+The food_catalog table is seeded from app/data/foods.json and grown from
+foods users have logged and from upstream search results. Each process
+keeps a FoodIndex over it that answers lookups without touching the
+database or the network:
+
+    prefix  - a sorted word list searched with bisect, so "chi" finds
+              "chicken" and "chickpeas"
+    trigram - posting lists of 3-grams for typo tolerance, so "chiken"
+              still finds "chicken"
+"""
+import heapq
+import json
+import re
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.models import DietEntry, FoodCatalogItem
+
+
+BUNDLED_FOODS_PATH = Path(__file__).resolve().parents[1] / 'data' / 'foods.json'
+
+LOCAL_SOURCE = 'Local catalog'
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Split a food name into lowercase alphanumeric words."""
+    return _WORD.findall((text or '').lower())
+
+
+def name_key(text):
+    """Normalized catalog key for a food name ('White Rice (cooked)' -> 'white rice cooked')."""
+    return ' '.join(tokenize(text))
+
+
+def _trigrams(words):
+    grams = set()
+    for word in words:
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def load_bundled_foods(path=BUNDLED_FOODS_PATH):
+    """Read the bundled food dataset."""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FoodIndex:
+    """
+    Prefix + trigram index over catalog items.
+
+    Items are result dicts in the NutritionAPI result shape. Each distinct
+    word keeps a posting list of items ordered by static rank (most logged,
+    then shortest name), so a lookup walks the rarest query word's postings
+    in rank order and stops after `limit` matches. Matches where every query
+    word prefixes a word of the name come first; words found only through
+    trigram similarity (typos) fill in the rest.
+    """
+
+    def __init__(self, min_similarity=0.5):
+        self.min_similarity = min_similarity
+        self.items = []
+        self._keys = {}
+        self._item_words = []
+        self._postings = {}  # word -> [(rank, item index)]
+        self._vocab = []  # sorted distinct words
+        self._word_grams = {}  # trigram -> {word}
+        self._dirty = set()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, food_name):
+        return name_key(food_name) in self._keys
+
+    def add(self, item, times_logged=0):
+        """Add an item, or replace the stored item if the name is already indexed."""
+        key = name_key(item['food_name'])
+        if not key:
+            return
+        if key in self._keys:
+            self.items[self._keys[key]] = item
+            return
+
+        index = len(self.items)
+        words = tuple(key.split())
+        rank = (-times_logged, len(key), key)
+        self._keys[key] = index
+        self.items.append(item)
+        self._item_words.append(words)
+        for word in set(words):
+            if word not in self._postings:
+                self._postings[word] = []
+                for gram in _trigrams([word]):
+                    self._word_grams.setdefault(gram, set()).add(word)
+            self._postings[word].append((rank, index))
+            self._dirty.add(word)
+
+    def _prepare(self):
+        # Sorting is deferred so bulk loads don't pay for it on every add
+        if self._dirty:
+            for word in self._dirty:
+                self._postings[word].sort()
+            self._vocab = sorted(self._postings)
+            self._dirty = set()
+
+    def _prefix_words(self, word):
+        words = []
+        position = bisect_left(self._vocab, word)
+        while position < len(self._vocab) and self._vocab[position].startswith(word):
+            words.append(self._vocab[position])
+            position += 1
+        return words
+
+    def _similar_words(self, word):
+        if len(word) < 3:
+            return []
+        grams = _trigrams([word])
+        shared = {}
+        for gram in grams:
+            for candidate in self._word_grams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        # Dice coefficient; a padded word of n letters has n + 1 trigrams
+        return [
+            candidate for candidate, count in shared.items()
+            if 2 * count / (len(grams) + len(candidate) + 1) >= self.min_similarity
+        ]
+
+    def _collect(self, expansions, limit, seen, results):
+        # Walk the query word with the fewest postings in rank order and
+        # keep items whose other words also match
+        sizes = [sum(len(self._postings[word]) for word in words) for words in expansions]
+        driver = sizes.index(min(sizes))
+        others = [set(words) for position, words in enumerate(expansions) if position != driver]
+
+        for _, index in heapq.merge(*(self._postings[word] for word in expansions[driver])):
+            if index in seen:
+                continue
+            item_words = self._item_words[index]
+            if all(any(word in allowed for word in item_words) for allowed in others):
+                seen.add(index)
+                results.append(index)
+                if len(results) >= limit:
+                    return
+
+    def search(self, query, limit=10):
+        """
+        Find the best matching foods for a query.
+
+        Args:
+            query: Free-text food name, possibly partial or misspelled
+            limit: Maximum number of results
+
+        Returns:
+            List of result dicts, best match first
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        self._prepare()
+
+        seen = set()
+        results = []
+        prefixes = [self._prefix_words(word) for word in words]
+        if all(prefixes):
+            self._collect(prefixes, limit, seen, results)
+
+        if len(results) < limit:
+            fuzzy = [sorted(set(expanded) | set(self._similar_words(word))) for word, expanded in zip(words, prefixes)]
+            if all(fuzzy):
+                self._collect(fuzzy, limit, seen, results)
+
+        return [dict(self.items[index]) for index in results]
+
+
+def catalog_result(row):
+    """Map a FoodCatalogItem onto the NutritionAPI result shape."""
+    result = {
+        'food_id': row.id,
+        'food_unique_id': f'local-{row.id}',
+        'food_name': row.food_name,
+        'common_names': '',
+        'meal_type': '',
+        'serving_type': row.serving_type or '',
+        'serving_size': round(row.serving_size or 100, 2)
+    }
+    for field in DietEntry.NUTRIENT_FIELDS:
+        result[field] = round(getattr(row, field) or 0, 2)
+    result['source'] = LOCAL_SOURCE
+    return result
+
+
+def _bundled_result(position, food):
+    result = {
+        'food_id': None,
+        'food_unique_id': f'bundled-{position}',
+        'food_name': food['food_name'],
+        'common_names': '',
+        'meal_type': '',
+        'serving_type': food.get('serving_type', ''),
+        'serving_size': food.get('serving_size', 100)
+    }
+    for field in DietEntry.NUTRIENT_FIELDS:
+        result[field] = food.get(field, 0)
+    result['source'] = LOCAL_SOURCE
+    return result
+
+
+def _catalog_row(food, source, times_logged=0):
+    values = {
+        'name_key': name_key(food['food_name']),
+        'food_name': food['food_name'],
+        'serving_type': food.get('serving_type') or None,
+        'serving_size': food.get('serving_size'),
+        'source': source,
+        'times_logged': times_logged
+    }
+    for field in DietEntry.NUTRIENT_FIELDS:
+        values[field] = food.get(field) or 0
+    return values
+
+
+def logged_food_averages():
+    """
+    Average per-entry nutrients of every food users have logged.
+
+    Returns:
+        dict mapping name_key to {'food_name', 'times_logged', <nutrient>: average}
+    """
+    averages = [func.avg(getattr(DietEntry, field)) for field in DietEntry.NUTRIENT_FIELDS]
+    rows = db.session.query(DietEntry.food_item, func.count(DietEntry.id), *averages).group_by(
+        DietEntry.food_item
+    ).all()
+
+    foods = {}
+    for food_item, count, *values in rows:
+        key = name_key(food_item)
+        if not key:
+            continue
+        food = foods.setdefault(key, {'food_name': food_item.strip(), 'times_logged': 0})
+        # Spellings that normalize to the same key are merged, weighted by use
+        total = food['times_logged'] + count
+        for field, value in zip(DietEntry.NUTRIENT_FIELDS, values):
+            food[field] = (food.get(field, 0) * food['times_logged'] + (value or 0) * count) / total
+        food['times_logged'] = total
+    return foods
+
+
+def rebuild_catalog(api_results=()):
+    """
+    Recreate the food_catalog table.
+
+    Bundled foods take precedence, then upstream results, then foods that
+    only exist in users' diet history. Logged counts apply to every source.
+
+    Args:
+        api_results: Iterable of cached NutritionAPI result dicts
+
+    Returns:
+        dict of row counts per source
+    """
+    history = logged_food_averages()
+    rows = {}
+    for source, foods in (('bundled', load_bundled_foods()), ('api', api_results), ('history', history.values())):
+        for food in foods:
+            key = name_key(food.get('food_name'))
+            if key and key not in rows:
+                logged = history.get(key, {}).get('times_logged', 0)
+                rows[key] = _catalog_row(food, source, logged)
+
+    db.session.execute(FoodCatalogItem.__table__.delete())
+    if rows:
+        db.session.execute(FoodCatalogItem.__table__.insert(), list(rows.values()))
+
+    counts = {'bundled': 0, 'api': 0, 'history': 0}
+    for row in rows.values():
+        counts[row['source']] += 1
+    return counts
+
+
+class FoodCatalog:
+    """
+    Per-process FoodIndex over the food_catalog table.
+
+    The index is built on first use and rebuilt when the table changes,
+    which is checked at most every reload_interval seconds.
+    """
+
+    def __init__(self, reload_interval=60):
+        self.reload_interval = reload_interval
+        self._index = None
+        self._version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _table_version(self):
+        return tuple(db.session.query(func.count(FoodCatalogItem.id), func.max(FoodCatalogItem.updated_at)).one())
+
+    def _load(self):
+        # Bundled foods are always indexed; catalog rows replace them by name
+        foods = {}
+        for position, food in enumerate(load_bundled_foods()):
+            foods[name_key(food['food_name'])] = (_bundled_result(position, food), 0)
+        try:
+            version = self._table_version()
+            rows = FoodCatalogItem.query.all()
+        except SQLAlchemyError as e:
+            # Catalog table missing (run init_db.py); serve the bundled foods
+            print(f"Food catalog unavailable, using bundled foods: {e}")
+            db.session.rollback()
+            version, rows = None, []
+
+        for row in rows:
+            foods[row.name_key] = (catalog_result(row), row.times_logged)
+        index = FoodIndex()
+        for item, times_logged in foods.values():
+            index.add(item, times_logged)
+        return index, version
+
+    def index(self):
+        """Return the current index, loading or refreshing it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            if self._index is not None and now - self._checked_at < self.reload_interval:
+                return self._index
+            self._checked_at = now
+            try:
+                stale = self._index is None or self._table_version() != self._version
+            except SQLAlchemyError:
+                db.session.rollback()
+                stale = self._index is None
+            if stale:
+                self._index, self._version = self._load()
+            return self._index
+
+    def search(self, query, limit=10):
+        """Search the local catalog; see FoodIndex.search."""
+        index = self.index()
+        # remember() adds to the same index under the lock
+        with self._lock:
+            return index.search(query, limit)
+
+    def remember(self, results):
+        """
+        Add upstream results for foods the catalog doesn't know yet.
+
+        The rows are written in the caller's transaction; the caller commits.
+
+        Args:
+            results: NutritionAPI result dicts
+
+        Returns:
+            Number of foods added
+        """
+        index = self.index()
+        new_rows = {}
+        with self._lock:
+            for result in results:
+                key = name_key(result.get('food_name'))
+                if key and key not in new_rows and result['food_name'] not in index:
+                    new_rows[key] = _catalog_row(result, 'api')
+        if not new_rows:
+            return 0
+
+        try:
+            existing = {key for (key,) in db.session.query(FoodCatalogItem.name_key).filter(
+                FoodCatalogItem.name_key.in_(list(new_rows))
+            )}
+            rows = [row for key, row in new_rows.items() if key not in existing]
+            if rows:
+                db.session.execute(FoodCatalogItem.__table__.insert(), rows)
+        except SQLAlchemyError as e:
+            print(f"Food catalog write error: {e}")
+            db.session.rollback()
+            return 0
+
+        with self._lock:
+            for result in results:
+                if name_key(result.get('food_name')) in new_rows:
+                    index.add(result)
+        return len(rows)
+
+    def invalidate(self):
+        """Drop the index so the next lookup reloads it."""
+        with self._lock:
+            self._index = None
+            self._version = None
+
+
+# Global instance
+food_catalog = FoodCatalog()
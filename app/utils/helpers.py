@@ -1,4 +1,5 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from app.models import DietEntry
 
 
 def calculate_streak(logs):
@@ -22,15 +23,8 @@ def calculate_streak(logs):
     # Filter logs to only completed status
     completed_logs = [log for log in logs if log.status in ['completed', None]]
     
-    # Get unique dates from completed logs
-    dates = []
-    for log in completed_logs:
-        log_date = log.completed_at.date()
-        if log_date not in dates:
-            dates.append(log_date)
-    
-    # Sort dates in descending order
-    dates.sort(reverse=True)
+    # Get unique dates from completed logs, sorted in descending order
+    dates = sorted({log.completed_at.date() for log in completed_logs}, reverse=True)
     
     if not dates:
         return {
@@ -113,6 +107,62 @@ def parse_date(date_string):
     return datetime.utcnow()
 
 
+def as_date(value):
+    """
+    Normalize a func.date() result to a date object.
+
+    SQLite returns the day as an ISO string, other databases as a date.
+    """
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def summarize_diet_entries(entries, calorie_goal):
+    """
+    Total up nutrients for a list of diet entries.
+    
+    Args:
+        entries: List of DietEntry objects
+        calorie_goal: User's daily calorie goal
+        
+    Returns:
+        dict in the /diet/summary response format
+    """
+    totals = {field: sum(getattr(e, field) or 0 for e in entries) for field in DietEntry.NUTRIENT_FIELDS}
+    totals['total_entries'] = len(entries)
+    return format_diet_summary(totals, calorie_goal)
+
+
+def format_diet_summary(totals, calorie_goal):
+    """
+    Build the /diet/summary response from nutrient totals.
+    
+    Args:
+        totals: dict with 'total_entries' and one total per nutrient field
+        calorie_goal: User's daily calorie goal
+        
+    Returns:
+        dict in the /diet/summary response format
+    """
+    total_entries = totals['total_entries']
+    total_calories = totals['calories']
+    
+    calorie_goal = calorie_goal or 2000
+    calorie_percentage = round((total_calories / calorie_goal) * 100, 1) if calorie_goal > 0 else 0
+    
+    summary = {
+        'total_entries': total_entries,
+        'total_calories': total_calories
+    }
+    for field in DietEntry.NUTRIENT_FIELDS[1:]:
+        summary[f'total_{field}'] = round(totals[field], 1)
+    summary.update({
+        'average_calories_per_entry': total_calories / total_entries if total_entries else 0,
+        'calorie_goal': calorie_goal,
+        'calorie_percentage': calorie_percentage
+    })
+    return summary
+
+
 def validate_habit_data(data):
     """
     Validate habit creation/update data.
@@ -0,0 +1,321 @@
+"""
+Investment transaction ledger with FIFO lots and per-position snapshots.
+
+Every buy, sell, dividend and split is an InvestmentTransaction. Each
+(user, instrument_type, symbol, instrument_key) has one Position row
+holding the result of applying its transactions in (trade_date, id) order:
+the open FIFO lots, quantity, remaining cost basis, realized gain and
+dividends received. Instruments without a symbol are told apart by their
+instrument_key, so two FDs never share a position.
+
+Recording a transaction dated on or after the position's last trade
+applies it to the snapshot directly. A backdated transaction, or a
+removal, replays that one position's transactions. Nothing here commits;
+callers commit together with their own changes.
+"""
+from app import db
+from app.models import Investment, InvestmentTransaction, Position
+
+
+KINDS = ('buy', 'sell', 'dividend', 'split')
+
+# Quantities below this are treated as zero (float residue from partial sells)
+QUANTITY_EPSILON = 1e-9
+
+
+class LedgerError(ValueError):
+    """Raised for a transaction that can't be applied, e.g. selling more than is held."""
+
+
+class PositionState:
+    """
+    Position arithmetic shared by snapshots and history replays.
+
+    Args:
+        lots: Open lots as [day ordinal, quantity, unit cost], oldest first
+        realized_gain: Gain realized by earlier sells
+        dividends: Dividends received so far
+    """
+
+    def __init__(self, lots=(), realized_gain=0.0, dividends=0.0):
+        self.lots = [list(lot) for lot in lots]
+        self.realized_gain = realized_gain
+        self.dividends = dividends
+
+    @property
+    def quantity(self):
+        return sum(lot[1] for lot in self.lots)
+
+    @property
+    def cost_basis(self):
+        return sum(lot[1] * lot[2] for lot in self.lots)
+
+    def apply(self, kind, trade_date, quantity=None, price=None, amount=None, ratio=None):
+        """
+        Apply one transaction.
+
+        Raises:
+            LedgerError: A sell exceeds the units held
+        """
+        if kind == 'buy':
+            self.lots.append([trade_date.toordinal(), quantity, price])
+        elif kind == 'sell':
+            if quantity > self.quantity + QUANTITY_EPSILON:
+                raise LedgerError(f'Cannot sell {quantity:g} units on {trade_date.isoformat()}; only {self.quantity:g} held')
+            remaining, cost = quantity, 0.0
+            while remaining > QUANTITY_EPSILON and self.lots:
+                lot = self.lots[0]
+                used = min(lot[1], remaining)
+                cost += used * lot[2]
+                lot[1] -= used
+                remaining -= used
+                if lot[1] <= QUANTITY_EPSILON:
+                    self.lots.pop(0)
+            self.realized_gain += quantity * price - cost
+        elif kind == 'dividend':
+            self.dividends += amount
+        elif kind == 'split':
+            for lot in self.lots:
+                lot[1] *= ratio
+                lot[2] /= ratio
+
+    def apply_transaction(self, txn):
+        self.apply(txn.kind, txn.trade_date, txn.quantity, txn.price, txn.amount, txn.ratio)
+
+
+def _store(position, state):
+    position.lots = state.lots
+    position.quantity = state.quantity if state.quantity > QUANTITY_EPSILON else 0.0
+    position.cost_basis = state.cost_basis
+    position.realized_gain = state.realized_gain
+    position.dividends = state.dividends
+
+
+def instrument_key(symbol, instrument_name=None, investment_id=None):
+    """
+    Key identifying an instrument that has no symbol.
+
+    A symbol-less lot entered through /investments (an FD, a gold purchase)
+    is a position of its own; other symbol-less entries are grouped by
+    instrument name. Instruments with a symbol don't need a key.
+    """
+    if symbol:
+        return ''
+    if investment_id is not None:
+        return f'lot:{investment_id}'
+    return 'name:' + ' '.join((instrument_name or '').lower().split())
+
+
+def get_position(user_id, instrument_type, symbol, instrument_name=None, key=''):
+    """Return the user's position for an instrument, creating an empty one."""
+    symbol = symbol or ''
+    position = Position.query.filter_by(
+        user_id=user_id, instrument_type=instrument_type, symbol=symbol, instrument_key=key
+    ).first()
+    if position is None:
+        position = Position(
+            user_id=user_id,
+            instrument_type=instrument_type,
+            symbol=symbol,
+            instrument_key=key,
+            instrument_name=instrument_name or symbol or instrument_type,
+            quantity=0.0,
+            cost_basis=0.0,
+            realized_gain=0.0,
+            dividends=0.0,
+            lots=[],
+            transaction_count=0
+        )
+        db.session.add(position)
+        db.session.flush()
+    return position
+
+
+def rebuild_position(position):
+    """Recompute a position snapshot by replaying its transactions."""
+    transactions = position.transactions.order_by(
+        InvestmentTransaction.trade_date, InvestmentTransaction.id
+    ).all()
+    state = PositionState()
+    for txn in transactions:
+        state.apply_transaction(txn)
+    _store(position, state)
+    position.transaction_count = len(transactions)
+    position.first_trade_date = transactions[0].trade_date if transactions else None
+    position.last_trade_date = transactions[-1].trade_date if transactions else None
+    return position
+
+
+def record_transaction(user_id, instrument_type, symbol, kind, trade_date, quantity=None, price=None,
+                       amount=None, ratio=None, instrument_name=None, investment_id=None, notes=None):
+    """
+    Add a transaction and update its position.
+
+    Args:
+        user_id: Owner
+        instrument_type: stock, mutual_fund, fd, ...
+        symbol: Instrument symbol ('' if none)
+        kind: 'buy', 'sell', 'dividend' or 'split'
+        trade_date: date of the transaction
+        quantity, price: Units and price per unit (buy and sell)
+        amount: Dividend received (buys and sells derive it)
+        ratio: New units per old unit (split)
+        instrument_name: Display name for a new position (and the position
+            key of a symbol-less instrument)
+        investment_id: Investment lot this buy belongs to, if any; a
+            symbol-less lot gets a position of its own
+
+    Returns:
+        The new InvestmentTransaction
+
+    Raises:
+        LedgerError: Invalid fields, or a sell exceeding the units held
+    """
+    if kind not in KINDS:
+        raise LedgerError(f"Kind must be one of: {', '.join(KINDS)}")
+    if kind in ('buy', 'sell'):
+        if quantity is None or price is None or quantity <= 0 or price < 0:
+            raise LedgerError(f'{kind.title()} needs a positive quantity and a price')
+        amount = -quantity * price if kind == 'buy' else quantity * price
+    elif kind == 'dividend':
+        if amount is None or amount <= 0:
+            raise LedgerError('Dividend needs a positive amount')
+        quantity = price = None
+    else:
+        if ratio is None or ratio <= 0:
+            raise LedgerError('Split needs a positive ratio')
+        quantity = price = None
+        amount = 0.0
+
+    key = instrument_key(symbol, instrument_name, investment_id)
+    position = get_position(user_id, instrument_type, symbol, instrument_name, key)
+    txn = InvestmentTransaction(
+        user_id=user_id,
+        position_id=position.id,
+        investment_id=investment_id,
+        kind=kind,
+        trade_date=trade_date,
+        quantity=quantity,
+        price=price,
+        amount=amount,
+        ratio=ratio,
+        notes=notes
+    )
+    db.session.add(txn)
+    db.session.flush()
+
+    if position.last_trade_date is not None and trade_date < position.last_trade_date:
+        rebuild_position(position)
+        return txn
+
+    state = PositionState(position.lots, position.realized_gain, position.dividends)
+    state.apply_transaction(txn)
+    _store(position, state)
+    position.transaction_count += 1
+    position.first_trade_date = position.first_trade_date or trade_date
+    position.last_trade_date = trade_date
+    return txn
+
+
+def remove_transactions(transactions):
+    """
+    Delete transactions and replay the positions they belonged to.
+
+    Raises:
+        LedgerError: Removing them would leave a later sell uncovered
+    """
+    positions = {txn.position_id: txn.position for txn in transactions}
+    for txn in transactions:
+        db.session.delete(txn)
+    db.session.flush()
+    for position in positions.values():
+        rebuild_position(position)
+
+
+def set_manual_price(position, price, priced_at):
+    """Record an entered price for a position (used when it has no quote)."""
+    position.manual_price = price
+    position.manual_priced_at = priced_at
+
+
+def record_investment(investment):
+    """Record an Investment lot as a buy transaction on its position."""
+    txn = record_transaction(
+        investment.user_id, investment.instrument_type, investment.symbol, 'buy', investment.buy_date,
+        quantity=investment.quantity, price=investment.buy_price,
+        instrument_name=investment.instrument_name, investment_id=investment.id
+    )
+    if investment.current_price is not None:
+        set_manual_price(txn.position, investment.current_price, investment.last_updated)
+    return txn
+
+
+def unrecorded_lots(user_id=None):
+    """Query for Investment lots that have no ledger transaction yet."""
+    recorded = db.session.query(InvestmentTransaction.id).filter(InvestmentTransaction.investment_id == Investment.id)
+    query = Investment.query.filter(~recorded.exists())
+    if user_id is not None:
+        query = query.filter(Investment.user_id == user_id)
+    return query
+
+
+def migrate_investments(user_id=None):
+    """
+    Record every Investment lot without a ledger entry as a buy.
+
+    The most recently updated lot's price becomes the position's manual
+    price. Safe to re-run.
+
+    Returns:
+        Number of lots migrated
+    """
+    migrated = 0
+    for investment in unrecorded_lots(user_id).order_by(Investment.last_updated, Investment.id).all():
+        record_investment(investment)
+        migrated += 1
+    return migrated
+
+
+def migrate_user(user_id):
+    """
+    Migrate a user's lots that have no ledger transaction yet.
+
+    Lets the app serve users whose lots predate the ledger before
+    add_transaction_ledger.py has been run, including users who have
+    added lots since.
+
+    Returns:
+        Number of lots migrated
+    """
+    # Plain read first, so requests with nothing to migrate stay on the replica
+    if not db.session.query(unrecorded_lots(user_id).exists()).scalar():
+        return 0
+    # A locking read: it moves the rest of a GET to the primary (see
+    # read_routing) and makes concurrent migrations of one user take turns
+    if unrecorded_lots(user_id).with_for_update().first() is None:
+        return 0
+    return migrate_investments(user_id)
+
+
+def check_positions(user_id=None, tolerance=1e-6):
+    """
+    Compare stored snapshots with a full replay.
+
+    Returns:
+        List of (position id, field, stored, replayed) mismatches
+    """
+    query = Position.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+
+    mismatches = []
+    for position in query.all():
+        state = PositionState()
+        for txn in position.transactions.order_by(InvestmentTransaction.trade_date, InvestmentTransaction.id):
+            state.apply_transaction(txn)
+        for field in ('quantity', 'cost_basis', 'realized_gain', 'dividends'):
+            stored, replayed = getattr(position, field), getattr(state, field)
+            if abs(stored - replayed) > tolerance:
+                mismatches.append((position.id, field, stored, replayed))
+    return mismatches
+
@@ -0,0 +1,31 @@
+"""NSE/BSE trading calendar helpers (sessions only; exchange holidays are not modelled)."""
+from datetime import datetime, time as dt_time, timedelta, timezone
+
+
+# NSE/BSE trade 09:15-15:30 IST, Monday to Friday
+MARKET_TZ = timezone(timedelta(hours=5, minutes=30))
+MARKET_OPEN = dt_time(9, 15)
+MARKET_CLOSE = dt_time(15, 30)
+
+
+def market_now():
+    return datetime.now(MARKET_TZ)
+
+
+def market_is_open(now=None):
+    """Return True during an NSE/BSE trading session."""
+    now = now or market_now()
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def seconds_until_open(now=None):
+    """Seconds until the next session opens (0 while the market is open)."""
+    now = now or market_now()
+    if market_is_open(now):
+        return 0
+    candidate = now.replace(hour=MARKET_OPEN.hour, minute=MARKET_OPEN.minute, second=0, microsecond=0)
+    if now.time() >= MARKET_OPEN:
+        candidate += timedelta(days=1)
+    while candidate.weekday() >= 5:
+        candidate += timedelta(days=1)
+    return (candidate - now).total_seconds()
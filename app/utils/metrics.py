@@ -0,0 +1,276 @@
+"""
+Request, SQL and outbound-call metrics in Prometheus text format.
+
+metrics.init_app() times every request per endpoint, method and status,
+counts the SQL statements and database time each request spends (through
+SQLAlchemy engine events) and serves everything on /metrics, together
+with the counters the app's caches and clients already keep.
+
+Outbound calls are timed with track_outbound(service, operation), e.g.
+around the nutrition API and Yahoo Finance requests.
+
+Recording is a perf_counter pair, a bisect and a short lock per
+observation, so it is cheap enough to leave on in production. It is off
+unless METRICS_ENABLED is set; set METRICS_TOKEN as well wherever
+/metrics can be reached by more than the scraper.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+PREFIX = 'life_ledger_'
+
+# [start, SQL statements, SQL seconds] for the request being served, if any
+_current_request = ContextVar('metrics_request', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets and labels."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, *labels):
+        """Return (count, sum) for one label set."""
+        with self._lock:
+            series = self._series.get(labels)
+            return (series[2], series[1]) if series else (0, 0.0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Metrics:
+    """The app's metric families plus exported stats from caches and clients."""
+
+    def __init__(self):
+        self.enabled = False
+        self.token = None
+        self.requests = Histogram(
+            'http_request_duration_seconds', 'Request latency by endpoint, method and status.',
+            ('endpoint', 'method', 'status')
+        )
+        self.request_statements = Histogram(
+            'http_request_sql_statements', 'SQL statements executed per request.',
+            ('endpoint',), STATEMENT_BUCKETS
+        )
+        self.request_db_time = Histogram(
+            'http_request_db_seconds', 'Time spent executing SQL per request.', ('endpoint',)
+        )
+        self.statements = Counter('sql_statements_total', 'SQL statements executed (requests and background work).')
+        self.statement_time = Counter('sql_statement_seconds_total', 'Time spent executing SQL statements.')
+        self.outbound = Histogram(
+            'outbound_request_duration_seconds', 'Outbound call latency by service, operation and outcome.',
+            ('service', 'operation', 'outcome')
+        )
+        self._families = [
+            self.requests, self.request_statements, self.request_db_time,
+            self.statements, self.statement_time, self.outbound
+        ]
+        self._stats = {}
+
+    def init_app(self, app):
+        """Hook request timing and SQL counting into the app and add /metrics."""
+        self.enabled = app.config.get('METRICS_ENABLED', False)
+        self.token = app.config.get('METRICS_TOKEN') or None
+        if not self.enabled:
+            return
+
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _statement_failed)
+        app.add_url_rule('/metrics', 'metrics', _metrics_view)
+        self._register_default_stats()
+
+    def _register_default_stats(self):
+        from app.utils.nutrition_api import nutrition_api
+        from app.utils.portfolio_summary import portfolio_cache
+        from app.utils.principal_cache import principal_cache
+        from app.utils.read_routing import read_router
+        from app.utils.sqlite_profile import sqlite_profile
+        from app.utils.stock_prices import stock_prices
+
+        self.register_stats('principal_cache', principal_cache.stats)
+        self.register_stats('portfolio_cache', portfolio_cache.stats)
+        self.register_stats('stock_price_cache', stock_prices.stats)
+        self.register_stats('nutrition', nutrition_api.cache_stats)
+        self.register_stats('sqlite', sqlite_profile.stats)
+        self.register_stats('read_routing', read_router.stats)
+
+    def register_stats(self, name, collect):
+        """
+        Export a stats() callable as gauges named life_ledger_<name>_<key>.
+
+        Nested dicts are flattened; string values become a labelled gauge of 1
+        (e.g. breaker_state{value="closed"}).
+        """
+        self._stats[name] = collect
+
+    def _render_stats(self, prefix, stats, lines):
+        for key, value in sorted(stats.items()):
+            name = f'{prefix}_{key}'
+            if isinstance(value, dict):
+                self._render_stats(name, value, lines)
+            elif isinstance(value, bool):
+                lines.append(f'{name} {int(value)}')
+            elif isinstance(value, (int, float)):
+                lines.append(f'{name} {_number(value)}')
+            elif value is not None:
+                lines.append(f'{name}{{value="{_escape(value)}"}} 1')
+
+    def render(self):
+        """All metrics in Prometheus text exposition format."""
+        lines = []
+        for family in self._families:
+            lines.extend(family.render())
+        for name, collect in sorted(self._stats.items()):
+            try:
+                stats = collect()
+            except Exception as e:
+                print(f"Metrics collection failed for {name}: {type(e).__name__}: {e}")
+                continue
+            self._render_stats(PREFIX + name, stats, lines)
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def track_outbound(service, operation):
+    """Time an outbound call; outcome is 'ok' unless the block raises."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        metrics.outbound.observe(time.perf_counter() - start, service, operation, outcome)
+
+
+def _start_request():
+    _current_request.set([time.perf_counter(), 0, 0.0])
+
+
+def _finish_request(response):
+    current = _current_request.get()
+    if current is not None:
+        _current_request.set(None)
+        start, statements, seconds = current
+        rule = request.url_rule
+        endpoint = rule.endpoint if rule is not None else 'unmatched'
+        metrics.requests.observe(time.perf_counter() - start, endpoint, request.method, str(response.status_code))
+        metrics.request_statements.observe(statements, endpoint)
+        metrics.request_db_time.observe(seconds, endpoint)
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    metrics.statements.inc()
+    metrics.statement_time.inc(amount=elapsed)
+
+    current = _current_request.get()
+    if current is not None:
+        current[1] += 1
+        current[2] += elapsed
+
+
+def _statement_failed(context):
+    # after_cursor_execute doesn't run for a failed statement; drop its start time
+    conn = context.connection
+    starts = conn.info.get('metrics_query_start') if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def _metrics_view():
+    if metrics.token and request.headers.get('Authorization') != f'Bearer {metrics.token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Global instance
+metrics = Metrics()
@@ -1,7 +1,186 @@
 """Nutrition API integration using RapidAPI BonAppetee."""
-import http.client
 import json
 import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+from app.utils.food_catalog import food_catalog
+from app.utils.upstream_client import CircuitBreaker, PooledHTTPClient, UpstreamError
+
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[2] / 'instance' / 'nutrition_cache.db'
+
+
+def normalize_query(query):
+    """Normalize a food query into a cache key ('  Brown  Rice' -> 'brown rice')."""
+    return ' '.join((query or '').lower().split())
+
+
+class NutritionCache:
+    """
+    Two-tier cache for food search results.
+    
+    An in-process LRU sits in front of a small SQLite store, so results
+    survive restarts and are shared between worker processes. Entries carry
+    their own expiry, which lets empty results use a shorter TTL. Expired
+    entries are kept on disk for stale_ttl more seconds so they can still be
+    served while the upstream is down.
+    """
+    
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=1024, ttl=7 * 24 * 3600, negative_ttl=3600,
+                 stale_ttl=30 * 24 * 3600):
+        self.path = str(path) if path else None
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_ready = False
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stale_served': 0}
+    
+    def _connect(self):
+        if not self._disk_ready:
+            # sqlite3 can't create the instance/ directory on a fresh checkout
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._disk_ready:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS food_search_cache ('
+                'query TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._disk_ready = True
+        return conn
+    
+    def get(self, key):
+        """Return the cached result for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry[1]
+        
+        if self.path:
+            try:
+                conn = self._connect()
+                try:
+                    row = conn.execute(
+                        'SELECT payload, expires_at FROM food_search_cache WHERE query = ? AND expires_at > ?',
+                        (key, now)
+                    ).fetchone()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Nutrition cache read error: {e}")
+                row = None
+            if row:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                return value
+        
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+    
+    def set(self, key, value):
+        """Store a successful result; empty result sets get the negative TTL."""
+        ttl = self.ttl if value.get('results') else self.negative_ttl
+        expires_at = time.time() + ttl
+        self._remember(key, value, expires_at)
+        
+        if self.path:
+            try:
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.execute(
+                            'INSERT OR REPLACE INTO food_search_cache (query, payload, expires_at) VALUES (?, ?, ?)',
+                            (key, json.dumps(value), expires_at)
+                        )
+                        # Opportunistically drop a few rows that are too old to serve stale
+                        conn.execute(
+                            'DELETE FROM food_search_cache WHERE query IN '
+                            '(SELECT query FROM food_search_cache WHERE expires_at <= ? LIMIT 16)',
+                            (time.time() - self.stale_ttl,)
+                        )
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Nutrition cache write error: {e}")
+    
+    def get_stale(self, key):
+        """Return the last stored result for key even if it has expired, or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+        value = entry[1] if entry else None
+        
+        if value is None and self.path:
+            try:
+                conn = self._connect()
+                try:
+                    row = conn.execute(
+                        'SELECT payload FROM food_search_cache WHERE query = ?', (key,)
+                    ).fetchone()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Nutrition cache read error: {e}")
+                row = None
+            value = json.loads(row[0]) if row else None
+        
+        if value is not None:
+            with self._lock:
+                self.stats['stale_served'] += 1
+        return value
+    
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+    
+    def cached_results(self):
+        """Yield every food result held in the disk tier that hasn't expired."""
+        if not self.path or not Path(self.path).exists():
+            return
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT payload FROM food_search_cache WHERE expires_at > ?', (time.time(),)
+            ).fetchall()
+        finally:
+            conn.close()
+        for (payload,) in rows:
+            yield from json.loads(payload).get('results', [])
+    
+    def clear(self):
+        """Empty both tiers."""
+        with self._lock:
+            self._memory.clear()
+        if self.path and Path(self.path).exists():
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('DELETE FROM food_search_cache')
+            finally:
+                conn.close()
+
+
+class _InFlight:
+    """A pending upstream lookup that identical concurrent queries wait on."""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
 
 
 class NutritionAPI:
@@ -10,10 +189,40 @@ class NutritionAPI:
     def __init__(self):
         self.rapidapi_key = os.getenv('RAPIDAPI_KEY', '80cc30ee31mshcd21525840546bdp157a45jsnf21911d55de1')
         self.rapidapi_host = "bonhappetee-food-nutrition-api2.p.rapidapi.com"
+        self.cache = NutritionCache(
+            path=os.getenv('NUTRITION_CACHE_PATH', str(DEFAULT_CACHE_PATH)),
+            max_entries=int(os.getenv('NUTRITION_CACHE_SIZE', 1024)),
+            ttl=int(os.getenv('NUTRITION_CACHE_TTL', 7 * 24 * 3600)),
+            negative_ttl=int(os.getenv('NUTRITION_CACHE_NEGATIVE_TTL', 3600))
+        )
+        
+        # NUTRITION_API_URL can point the client at a local stub server
+        upstream = urlsplit(os.getenv('NUTRITION_API_URL', f'https://{self.rapidapi_host}'))
+        self.client = PooledHTTPClient(
+            upstream.hostname,
+            upstream.port,
+            upstream.scheme,
+            pool_size=int(os.getenv('NUTRITION_API_POOL_SIZE', 4)),
+            timeout=float(os.getenv('NUTRITION_API_TIMEOUT', 4.0)),
+            retries=int(os.getenv('NUTRITION_API_RETRIES', 2)),
+            backoff=float(os.getenv('NUTRITION_API_BACKOFF', 0.2)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('NUTRITION_API_BREAKER_THRESHOLD', 5)),
+                reset_timeout=float(os.getenv('NUTRITION_API_BREAKER_RESET', 30))
+            ),
+            name='nutrition'
+        )
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.upstream_calls = 0
+        self.coalesced = 0
     
     def search_food(self, query):
         """
-        Search for food using BonAppetee API.
+        Search for food, serving repeated queries from the cache.
+        
+        Concurrent identical queries share a single upstream request. When
+        the upstream fails, the last cached result is served even if stale.
         
         Args:
             query: Food name to search
@@ -21,22 +230,71 @@ class NutritionAPI:
         Returns:
             List of food items with nutrition data
         """
+        key = normalize_query(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        with self._inflight_lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+        
+        if not leader:
+            call.done.wait(timeout=30)
+            if call.result is not None:
+                with self._inflight_lock:
+                    self.coalesced += 1
+                return call.result
+            # Leader timed out or failed outright; make our own request
+            return self._search_upstream(key)
+        
         try:
-            conn = http.client.HTTPSConnection(self.rapidapi_host)
+            result = self._search_upstream(key)
+            if result.get('success'):
+                self.cache.set(key, result)
+            else:
+                result = self.cache.get_stale(key) or result
+            call.result = result
+            return result
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+    
+    def cache_stats(self):
+        """Return cache hit/miss counters and upstream call counts."""
+        stats = dict(self.cache.stats)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0
+        stats['upstream_calls'] = self.upstream_calls
+        stats['coalesced'] = self.coalesced
+        stats['upstream'] = self.client.stats()
+        return stats
+    
+    def _search_upstream(self, query):
+        """
+        Search for food using BonAppetee API.
+        
+        Args:
+            query: Food name to search
             
+        Returns:
+            List of food items with nutrition data
+        """
+        with self._inflight_lock:
+            self.upstream_calls += 1
+        
+        try:
             headers = {
                 'x-rapidapi-key': self.rapidapi_key,
                 'x-rapidapi-host': self.rapidapi_host
             }
             
-            # URL encode the query
-            encoded_query = query.replace(' ', '%20')
-            conn.request("GET", f"/search?value={encoded_query}", headers=headers)
+            status, data = self.client.request("GET", f"/search?value={quote(query)}", headers=headers)
             
-            res = conn.getresponse()
-            data = res.read()
-            
-            if res.status == 200:
+            if status == 200:
                 response_data = json.loads(data.decode("utf-8"))
                 items = response_data.get('items', [])
                 
@@ -85,13 +343,20 @@ class NutritionAPI:
                     'pages': response_data.get('pages', 1)
                 }
             else:
-                print(f"BonAppetee API error: Status {res.status}")
+                print(f"BonAppetee API error: Status {status}")
                 return {
                     'success': False,
                     'results': [],
-                    'error': f'API returned status {res.status}'
+                    'error': f'API returned status {status}'
                 }
                 
+        except UpstreamError as e:
+            print(f"BonAppetee API unavailable: {e}")
+            return {
+                'success': False,
+                'results': [],
+                'error': 'Nutrition service is temporarily unavailable'
+            }
         except Exception as e:
             print(f"BonAppetee API error: {e}")
             return {
@@ -123,13 +388,29 @@ class NutritionAPI:
         Main method to lookup food nutrition.
         Returns list of matching foods for user to choose from.
         
+        Foods in the local catalog are answered without calling the API;
+        new foods found upstream are added to the catalog.
+        
         Args:
             food_name: Food name to search
             
         Returns:
             Dict with list of results or error
         """
-        return self.search_food(food_name)
+        local_results = food_catalog.search(food_name)
+        if local_results:
+            return {
+                'success': True,
+                'results': local_results,
+                'total_results': len(local_results),
+                'page': 1,
+                'pages': 1
+            }
+        
+        result = self.search_food(food_name)
+        if result.get('success') and result.get('results'):
+            food_catalog.remember(result['results'])
+        return result
 
 
 # Global instance
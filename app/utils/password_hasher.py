@@ -0,0 +1,113 @@
+"""Off-thread bcrypt hashing for the auth routes."""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full and the caller should back off."""
+
+
+def _hash_password(password, rounds):
+    """Hash a password with bcrypt (runs in a worker process)."""
+    salt = bcrypt.gensalt(rounds=rounds, prefix=b'2b')
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def _check_password(pw_hash, password):
+    """Check a password against a bcrypt hash (runs in a worker process)."""
+    return bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+
+
+def hash_cost(pw_hash):
+    """
+    Return the bcrypt work factor encoded in a hash.
+
+    Args:
+        pw_hash: bcrypt hash string, e.g. '$2b$12$...'
+
+    Returns:
+        int cost, or None if the hash is not in bcrypt format
+    """
+    try:
+        return int(pw_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a process pool behind a bounded queue.
+
+    With PASSWORD_HASH_WORKERS = 0 hashing runs inline on the request
+    thread, which is what the testing config uses.
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self.queue_size = 0
+        self.queue_timeout = 0
+        self.rounds = 12
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read hashing settings from the app config."""
+        self.shutdown()
+        workers = app.config.get('PASSWORD_HASH_WORKERS')
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.queue_size = app.config.get('PASSWORD_HASH_QUEUE_SIZE', 32)
+        self.queue_timeout = app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2.0)
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size) if self.workers else None
+
+    def _get_executor(self):
+        # Created lazily so the pool is not forked into reloader/parent processes
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HasherBusy('Password hashing queue is full')
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Return a bcrypt hash of password at the configured work factor."""
+        return self._run(_hash_password, password, self.rounds)
+
+    def check(self, pw_hash, password):
+        """Return True if password matches pw_hash."""
+        return self._run(_check_password, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """Return True if pw_hash was made with a different work factor."""
+        return hash_cost(pw_hash) != self.rounds
+
+    def shutdown(self):
+        """Stop the worker pool, if one was started."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+# Global instance
+password_hasher = PasswordHasher()
@@ -0,0 +1,182 @@
+"""
+Portfolio valuation time series.
+
+Each position's ledger is replayed once to get its units, open cost basis
+and realized income after every trade date. Those step functions are
+looked up for all positions and valuation dates at once with a single
+searchsorted, giving positions x dates matrices. The price matrix comes
+from each symbol's stored daily closes, forward-filled onto calendar dates.
+Invested amount, market value and P&L per date are then a few NumPy
+reductions, with no per-date Python loops.
+
+Positions without market prices (FDs, gold, ...), or dates before a
+symbol's first stored close, are valued at cost. Only stored closes are
+read; refresh_prices.py backfills held symbols, so a request never waits
+on the price provider or its rate budget. The final point, when it
+is today, uses each position's current value as the portfolio summary does.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from app import db
+from app.models import InvestmentTransaction, Position, Quote
+from app.utils.ledger import PositionState
+from app.utils.portfolio_summary import position_value_expression
+from app.utils.price_history import price_history
+from app.utils.price_refresher import MARKET_TYPES
+
+
+INTERVALS = ('day', 'week', 'month')
+MAX_RANGE_DAYS = 20 * 366
+
+
+def sample_dates(start, end, interval):
+    """
+    Valuation dates for start..end: every day, or the last day of each week
+    (Sunday) or month, with end always included.
+
+    Returns:
+        numpy array of day ordinals
+    """
+    days = np.arange(start.toordinal(), end.toordinal() + 1)
+    if interval == 'week':
+        # date.fromordinal(n).weekday() == (n - 1) % 7
+        days = days[(days - 1) % 7 == 6]
+    elif interval == 'month':
+        month_ends = []
+        year, month = start.year, start.month
+        while True:
+            year, month = year + month // 12, month % 12 + 1
+            month_end = date(year, month, 1) - timedelta(days=1)
+            if month_end > end:
+                break
+            month_ends.append(month_end.toordinal())
+        days = np.array(month_ends, dtype=days.dtype)
+    if not days.size or days[-1] != end.toordinal():
+        days = np.append(days, end.toordinal())
+    return days
+
+
+def _forward_filled(ordinals, closes, days):
+    """Close on or before each day (NaN before the first close)."""
+    if not len(ordinals):
+        return np.full(days.shape, np.nan)
+    position = np.searchsorted(np.asarray(ordinals), days, side='right') - 1
+    prices = np.asarray(closes, dtype=float)[np.maximum(position, 0)]
+    prices[position < 0] = np.nan
+    return prices
+
+
+def _step_functions(transactions):
+    """
+    Replay ledger rows (ordered by position, date, id) into per-date states.
+
+    Returns:
+        (keys, units, cost, realized) arrays, one entry per position and
+        trade date, where key = position index << 32 | day ordinal and the
+        values are the state at the end of that day
+    """
+    keys, units, cost, realized = [], [], [], []
+    state, current = None, None
+    for index, txn in transactions:
+        if index != current:
+            state, current = PositionState(), index
+        state.apply_transaction(txn)
+        key = (index << 32) | txn.trade_date.toordinal()
+        if keys and keys[-1] == key:
+            keys.pop(), units.pop(), cost.pop(), realized.pop()
+        keys.append(key)
+        units.append(state.quantity)
+        cost.append(state.cost_basis)
+        realized.append(state.realized_gain + state.dividends)
+    return (np.array(keys, dtype=np.int64), np.array(units, dtype=float),
+            np.array(cost, dtype=float), np.array(realized, dtype=float))
+
+
+def portfolio_history(user_id, start=None, end=None, interval='day'):
+    """
+    Invested amount, market value, realized income and P&L of a user's portfolio over time.
+
+    Args:
+        user_id: Owner of the positions
+        start: First date (defaults to the first trade date, at most
+            MAX_RANGE_DAYS before end)
+        end: Last date (defaults to today)
+        interval: 'day', 'week' or 'month'
+
+    Returns:
+        dict with start, end, interval and points:
+        [{date, invested, value, realized, pnl}], where invested is the cost
+        of units still held, realized is sell gains plus dividends to date
+        and pnl = value - invested + realized
+    """
+    positions = db.session.query(
+        Position.id, Position.instrument_type, Position.symbol, Position.first_trade_date, position_value_expression()
+    ).outerjoin(Quote, Quote.symbol == Position.symbol).filter(
+        Position.user_id == user_id, Position.first_trade_date.isnot(None)
+    ).order_by(Position.id).all()
+    end = end or date.today()
+    if start is None:
+        start = min((row.first_trade_date for row in positions), default=end)
+        start = max(start, end - timedelta(days=MAX_RANGE_DAYS - 1))
+    result = {'start': start.isoformat(), 'end': end.isoformat(), 'interval': interval, 'points': []}
+    if start > end:
+        return result
+
+    days = sample_dates(start, end, interval)
+    if not positions:
+        result['points'] = [
+            {'date': date.fromordinal(int(day)).isoformat(), 'invested': 0, 'value': 0, 'realized': 0, 'pnl': 0}
+            for day in days
+        ]
+        return result
+
+    row_of = {row.id: index for index, row in enumerate(positions)}
+    transactions = InvestmentTransaction.query.filter(
+        InvestmentTransaction.user_id == user_id, InvestmentTransaction.trade_date <= end
+    ).order_by(InvestmentTransaction.position_id, InvestmentTransaction.trade_date, InvestmentTransaction.id).all()
+    keys, step_units, step_cost, step_realized = _step_functions(
+        (row_of[txn.position_id], txn) for txn in transactions if txn.position_id in row_of
+    )
+
+    # positions x dates: state at the end of each valuation date
+    rows = np.arange(len(positions), dtype=np.int64)
+    lookup = (rows[:, None] << 32) | days[None, :].astype(np.int64)
+    found = np.searchsorted(keys, lookup, side='right') - 1
+    valid = (found >= 0) & ((keys[np.maximum(found, 0)] >> 32) == rows[:, None])
+    index = np.maximum(found, 0)
+    units = np.where(valid, step_units[index], 0.0)
+    cost = np.where(valid, step_cost[index], 0.0)
+    realized = np.where(valid, step_realized[index], 0.0)
+
+    # dates x symbols, then gathered to positions x dates
+    priced = [row.symbol if row.instrument_type in MARKET_TYPES and row.symbol else None for row in positions]
+    symbols = sorted(set(priced) - {None})
+    column = {symbol: index for index, symbol in enumerate(symbols)}
+    symbol_prices = np.empty((len(days), len(symbols) + 1))
+    symbol_prices[:, -1] = np.nan  # unpriced positions
+    for symbol, index in column.items():
+        ordinals, closes = price_history.closes(symbol)
+        symbol_prices[:, index] = _forward_filled(ordinals, closes, days)
+
+    prices = symbol_prices[:, np.array([column.get(symbol, -1) for symbol in priced])].T
+    values = np.where(np.isnan(prices), cost, units * np.nan_to_num(prices))
+    if days[-1] == date.today().toordinal():
+        values[:, -1] = np.array([row[-1] for row in positions], dtype=float)
+
+    invested_series = cost.sum(axis=0)
+    value_series = values.sum(axis=0)
+    realized_series = realized.sum(axis=0)
+
+    result['points'] = [
+        {'date': date.fromordinal(day).isoformat(), 'invested': invested, 'value': value, 'realized': income, 'pnl': pnl}
+        for day, invested, value, income, pnl in zip(
+            days.tolist(),
+            np.round(invested_series, 2).tolist(),
+            np.round(value_series, 2).tolist(),
+            np.round(realized_series, 2).tolist(),
+            np.round(value_series - invested_series + realized_series, 2).tolist()
+        )
+    ]
+    return result
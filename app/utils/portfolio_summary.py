@@ -0,0 +1,223 @@
+"""
+Portfolio totals and allocation computed in SQL, cached per user.
+
+summarize_portfolio() runs one GROUP BY instrument_type aggregate over a
+user's position snapshots (see app/utils/ledger.py) joined to quotes, so
+its cost doesn't grow with the number of lots or transactions. Results are
+cached per user and dropped when that user's positions are committed or
+when quotes are refreshed (by any process).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import and_, case, event, func, or_
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.models import Position, Quote
+
+
+def position_value_expression():
+    """
+    SQL counterpart of Position.market_value.
+
+    Uses the symbol's quote unless a price was entered manually after the
+    quote was written, then the manual price, then the cost basis.
+    """
+    quoted = and_(
+        Quote.symbol.isnot(None),
+        or_(Position.manual_priced_at.is_(None), Position.manual_priced_at <= Quote.updated_at)
+    )
+    return case(
+        (quoted, Position.quantity * Quote.price),
+        (Position.manual_price.isnot(None), Position.quantity * Position.manual_price),
+        else_=Position.cost_basis
+    )
+
+
+def summarize_portfolio(user_id):
+    """
+    Compute totals and per-instrument-type allocation for a user.
+
+    Invested and current value cover open positions; realized gains and
+    dividends include closed ones.
+
+    Returns:
+        dict in the /portfolio/summary response shape
+    """
+    rows = db.session.query(
+        Position.instrument_type,
+        func.sum(Position.cost_basis),
+        func.sum(position_value_expression()),
+        func.sum(case((Position.quantity > 0, 1), else_=0)),
+        func.sum(Position.realized_gain),
+        func.sum(Position.dividends)
+    ).outerjoin(Quote, Quote.symbol == Position.symbol).filter(
+        Position.user_id == user_id
+    ).group_by(Position.instrument_type).all()
+
+    total_invested = sum(row[1] for row in rows)
+    current_value = sum(row[2] for row in rows)
+    count = sum(row[3] for row in rows)
+    total_returns = current_value - total_invested
+    returns_percent = (total_returns / total_invested * 100) if total_invested > 0 else 0
+
+    allocation = [
+        {
+            'instrument_type': instrument_type,
+            'invested': round(invested, 2),
+            'current_value': round(value, 2),
+            'percentage': round((value / current_value * 100) if current_value > 0 else 0, 2),
+            'count': type_count
+        }
+        for instrument_type, invested, value, type_count, _, _ in rows
+        if type_count
+    ]
+
+    return {
+        'total_invested': round(total_invested, 2),
+        'current_value': round(current_value, 2),
+        'total_returns': round(total_returns, 2),
+        'returns_percent': round(returns_percent, 2),
+        'realized_gains': round(sum(row[4] for row in rows), 2),
+        'dividends': round(sum(row[5] for row in rows), 2),
+        'count': count,
+        'allocation': sorted(allocation, key=lambda x: x['current_value'], reverse=True)
+    }
+
+
+class PortfolioSummaryCache:
+    """
+    Bounded LRU/TTL cache of portfolio summaries keyed by user_id.
+
+    Position writes mark their user on the session, and the user's entry is
+    dropped once that session commits. Each drop also bumps the user's
+    generation (clear() bumps an epoch for everyone), and a summary is only
+    stored if neither changed while it was computed, so a reader that
+    started before the commit can't put its stale result back.
+
+    Position invalidation only reaches this process. Quotes reach every
+    worker: an entry remembers the newest Quote.updated_at it was computed
+    with, and is stale once a refresh in any process stores a newer one.
+    That is read at most every quotes_check_interval seconds.
+    """
+
+    def __init__(self, max_size=4096, ttl=300, quotes_check_interval=5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.quotes_check_interval = quotes_check_interval
+        self.enabled = True
+        self._entries = OrderedDict()  # user_id -> (expires, summary, quotes version)
+        self._quotes_version = None
+        self._quotes_checked_at = None
+        self._generations = {}  # user_id -> invalidation count
+        self._epoch = 0  # bumped by clear() and when _generations is reset
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Read cache settings from the app config and hook Position changes."""
+        self.max_size = app.config.get('PORTFOLIO_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('PORTFOLIO_CACHE_TTL', self.ttl)
+        self.quotes_check_interval = app.config.get('PORTFOLIO_CACHE_QUOTES_CHECK', self.quotes_check_interval)
+        self.enabled = self.max_size > 0
+
+        if not event.contains(Position, 'after_insert', _mark_user):
+            for name in ('after_insert', 'after_update', 'after_delete'):
+                event.listen(Position, name, _mark_user)
+            event.listen(Session, 'after_commit', _invalidate_marked)
+            event.listen(Session, 'after_rollback', _discard_marked)
+
+    def get(self, user_id):
+        """Return the user's summary, computing it on a miss."""
+        if not self.enabled:
+            return summarize_portfolio(user_id)
+
+        now = time.monotonic()
+        quotes_version = self._current_quotes_version(now)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now and entry[2] == quotes_version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = (self._epoch, self._generations.get(user_id, 0))
+
+        summary = summarize_portfolio(user_id)
+        with self._lock:
+            if (self._epoch, self._generations.get(user_id, 0)) != generation:
+                # Invalidated while computing; this result may predate the write
+                return summary
+            self._entries[user_id] = (now + self.ttl, summary, quotes_version)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return summary
+
+    def _current_quotes_version(self, now):
+        """Newest quote update time, re-read at most every quotes_check_interval seconds."""
+        with self._lock:
+            if self._quotes_checked_at is not None and now - self._quotes_checked_at < self.quotes_check_interval:
+                return self._quotes_version
+        version = db.session.query(func.max(Quote.updated_at)).scalar()
+        with self._lock:
+            self._quotes_version = version
+            self._quotes_checked_at = now
+        return version
+
+    def invalidate(self, user_id):
+        """Drop a user's cached summary."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if len(self._generations) > 2 * max(self.max_size, 1024):
+                # Starting the counts over needs a new epoch so in-flight reads still see a change
+                self._generations.clear()
+                self._epoch += 1
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop every cached summary (e.g. after a price refresh)."""
+        with self._lock:
+            self._entries.clear()
+            self._quotes_checked_at = None
+            self._epoch += 1
+            self.invalidations += 1
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+            }
+
+
+def _mark_user(mapper, connection, target):
+    """Mapper hook: remember whose portfolio the flushing session changed."""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('portfolio_users', set()).add(target.user_id)
+
+
+def _invalidate_marked(session):
+    for user_id in session.info.pop('portfolio_users', ()):
+        portfolio_cache.invalidate(user_id)
+
+
+def _discard_marked(session):
+    session.info.pop('portfolio_users', None)
+
+
+# Global instance
+portfolio_cache = PortfolioSummaryCache()
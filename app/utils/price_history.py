@@ -0,0 +1,216 @@
+"""
+Local daily OHLC store for buy-date prices and charts.
+
+Bars live in price_bars and are only appended. price_coverage records, per
+symbol, the contiguous calendar range whose bars have been downloaded, so
+a day inside it that has no bar is known to be a non-trading day. Lookups
+are answered from what is stored, with a binary search over in-memory day
+and close arrays.
+
+Downloads happen in ensure_range, which backfill_prices.py and the price
+refresher call for held symbols; it only fetches the part of a range that
+falls outside coverage, in bulk chunks. Request paths that read bars never
+call the provider.
+
+Today's bar is never stored: it isn't final until the session closes.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from datetime import date, timedelta
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import PriceBar, PriceCoverage
+from app.utils.market_hours import market_now
+from app.utils.stock_prices import stock_prices
+
+
+class _Series:
+    """In-memory view of one symbol's stored closes, ordered by day."""
+
+    def __init__(self, coverage=None, bars=()):
+        self.first_day = coverage.first_day if coverage else None
+        self.last_day = coverage.last_day if coverage else None
+        self.ordinals = array('l', (bar_day.toordinal() for bar_day, _ in bars))
+        self.closes = array('d', (close for _, close in bars))
+        self.loaded_at = time.monotonic()
+
+    def covers(self, start, end):
+        return self.first_day is not None and self.first_day <= start and end <= self.last_day
+
+
+class PriceHistoryStore:
+    """
+    Per-process reader/writer for price_bars.
+
+    Args:
+        chunk_days: Minimum number of days downloaded when extending a
+            symbol's coverage backwards, so nearby lookups stay local
+        lookback_days: Days searched before a date for the nearest trading day
+        reload_interval: Seconds an in-memory series is used before it is
+            reloaded to pick up bars written by another process
+    """
+
+    def __init__(self, chunk_days=365, lookback_days=7, reload_interval=300):
+        self.chunk_days = chunk_days
+        self.lookback_days = lookback_days
+        self.reload_interval = reload_interval
+        self._series = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _symbol_lock(self, symbol):
+        with self._lock:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _load(self, symbol):
+        coverage = db.session.get(PriceCoverage, symbol)
+        bars = db.session.query(PriceBar.day, PriceBar.close).filter(
+            PriceBar.symbol == symbol
+        ).order_by(PriceBar.day).all()
+        series = _Series(coverage, bars)
+        self._series[symbol] = series
+        return series
+
+    def _series_for(self, symbol):
+        series = self._series.get(symbol)
+        if series is None or time.monotonic() - series.loaded_at > self.reload_interval:
+            series = self._load(symbol)
+        return series
+
+    def _append(self, symbol, rows, start, end):
+        """Insert downloaded bars and widen coverage to include start..end."""
+        table = PriceBar.__table__
+        if rows:
+            dialect = db.session.get_bind().dialect.name
+            if dialect in ('sqlite', 'postgresql'):
+                insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+                db.session.execute(insert(table).on_conflict_do_nothing(index_elements=['symbol', 'day']), rows)
+            else:
+                existing = {bar_day for (bar_day,) in db.session.query(PriceBar.day).filter(
+                    PriceBar.symbol == symbol, PriceBar.day.between(start, end)
+                )}
+                fresh = [row for row in rows if row['day'] not in existing]
+                if fresh:
+                    db.session.execute(table.insert(), fresh)
+
+        coverage = db.session.get(PriceCoverage, symbol)
+        if coverage is None:
+            db.session.add(PriceCoverage(symbol=symbol, first_day=start, last_day=end))
+        else:
+            coverage.first_day = min(coverage.first_day, start)
+            coverage.last_day = max(coverage.last_day, end)
+        db.session.flush()
+
+    def ensure_range(self, symbol, start, end):
+        """
+        Make sure bars for start..end are stored, downloading only what's missing.
+
+        The range is clamped to yesterday. Coverage stays contiguous, so a
+        request beyond either edge also fills the gap up to that edge.
+        The bars are written in the caller's transaction; the caller commits.
+
+        Returns:
+            Number of bars downloaded
+        """
+        yesterday = market_now().date() - timedelta(days=1)
+        end = min(end, yesterday)
+        if start > end:
+            return 0
+
+        series = self._series_for(symbol)
+        if series.covers(start, end):
+            return 0
+
+        with self._symbol_lock(symbol):
+            # Another thread or process may have filled it meanwhile
+            series = self._load(symbol)
+            if series.covers(start, end):
+                return 0
+
+            if series.first_day is None:
+                missing = [(start, end)]
+            else:
+                missing = []
+                if start < series.first_day:
+                    missing.append((min(start, series.first_day - timedelta(days=self.chunk_days)), series.first_day - timedelta(days=1)))
+                if end > series.last_day:
+                    missing.append((series.last_day + timedelta(days=1), end))
+
+            downloaded = 0
+            for gap_start, gap_end in missing:
+                rows = stock_prices.provider.daily_bars(symbol, gap_start, gap_end)
+                self._append(symbol, rows, gap_start, gap_end)
+                downloaded += len(rows)
+            self._load(symbol)
+            return downloaded
+
+    def close_on_or_before(self, symbol, day, fetch=False):
+        """
+        Close on day, or on the nearest trading day before it.
+
+        Args:
+            symbol: Normalized symbol
+            day: Date to look up
+            fetch: Download the lookback window first if it isn't stored
+                (the caller then commits)
+
+        Returns:
+            (trading_date, close), or None if nothing traded in the lookback
+            window (e.g. before the symbol listed) or it isn't stored
+        """
+        if fetch:
+            self.ensure_range(symbol, day - timedelta(days=self.lookback_days), day)
+        series = self._series_for(symbol)
+        position = bisect_right(series.ordinals, day.toordinal()) - 1
+        if position < 0 or day.toordinal() - series.ordinals[position] > self.lookback_days:
+            return None
+        return date.fromordinal(series.ordinals[position]), series.closes[position]
+
+    def closes(self, symbol):
+        """
+        Every stored close of a symbol.
+
+        Returns:
+            (day ordinals, closes) arrays ordered by day, for forward-filling
+            prices onto calendar dates
+        """
+        series = self._series_for(symbol)
+        return series.ordinals, series.closes
+
+    def coverage(self, symbol):
+        """(first_day, last_day) of the stored range, or None if nothing is stored."""
+        series = self._series_for(symbol)
+        return (series.first_day, series.last_day) if series.first_day is not None else None
+
+    def bars(self, symbol, start, end):
+        """Stored OHLC bars for start..end inclusive."""
+        rows = PriceBar.query.filter(
+            PriceBar.symbol == symbol, PriceBar.day.between(start, end)
+        ).order_by(PriceBar.day).all()
+        return [
+            {
+                'date': row.day.isoformat(),
+                'open': row.open,
+                'high': row.high,
+                'low': row.low,
+                'close': row.close,
+                'volume': row.volume
+            }
+            for row in rows
+        ]
+
+    def forget(self, symbol=None):
+        """Drop in-memory series so they're reloaded from the database."""
+        with self._lock:
+            if symbol is None:
+                self._series.clear()
+            else:
+                self._series.pop(symbol, None)
+
+
+# Global instance
+price_history = PriceHistoryStore()
@@ -0,0 +1,262 @@
+"""
+Pluggable market data providers.
+
+Every price lookup in the app (live quotes, the daily bar store and the
+background refresher) goes through a PriceProvider, selected with the
+PRICE_PROVIDER setting:
+
+    yahoo - Yahoo Finance via yfinance, sharing one requests.Session
+    fake  - deterministic offline prices for tests and benchmarks
+
+Providers draw from a RateBudget before each upstream call so a process's
+interactive lookups can't exceed it together. The budget is per process:
+web workers and refresh_prices.py each keep their own, so size
+PRICE_PROVIDER_CALLS_PER_MINUTE for the number of processes.
+"""
+import math
+import random
+import threading
+import time
+import zlib
+from datetime import timedelta
+
+from app.utils.market_hours import market_now
+from app.utils.metrics import track_outbound
+
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+
+class RateLimited(Exception):
+    """Raised when the rate budget has no capacity left within the wait timeout."""
+
+
+class RateBudget:
+    """
+    Token bucket shared by all callers of a provider in one process.
+
+    Args:
+        calls: Calls allowed per period (burst size)
+        period: Period in seconds
+    """
+
+    def __init__(self, calls=30, period=60.0):
+        self.calls = calls
+        self.period = period
+        self._tokens = float(calls)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=10.0):
+        """
+        Take one call from the budget, waiting up to timeout seconds.
+
+        Raises:
+            RateLimited: No capacity became available in time
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.calls, self._tokens + (now - self._updated) * self.calls / self.period)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.period / self.calls
+            if now + wait > deadline:
+                raise RateLimited('Too Many Requests: local price provider budget exhausted')
+            time.sleep(wait)
+
+
+class PriceProvider:
+    """
+    Interface for market data sources.
+
+    Attributes:
+        batch_size: Most symbols a single latest_prices call should carry
+    """
+    name = 'base'
+    batch_size = 50
+
+    def __init__(self, budget=None):
+        self.budget = budget or RateBudget()
+
+    def latest_prices(self, symbols):
+        """
+        Most recent close for several symbols in one upstream call.
+
+        Returns:
+            dict mapping symbol to (as_of date, close); symbols without data are omitted
+        """
+        raise NotImplementedError
+
+    def daily_bars(self, symbol, start, end):
+        """
+        Daily OHLC bars for start..end inclusive.
+
+        Returns:
+            List of dicts with symbol, day, open, high, low, close and volume
+        """
+        raise NotImplementedError
+
+    def display_name(self, symbol):
+        """Human readable name for a symbol, or None."""
+        return None
+
+
+class YahooPriceProvider(PriceProvider):
+    """Yahoo Finance through yfinance."""
+    name = 'yahoo'
+
+    def __init__(self, budget=None):
+        super().__init__(budget)
+        self._session = None
+
+    def session(self):
+        """The shared requests.Session used for every Yahoo call."""
+        if self._session is None:
+            import requests
+            session = requests.Session()
+            session.headers.update({'User-Agent': USER_AGENT})
+            self._session = session
+        return self._session
+
+    def _ticker(self, symbol):
+        import yfinance as yf
+        return yf.Ticker(symbol, session=self.session())
+
+    def latest_prices(self, symbols):
+        import yfinance as yf
+
+        symbols = list(symbols)
+        self.budget.acquire()
+        with track_outbound('yahoo', 'latest_prices'):
+            frame = yf.download(
+                tickers=symbols, period='5d', interval='1d', group_by='ticker',
+                auto_adjust=False, progress=False, threads=False, session=self.session()
+            )
+        prices = {}
+        if frame.empty:
+            return prices
+        for symbol in symbols:
+            try:
+                closes = frame[symbol]['Close'] if frame.columns.nlevels > 1 else frame['Close']
+            except KeyError:
+                continue
+            closes = closes.dropna()
+            if not closes.empty:
+                prices[symbol] = (closes.index[-1].date(), float(closes.iloc[-1]))
+        return prices
+
+    def daily_bars(self, symbol, start, end):
+        self.budget.acquire()
+        with track_outbound('yahoo', 'daily_bars'):
+            hist = self._ticker(symbol).history(start=start, end=end + timedelta(days=1), auto_adjust=False)
+        rows = []
+        for timestamp, bar in hist.iterrows():
+            bar_day = timestamp.date()
+            if start <= bar_day <= end:
+                rows.append({
+                    'symbol': symbol,
+                    'day': bar_day,
+                    'open': float(bar['Open']),
+                    'high': float(bar['High']),
+                    'low': float(bar['Low']),
+                    'close': float(bar['Close']),
+                    'volume': int(bar['Volume'])
+                })
+        return rows
+
+    def display_name(self, symbol):
+        self.budget.acquire()
+        with track_outbound('yahoo', 'display_name'):
+            info = self._ticker(symbol).info
+        return info.get('longName', info.get('shortName'))
+
+
+class FakePriceProvider(PriceProvider):
+    """
+    Offline provider with deterministic prices.
+
+    Each symbol follows a smooth curve around a base price derived from
+    its name, plus small day-to-day noise, so repeated runs see the same
+    numbers. Weekends have no bars.
+
+    Args:
+        latency: Seconds to sleep per call, to mimic a remote API
+    """
+    name = 'fake'
+
+    def __init__(self, budget=None, latency=0.0):
+        super().__init__(budget or RateBudget(calls=10 ** 9, period=1))
+        self.latency = latency
+        self.calls = 0
+
+    def _call(self):
+        self.budget.acquire()
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def price_on(self, symbol, day):
+        seed = zlib.crc32(symbol.encode('utf-8'))
+        base = 50 + seed % 2000
+        noise = random.Random(seed ^ day.toordinal()).uniform(-0.01, 0.01)
+        return round(base * (1 + 0.15 * math.sin(day.toordinal() / 45 + seed % 7) + noise), 2)
+
+    @staticmethod
+    def _last_trading_day(day):
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+        return day
+
+    def latest_prices(self, symbols):
+        self._call()
+        day = self._last_trading_day(market_now().date())
+        return {symbol: (day, self.price_on(symbol, day)) for symbol in symbols}
+
+    def daily_bars(self, symbol, start, end):
+        self._call()
+        rows = []
+        day = start
+        while day <= end:
+            if day.weekday() < 5:
+                close = self.price_on(symbol, day)
+                previous = self.price_on(symbol, day - timedelta(days=1))
+                rows.append({
+                    'symbol': symbol,
+                    'day': day,
+                    'open': previous,
+                    'high': round(max(previous, close) * 1.005, 2),
+                    'low': round(min(previous, close) * 0.995, 2),
+                    'close': close,
+                    'volume': 1000 + zlib.crc32(f'{symbol}{day}'.encode('utf-8')) % 100000
+                })
+            day += timedelta(days=1)
+        return rows
+
+    def display_name(self, symbol):
+        self._call()
+        return f"{symbol.split('.')[0].title()} Ltd"
+
+
+PROVIDERS = {
+    'yahoo': YahooPriceProvider,
+    'fake': FakePriceProvider
+}
+
+
+def make_provider(name='yahoo', calls_per_minute=30):
+    """
+    Build a provider by name with its own rate budget.
+
+    Raises:
+        ValueError: Unknown provider name
+    """
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown price provider '{name}' (expected one of: {', '.join(PROVIDERS)})")
+    if name == 'fake':
+        return FakePriceProvider()
+    return PROVIDERS[name](RateBudget(calls=calls_per_minute, period=60.0))
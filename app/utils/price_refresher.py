@@ -0,0 +1,178 @@
+"""
+Keep the quotes table current for every held symbol.
+
+refresh_prices() collects the distinct symbols across all open positions,
+asks the price provider for them in batches (one multi-ticker call per
+batch, each drawing on the provider's rate budget) and upserts one quotes
+row per symbol. Holdings join to quotes when read, so a price change costs
+one write however many lots hold the symbol.
+
+backfill_bars() downloads the daily bars held stock symbols are missing,
+from their first trade up to yesterday, so charts, portfolio history and
+buy-date lookups can be served from the local price store.
+
+PriceRefresher decides when a refresh is due: while the market is open,
+plus once after each session closes so the day's final prices are
+recorded. The first run and each after-close run also call backfill_bars.
+It runs only in refresh_prices.py, never inside the web workers: every
+process has its own provider rate budget, so a refresher per worker would
+spend N times PRICE_PROVIDER_CALLS_PER_MINUTE and refresh every symbol N
+times.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import Position, Quote
+from app.utils.market_hours import market_is_open, market_now
+from app.utils.portfolio_summary import portfolio_cache
+from app.utils.price_history import price_history
+from app.utils.stock_prices import stock_prices
+
+# Instrument types priced from market data; others keep their manual price.
+# Mutual funds are left out: Yahoo has no quotes for scheme codes, so each
+# lookup would spend a rate-budget call and come back empty.
+MARKET_TYPES = ('stock',)
+
+
+def held_symbols():
+    """Distinct market symbols of open positions, sorted."""
+    rows = db.session.query(Position.symbol).filter(
+        Position.instrument_type.in_(MARKET_TYPES),
+        Position.quantity > 0, Position.symbol != ''
+    ).distinct().all()
+    return sorted(symbol for (symbol,) in rows)
+
+
+def save_quotes(prices):
+    """
+    Upsert quotes from a provider result.
+
+    Args:
+        prices: dict mapping symbol to (as_of date, price)
+
+    Returns:
+        Number of quotes written
+    """
+    if not prices:
+        return 0
+
+    now = datetime.utcnow()
+    rows = [
+        {'symbol': symbol, 'price': price, 'as_of': as_of, 'updated_at': now}
+        for symbol, (as_of, price) in prices.items()
+    ]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(Quote.__table__)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['symbol'],
+            set_={'price': insert.excluded.price, 'as_of': insert.excluded.as_of, 'updated_at': insert.excluded.updated_at}
+        ), rows)
+    else:
+        for row in rows:
+            db.session.merge(Quote(**row))
+    db.session.commit()
+    portfolio_cache.clear()
+    return len(rows)
+
+
+def refresh_prices(provider=None, batch_size=None):
+    """
+    Fetch latest prices for all held symbols and store them as quotes.
+
+    Args:
+        provider: PriceProvider to use (defaults to the app's provider)
+        batch_size: Symbols per provider call (defaults to provider.batch_size)
+
+    Returns:
+        dict with symbols, updated, failed and batches counts
+    """
+    provider = provider or stock_prices.provider
+    batch_size = batch_size or provider.batch_size
+    symbols = held_symbols()
+
+    result = {'symbols': len(symbols), 'updated': 0, 'failed': 0, 'batches': 0}
+    for offset in range(0, len(symbols), batch_size):
+        batch = symbols[offset:offset + batch_size]
+        result['batches'] += 1
+        try:
+            prices = provider.latest_prices(batch)
+        except Exception as e:
+            print(f"Price refresh failed for {len(batch)} symbol(s): {type(e).__name__}: {e}")
+            result['failed'] += len(batch)
+            continue
+
+        save_quotes(prices)
+        for symbol, (as_of, price) in prices.items():
+            stock_prices.remember_quote(symbol, as_of, price)
+        result['updated'] += len(prices)
+        result['failed'] += len(batch) - len(prices)
+
+    return result
+
+
+def backfill_bars():
+    """
+    Download missing daily bars for every held market symbol.
+
+    Each symbol is committed on its own, so one failure doesn't lose the
+    others' bars.
+
+    Returns:
+        dict with symbols, downloaded and failed counts
+    """
+    rows = db.session.query(Position.symbol, func.min(Position.first_trade_date)).filter(
+        Position.instrument_type.in_(MARKET_TYPES),
+        Position.quantity > 0, Position.symbol != '', Position.first_trade_date.isnot(None)
+    ).group_by(Position.symbol).all()
+    yesterday = market_now().date() - timedelta(days=1)
+
+    result = {'symbols': len(rows), 'downloaded': 0, 'failed': 0}
+    for symbol, first_trade in rows:
+        try:
+            result['downloaded'] += price_history.ensure_range(
+                symbol, first_trade - timedelta(days=price_history.lookback_days), yesterday
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            price_history.forget(symbol)
+            result['failed'] += 1
+            print(f"Price backfill failed for {symbol}: {type(e).__name__}: {e}")
+    return result
+
+
+class PriceRefresher:
+    """Tracks refresh runs for refresh_prices.py."""
+
+    def __init__(self):
+        self.last_run = None
+        self.last_result = None
+        self.last_backfill = None
+        self._last_run_in_session = False
+
+    def due(self):
+        """Refresh while the market is open, and once more after it closes."""
+        return self.last_run is None or market_is_open() or self._last_run_in_session
+
+    def run_once(self):
+        """Refresh now; call inside an app context."""
+        in_session = market_is_open()
+        try:
+            self.last_result = refresh_prices()
+            if self.last_run is None or not in_session:
+                self.last_backfill = backfill_bars()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Price refresh error: {type(e).__name__}: {e}")
+            return None
+        self.last_run = datetime.utcnow()
+        self._last_run_in_session = in_session
+        return self.last_result
+
+
+# Global instance
+price_refresher = PriceRefresher()
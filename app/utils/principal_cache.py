@@ -0,0 +1,157 @@
+"""Per-process cache of authenticated users for token_required."""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+
+class PrincipalCache:
+    """
+    Bounded LRU/TTL cache of User rows keyed by (user_id, token iat).
+
+    Entries hold plain column snapshots rather than ORM instances, so a hit
+    can be re-attached to the current session without a SELECT.
+
+    User writes mark the user on the session, and the user's entries are
+    dropped once that session commits. Each drop also bumps the user's
+    generation (clear() bumps an epoch for everyone), and a loaded row is
+    only stored if neither changed while it was loaded, so a request that
+    read the row before the commit can't put the old values back.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._generations = {}  # user_id -> invalidation count
+        self._epoch = 0  # bumped by clear() and when _generations is reset
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Read cache settings from the app config and hook User changes."""
+        self.max_size = app.config.get('PRINCIPAL_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('PRINCIPAL_CACHE_TTL', self.ttl)
+        self.enabled = app.config.get('PRINCIPAL_CACHE_ENABLED', True) and self.max_size > 0
+
+        from app.models import User
+        if not event.contains(User, 'after_update', _mark_user):
+            event.listen(User, 'after_update', _mark_user)
+            event.listen(User, 'after_delete', _mark_user)
+            event.listen(Session, 'after_commit', _invalidate_marked)
+            event.listen(Session, 'after_rollback', _discard_marked)
+
+    def get(self, user_id, iat=None):
+        """
+        Return an attached User for user_id, loading it on a miss.
+
+        Args:
+            user_id: The user_id claim from the token
+            iat: The issued-at claim from the token (None for older tokens)
+
+        Returns:
+            User object bound to the current session, or None
+        """
+        from app import db
+        from app.models import User
+
+        if not self.enabled:
+            return db.session.get(User, user_id)
+
+        key = (user_id, iat)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                snapshot = entry[1]
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                snapshot = None
+                generation = (self._epoch, self._generations.get(user_id, 0))
+
+        if snapshot is not None:
+            user = User(**snapshot)
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+
+        snapshot = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+        with self._lock:
+            if (self._epoch, self._generations.get(user_id, 0)) != generation:
+                # Invalidated while loading; this row may predate the write
+                return user
+            self._entries[key] = (now + self.ttl, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return user
+
+    def invalidate(self, user_id):
+        """Drop every cached entry for a user."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == user_id]
+            for key in stale:
+                del self._entries[key]
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if len(self._generations) > 2 * max(self.max_size, 1024):
+                # Starting the counts over needs a new epoch so in-flight loads still see a change
+                self._generations.clear()
+                self._epoch += 1
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop all cached entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+            }
+
+
+def _mark_user(mapper, connection, target):
+    """Mapper hook: remember which users the flushing session updated or deleted."""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('principal_users', set()).add(target.id)
+
+
+def _invalidate_marked(session):
+    for user_id in session.info.pop('principal_users', ()):
+        principal_cache.invalidate(user_id)
+
+
+def _discard_marked(session):
+    session.info.pop('principal_users', None)
+
+
+# Global instance
+principal_cache = PrincipalCache()
@@ -0,0 +1,296 @@
+"""
+Read/write routing between the primary database and a read-only bind.
+
+With READ_REPLICA_URL (e.g. a Postgres streaming replica), or
+READ_SNAPSHOT_INTERVAL for SQLite, the app gets a second engine under the
+'replica' bind key. GET/HEAD requests read from it once the caller is
+authenticated; everything else - writes, SELECT ... FOR UPDATE, the rest
+of a request after its first write, unauthenticated lookups and views
+marked @use_primary - goes to the primary.
+
+SQLite snapshots are copies of the primary made with the backup API every
+READ_SNAPSHOT_INTERVAL seconds, into alternating per-process files that
+are opened read-only.
+
+Read-your-writes: a commit made by a request records the time for its
+user (and in a cookie, so other worker processes see it too). That user's
+reads stay on the primary until the replica is known to include the
+write: for snapshots, until one taken after it is live; for a replica,
+for READ_STICKY_SECONDS.
+"""
+import atexit
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import current_app, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+
+REPLICA_BIND = 'replica'
+WRITE_COOKIE = 'last_write'
+READ_METHODS = ('GET', 'HEAD')
+
+# Routing state of the request being served (see _start_request)
+_current_route = ContextVar('read_route', default=None)
+
+
+def use_primary(view):
+    """Mark a GET view to read from the primary (e.g. it writes what it read)."""
+    view.use_primary = True
+    return view
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica bind when the request allows it."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and REPLICA_BIND in self._db.engines and (mapper is None or _is_default_bind(mapper)):
+            route = _current_route.get()
+            if route is not None:
+                if getattr(self, '_flushing', False) or getattr(clause, 'is_dml', False) or _locks_rows(clause):
+                    route['wrote'] = True
+                    route['replica'] = False
+                elif read_router.use_replica(route):
+                    read_router.count('replica_reads')
+                    return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_default_bind(mapper):
+    table = getattr(mapper, 'local_table', None)
+    if table is None:
+        table = getattr(getattr(mapper, 'mapper', None), 'local_table', None)
+    return table is None or table.metadata.info.get('bind_key') is None
+
+
+def _locks_rows(clause):
+    return getattr(clause, '_for_update_arg', None) is not None
+
+
+class ReadRouter:
+    """Sets up the replica bind and decides, per request, where reads go."""
+
+    def __init__(self):
+        self.mode = None  # 'replica', 'snapshot' or None
+        self.sticky_seconds = 5.0
+        self.snapshot_interval = 0
+        self.snapshot_dir = None
+        self._source = None
+        self._snapshot = None  # (path, taken_at) currently served
+        self._generation = 0
+        self._pid = None
+        self._thread = None
+        self._app = None
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._user_writes = {}
+        self.counters = {'replica_reads': 0, 'sticky_reads': 0, 'snapshots': 0, 'snapshot_failures': 0}
+
+    def init_app(self, app):
+        """
+        Add the 'replica' bind and request hooks. Call before db.init_app.
+
+        Does nothing unless READ_REPLICA_URL or (for a SQLite file database)
+        READ_SNAPSHOT_INTERVAL is set.
+        """
+        replica_url = app.config.get('READ_REPLICA_URL')
+        self.snapshot_interval = app.config.get('READ_SNAPSHOT_INTERVAL', 0)
+        self.sticky_seconds = app.config.get('READ_STICKY_SECONDS', self.sticky_seconds)
+        url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+
+        if replica_url:
+            self.mode = 'replica'
+            bind = replica_url
+        elif self.snapshot_interval > 0 and url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:'):
+            self.mode = 'snapshot'
+            source = url.database
+            self._source = source if os.path.isabs(source) else os.path.join(app.instance_path, source)
+            self.snapshot_dir = app.config.get('READ_SNAPSHOT_DIR') or os.path.join(tempfile.gettempdir(), 'life_ledger_snapshots')
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            # The URL only names the bind; connections come from the current snapshot
+            bind = {
+                'url': f"sqlite:///{os.path.join(self.snapshot_dir, 'snapshot.db')}",
+                'creator': self._connect_snapshot,
+                'poolclass': QueuePool
+            }
+        else:
+            self.mode = None
+            return
+
+        self._app = app
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = bind
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
+        if not event.contains(Session, 'after_commit', _record_commit):
+            event.listen(Session, 'after_commit', _record_commit)
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def fresh_since(self):
+        """Wall-clock time up to which the replica is known to include every commit."""
+        if self.mode == 'snapshot':
+            return self._snapshot[1] if self._snapshot else 0.0
+        return time.time() - self.sticky_seconds
+
+    def sticky_window(self):
+        """Seconds after a write during which the replica may not include it."""
+        if self.mode == 'snapshot':
+            return self.snapshot_interval * 2
+        return int(self.sticky_seconds)
+
+    def use_replica(self, route):
+        """Decide once per request, after authentication, whether reads may use the replica."""
+        if route['replica'] is None:
+            user = getattr(request, 'current_user', None)
+            if user is None or not route['eligible']:
+                return False
+            if self.mode == 'snapshot':
+                self._ensure_snapshot()
+            last_write = max(route['cookie_write'], self._user_writes.get(user.id, 0.0))
+            route['replica'] = last_write < self.fresh_since()
+            if not route['replica']:
+                self.count('sticky_reads')
+        return route['replica']
+
+    def record_write(self, user_id, at):
+        with self._lock:
+            self._user_writes[user_id] = at
+            # Forget writes the replica certainly includes by now
+            if len(self._user_writes) > 10000:
+                horizon = min(self.fresh_since(), time.time() - self.sticky_seconds)
+                self._user_writes = {uid: t for uid, t in self._user_writes.items() if t >= horizon}
+
+    # SQLite snapshots
+
+    def _ensure_snapshot(self):
+        """Take the first snapshot in this process and start refreshing it."""
+        if self._pid == os.getpid():
+            return
+        with self._snapshot_lock:
+            if self._pid == os.getpid():
+                return
+            self._snapshot = None
+            self.refresh_snapshot()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='read-snapshot', daemon=True)
+            self._thread.start()
+            atexit.register(self._cleanup, os.getpid())
+
+    def _snapshot_path(self, generation):
+        return os.path.join(self.snapshot_dir, f'snapshot-{os.getpid()}-{generation % 2}.db')
+
+    def refresh_snapshot(self):
+        """
+        Copy the primary into the idle snapshot file and switch reads to it.
+
+        Returns:
+            True if the snapshot was replaced
+        """
+        path = self._snapshot_path(self._generation + 1)
+        taken_at = time.time()
+        try:
+            source = sqlite3.connect(self._source)
+            target = sqlite3.connect(path)
+            try:
+                source.backup(target)
+                # A WAL-mode copy couldn't be opened read-only without its -shm file
+                target.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                target.close()
+                source.close()
+        except sqlite3.Error as e:
+            # e.g. a slow request still reading the idle file; try again next time
+            self.count('snapshot_failures')
+            print(f"Read snapshot refresh failed: {type(e).__name__}: {e}")
+            return False
+
+        self._generation += 1
+        self._snapshot = (path, taken_at)
+        self.count('snapshots')
+        if self._app is not None:
+            from app import db
+            with self._app.app_context():
+                # Pooled connections still point at the previous file
+                db.engines[REPLICA_BIND].dispose()
+        return True
+
+    def _connect_snapshot(self):
+        self._ensure_snapshot()
+        connection = sqlite3.connect(f'file:{self._snapshot[0]}?mode=ro', uri=True, check_same_thread=False)
+        connection.execute('PRAGMA query_only=ON')
+        return connection
+
+    def _run(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            self.refresh_snapshot()
+
+    def _cleanup(self, pid):
+        if pid != os.getpid():
+            return
+        for generation in (0, 1):
+            try:
+                os.remove(self._snapshot_path(generation))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return routing counters and the snapshot age."""
+        with self._lock:
+            stats = dict(self.counters)
+        stats['mode'] = self.mode or 'off'
+        if self.mode == 'snapshot' and self._snapshot:
+            stats['snapshot_age_seconds'] = round(time.time() - self._snapshot[1], 1)
+        return stats
+
+
+def _start_request():
+    rule = request.url_rule
+    view = current_app.view_functions.get(rule.endpoint) if rule is not None else None
+    try:
+        cookie_write = float(request.cookies.get(WRITE_COOKIE, 0))
+    except ValueError:
+        cookie_write = 0.0
+    _current_route.set({
+        'eligible': request.method in READ_METHODS and not getattr(view, 'use_primary', False),
+        'replica': None,
+        'wrote': False,
+        'cookie_write': cookie_write,
+        'committed_at': None
+    })
+
+
+def _finish_request(response):
+    route = _current_route.get()
+    if route is not None:
+        _current_route.set(None)
+        if route['committed_at'] is not None:
+            response.set_cookie(WRITE_COOKIE, repr(route['committed_at']), max_age=read_router.sticky_window(),
+                                httponly=True, samesite='Lax')
+    return response
+
+
+def _record_commit(session):
+    route = _current_route.get()
+    if route is None or not route['wrote']:
+        return
+    route['committed_at'] = time.time()
+    user = getattr(request, 'current_user', None)
+    if user is not None:
+        read_router.record_write(user.id, route['committed_at'])
+
+
+# Global instance
+read_router = ReadRouter()
@@ -0,0 +1,273 @@
+"""
+Annualized returns (XIRR and CAGR) for holdings and portfolios.
+
+xirr() solves many cash-flow series at once. Series are rows of padded
+(series x flows) arrays; padding flows have amount 0 and don't affect the
+result. The solver works on x = ln(1 + rate), where NPV is smooth and
+monotone for the usual invest-then-value series, and takes a Newton step
+per row each iteration, falling back to bisection of the row's sign-change
+bracket whenever the step leaves it. Rows drop out as they converge.
+
+portfolio_returns() builds the series from a user's ledger: buys are
+outflows, sells and dividends inflows, and each position's value on the
+as_of date is the final inflow. Today that is its current value (as in the
+portfolio summary); on a past date it is the units held then at the
+stored close on or before it, or the cost basis without one, as in the
+portfolio history.
+"""
+from bisect import bisect_right
+from datetime import date
+
+import numpy as np
+
+from app import db
+from app.models import InvestmentTransaction, Position, Quote
+from app.utils.ledger import PositionState
+from app.utils.portfolio_summary import position_value_expression
+from app.utils.price_history import price_history
+from app.utils.price_refresher import MARKET_TYPES
+
+
+# ln(1 + rate) search bounds: rates from -99.995% to about 2,200,000%
+LOG_RATE_BOUND = 10.0
+DAYS_PER_YEAR = 365.0
+
+
+def _npv(amounts, years, x):
+    """NPV and its derivative with respect to x = ln(1 + rate), per row."""
+    with np.errstate(over='ignore', invalid='ignore'):
+        discounted = amounts * np.exp(-years * x[:, None])
+    return discounted.sum(axis=1), -(years * discounted).sum(axis=1)
+
+
+def xirr(amounts, days, tol=1e-9, max_iter=100):
+    """
+    Internal rate of return for each row of cash flows.
+
+    Args:
+        amounts: (series x flows) cash flows; outflows negative, inflows
+            positive, padding 0
+        days: Matching day numbers (e.g. date ordinals)
+        tol: Convergence tolerance on ln(1 + rate)
+        max_iter: Iteration cap
+
+    Returns:
+        Array of annual rates (0.12 = 12%), NaN where no rate exists
+        (e.g. flows all of one sign) or it falls outside the search bounds
+    """
+    amounts = np.atleast_2d(np.asarray(amounts, dtype=float))
+    days = np.atleast_2d(np.asarray(days, dtype=float))
+    flows = amounts != 0
+    origin = np.where(flows, days, np.inf).min(axis=1, initial=np.inf)
+    origin[~np.isfinite(origin)] = 0
+    years = np.where(flows, (days - origin[:, None]) / DAYS_PER_YEAR, 0.0)
+
+    count = amounts.shape[0]
+    lo = np.full(count, -LOG_RATE_BOUND)
+    hi = np.full(count, LOG_RATE_BOUND)
+    f_lo = _npv(amounts, years, lo)[0]
+    f_hi = _npv(amounts, years, hi)[0]
+    solvable = np.sign(f_lo) * np.sign(f_hi) < 0
+
+    # Start from the rate that grows the outflows into the inflows over the
+    # gap between their weighted mean dates (exact for a buy and a sale)
+    paid = np.where(amounts < 0, -amounts, 0.0)
+    received = np.where(amounts > 0, amounts, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gap = (received * years).sum(axis=1) / received.sum(axis=1) - (paid * years).sum(axis=1) / paid.sum(axis=1)
+        x = np.log(received.sum(axis=1) / paid.sum(axis=1)) / gap
+    x = np.where(np.isfinite(x), np.clip(x, -LOG_RATE_BOUND / 2, LOG_RATE_BOUND / 2), 0.0)
+    active = np.flatnonzero(solvable)
+    for _ in range(max_iter):
+        if not active.size:
+            break
+        a, y = amounts[active], years[active]
+        xa, la, ha, fla = x[active], lo[active], hi[active], f_lo[active]
+        f, df = _npv(a, y, xa)
+
+        # Keep the sign change inside [lo, hi]
+        same = np.sign(f) == np.sign(fla)
+        la = np.where(same, xa, la)
+        fla = np.where(same, f, fla)
+        ha = np.where(same, ha, xa)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = xa - f / df
+        inside = np.isfinite(step) & (step > la) & (step < ha)
+        nxt = np.where(f == 0, xa, np.where(inside, step, (la + ha) / 2))
+
+        x[active], lo[active], hi[active], f_lo[active] = nxt, la, ha, fla
+        done = (np.abs(nxt - xa) < tol) | (f == 0) | (ha - la < tol)
+        active = active[~done]
+
+    rates = np.expm1(x)
+    rates[~solvable] = np.nan
+    return rates
+
+
+def cagr(invested, value, years):
+    """
+    Compound annual growth rate, elementwise.
+
+    Returns:
+        Array of annual rates, NaN where invested, value or years isn't positive
+    """
+    invested, value, years = (np.asarray(v, dtype=float) for v in (invested, value, years))
+    valid = (invested > 0) & (value > 0) & (years > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = np.power(value / invested, 1 / years) - 1
+    return np.where(valid, rates, np.nan)
+
+
+def _percent(rate):
+    return None if np.isnan(rate) else round(float(rate) * 100, 2)
+
+
+def _solve(groups, end):
+    """
+    XIRR and CAGR for groups of cash flows.
+
+    Each group maps day ordinal to net cash flow (buys negative, sells and
+    dividends positive) and its current value is received on day end.
+
+    Returns:
+        (xirrs, cagrs, paid, received) arrays
+    """
+    width = max(len(flows) for flows, _ in groups) + 1
+    amounts = np.zeros((len(groups), width))
+    days = np.zeros((len(groups), width))
+    for row, (flows, value) in enumerate(groups):
+        amounts[row, :len(flows)] = list(flows.values())
+        days[row, :len(flows)] = list(flows.keys())
+        amounts[row, -1] = value
+        days[row, -1] = end
+
+    paid = -np.where(amounts < 0, amounts, 0).sum(axis=1)
+    received = np.where(amounts > 0, amounts, 0).sum(axis=1)
+    first = np.array([min(flows) if flows else end for flows, _ in groups])
+    return xirr(amounts, days), cagr(paid, received, (end - first) / DAYS_PER_YEAR), paid, received
+
+
+def values_on(positions, transactions, day):
+    """
+    Value of each position at the end of a past day.
+
+    Args:
+        positions: Rows with id, instrument_type and symbol
+        transactions: The positions' InvestmentTransactions up to day,
+            ordered by trade date and id
+        day: Valuation date
+
+    Returns:
+        dict mapping position id to value
+    """
+    states = {row.id: PositionState() for row in positions}
+    for txn in transactions:
+        if txn.position_id in states:
+            states[txn.position_id].apply_transaction(txn)
+
+    values = {}
+    for row in positions:
+        state = states[row.id]
+        value = state.cost_basis
+        if row.instrument_type in MARKET_TYPES and row.symbol and state.quantity:
+            ordinals, closes = price_history.closes(row.symbol)
+            index = bisect_right(ordinals, day.toordinal()) - 1
+            if index >= 0:
+                value = state.quantity * closes[index]
+        values[row.id] = value
+    return values
+
+
+def portfolio_returns(user_id, as_of=None):
+    """
+    XIRR and CAGR per position, per instrument type and for the whole portfolio.
+
+    Cash flows come from the ledger up to as_of (buys out; sells and
+    dividends in), with each position's value on as_of received that day.
+    CAGR compares everything received plus that value with everything paid
+    in since the first trade; XIRR accounts for when each flow happened.
+
+    Args:
+        user_id: Owner of the positions
+        as_of: Valuation date, today or earlier (defaults to today)
+
+    Holdings are positions rather than Investment lots: each has id (the
+    position id, also as position_id) and the investment_ids of the lots
+    bought into it. invested is kept as an alias of paid_in.
+
+    Returns:
+        dict with as_of, portfolio, by_type and holdings; rates in percent
+    """
+    today = date.today()
+    as_of = min(as_of or today, today)
+    end = as_of.toordinal()
+    positions = db.session.query(
+        Position.id, Position.instrument_type, Position.symbol, position_value_expression()
+    ).outerjoin(Quote, Quote.symbol == Position.symbol).filter(
+        Position.user_id == user_id, Position.first_trade_date <= as_of
+    ).order_by(Position.instrument_type, Position.symbol).all()
+
+    result = {'as_of': as_of.isoformat(), 'portfolio': None, 'by_type': [], 'holdings': []}
+    if not positions:
+        return result
+
+    transactions = InvestmentTransaction.query.filter(
+        InvestmentTransaction.user_id == user_id, InvestmentTransaction.trade_date <= as_of
+    ).order_by(InvestmentTransaction.trade_date, InvestmentTransaction.id).all()
+    if as_of < today:
+        value_of = values_on(positions, transactions, as_of)
+    else:
+        value_of = {row.id: row[-1] for row in positions}
+
+    flows = {row.id: {} for row in positions}
+    lots = {row.id: [] for row in positions}
+    for txn in transactions:
+        if txn.position_id in lots and txn.investment_id is not None:
+            lots[txn.position_id].append(txn.investment_id)
+        if txn.position_id in flows and txn.amount:
+            day = txn.trade_date.toordinal()
+            flows[txn.position_id][day] = flows[txn.position_id].get(day, 0) + txn.amount
+
+    def combined(rows):
+        merged = {}
+        for row in rows:
+            for day, amount in flows[row.id].items():
+                merged[day] = merged.get(day, 0) + amount
+        return dict(sorted(merged.items())), sum(value_of[row.id] for row in rows)
+
+    def summary(solved, index):
+        xirrs, cagrs, paid, received = solved
+        return {
+            'invested': round(float(paid[index]), 2),
+            'paid_in': round(float(paid[index]), 2),
+            'received': round(float(received[index]), 2),
+            'xirr_percent': _percent(xirrs[index]),
+            'cagr_percent': _percent(cagrs[index])
+        }
+
+    # Positions have few flows each; groups can have many, so solve them separately
+    holdings = _solve([(dict(sorted(flows[row.id].items())), value_of[row.id]) for row in positions], end)
+    types = sorted({row.instrument_type for row in positions})
+    groups = [combined([row for row in positions if row.instrument_type == kind]) for kind in types]
+    groups.append(combined(positions))
+    totals = _solve(groups, end)
+
+    result['holdings'] = [
+        {
+            'id': row.id,
+            'position_id': row.id,
+            'investment_ids': lots[row.id],
+            'instrument_type': row.instrument_type,
+            'symbol': row.symbol,
+            'current_value': round(float(value_of[row.id]), 2),
+            **summary(holdings, index)
+        }
+        for index, row in enumerate(positions)
+    ]
+    result['by_type'] = [
+        {'instrument_type': kind, 'current_value': round(float(groups[index][1]), 2), **summary(totals, index)}
+        for index, kind in enumerate(types)
+    ]
+    result['portfolio'] = {'current_value': round(float(groups[-1][1]), 2), **summary(totals, len(types))}
+    return result
@@ -0,0 +1,159 @@
+"""
+SQLite connection profile: per-connection pragmas, in-process write
+serialization and SQLITE_BUSY retries.
+
+SQLite allows one writer at a time. Under concurrent requests the default
+rollback journal makes writers block readers, every commit waits for an
+fsync, and lock waits go through SQLite's sleep-and-poll busy handler,
+so requests queue up and eventually fail with "database is locked".
+
+sqlite_profile.init_app() reads three settings:
+
+    SQLITE_PRAGMAS           applied to every new connection (WAL,
+                             synchronous=NORMAL, busy_timeout, ...)
+    SQLITE_SERIALIZE_WRITES  threads in this process take a lock before a
+                             connection's first write and release it when
+                             the transaction ends, so writers queue on the
+                             lock instead of polling the database lock
+    SQLITE_BUSY_RETRIES      a view marked @retry_on_busy that still fails
+                             with SQLITE_BUSY is rolled back and run again
+                             with jittered exponential backoff, then
+                             answered with 503 (ProductionConfig only)
+
+Only views whose sole side effect is the transaction they commit at the
+end are marked: re-running one that commits partway through or calls out
+(nutrition lookups, stock prices, mail) could repeat what already happened.
+
+None of it applies when the database isn't SQLite.
+"""
+import functools
+import random
+import threading
+import time
+
+from flask import jsonify
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def retry_on_busy(view):
+    """Mark a view as safe to re-run after SQLITE_BUSY (one commit, at the end, and no outbound calls)."""
+    view.retry_on_busy = True
+    return view
+
+
+def is_busy_error(error):
+    """Return True for SQLITE_BUSY / SQLITE_LOCKED ("database is locked") errors."""
+    message = str(getattr(error, 'orig', error)).lower()
+    return 'database is locked' in message or 'database table is locked' in message or 'database is busy' in message
+
+
+class SQLiteProfile:
+    """Applies the SQLite settings from the app config to its engine and views."""
+
+    def __init__(self):
+        self.pragmas = {}
+        self.serialize_writes = False
+        self.busy_retries = 0
+        self.busy_backoff = 0.05
+        self.lock_timeout = 5.0
+        self._write_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self.counters = {'busy_retries': 0, 'busy_failures': 0, 'write_lock_waits': 0, 'write_lock_timeouts': 0}
+
+    def init_app(self, app):
+        """
+        Hook pragmas, write serialization and busy retries into the app.
+
+        Call after the blueprints are registered so their @retry_on_busy
+        views are wrapped.
+        """
+        self.pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {})
+        self.serialize_writes = app.config.get('SQLITE_SERIALIZE_WRITES', False)
+        self.busy_retries = app.config.get('SQLITE_BUSY_RETRIES', 0)
+        self.busy_backoff = app.config.get('SQLITE_BUSY_BACKOFF', self.busy_backoff)
+        self.lock_timeout = self.pragmas.get('busy_timeout', 5000) / 1000
+
+        with app.app_context():
+            engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            return
+
+        if self.pragmas:
+            event.listen(engine, 'connect', self._apply_pragmas)
+        if self.serialize_writes:
+            event.listen(engine, 'before_cursor_execute', self._before_write)
+            event.listen(engine, 'commit', self._end_transaction)
+            event.listen(engine, 'rollback', self._end_transaction)
+            event.listen(engine.pool, 'checkin', self._checkin)
+        if self.busy_retries:
+            for endpoint, view in list(app.view_functions.items()):
+                if getattr(view, 'retry_on_busy', False):
+                    app.view_functions[endpoint] = self.retry_busy(view)
+
+    def _apply_pragmas(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in self.pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    def _count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def _before_write(self, conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get('holds_write_lock') or not statement.lstrip()[:7].upper().startswith(WRITE_PREFIXES):
+            return
+        if not self._write_lock.acquire(blocking=False):
+            self._count('write_lock_waits')
+            if not self._write_lock.acquire(timeout=self.lock_timeout):
+                # Fall back to SQLite's own locking rather than failing here
+                self._count('write_lock_timeouts')
+                return
+        conn.info['holds_write_lock'] = True
+
+    def _release(self, info):
+        if info.pop('holds_write_lock', False):
+            self._write_lock.release()
+
+    def _end_transaction(self, conn):
+        self._release(conn.info)
+
+    def _checkin(self, dbapi_connection, connection_record):
+        self._release(connection_record.info)
+
+    def retry_busy(self, view):
+        """Re-run a @retry_on_busy view after rolling back when it fails with SQLITE_BUSY."""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            attempt = 0
+            while True:
+                try:
+                    return view(*args, **kwargs)
+                except OperationalError as e:
+                    if not is_busy_error(e):
+                        raise
+                    db.session.rollback()
+                    if attempt >= self.busy_retries:
+                        self._count('busy_failures')
+                        response = jsonify({'error': 'Database is busy, please try again shortly'})
+                        response.headers['Retry-After'] = '1'
+                        return response, 503
+                    attempt += 1
+                    self._count('busy_retries')
+                    time.sleep(random.uniform(0, self.busy_backoff * 2 ** (attempt - 1)))
+        return wrapper
+
+    def stats(self):
+        """Return retry and write-lock counters."""
+        with self._counter_lock:
+            return dict(self.counters)
+
+
+# Global instance
+sqlite_profile = SQLiteProfile()
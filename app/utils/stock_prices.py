@@ -0,0 +1,196 @@
+"""
+Process-wide price cache for the finance routes.
+
+Latest quotes expire quickly while the exchange is open and are kept
+until the next session otherwise. Historical closes live in the local
+price store (app/utils/price_history.py).
+
+Upstream calls go through the configured PriceProvider (see
+app/utils/price_providers.py), and concurrent requests for the same data
+wait on a single fetch.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.market_hours import seconds_until_open
+from app.utils.price_providers import YahooPriceProvider, make_provider
+
+
+class PriceUnavailable(Exception):
+    """Raised when the provider returns no price data for a symbol."""
+
+
+class PriceFetchTimeout(Exception):
+    """Raised when a coalesced request gives up waiting on another request's fetch."""
+
+
+def normalize_symbol(symbol):
+    """Uppercase a symbol and default it to NSE ('tcs' -> 'TCS.NS')."""
+    symbol = (symbol or '').strip().upper()
+    if symbol and not symbol.endswith(('.NS', '.BO')):
+        symbol = f"{symbol}.NS"
+    return symbol
+
+
+class _InFlight:
+    """A pending fetch that identical concurrent requests wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class StockPriceCache:
+    """
+    Bounded LRU of latest quotes and names with per-entry TTLs.
+
+    Keys:
+        (symbol, 'latest')  - {'price', 'as_of'} from the most recent session
+        (symbol, 'name')    - display name from the provider
+    """
+
+    def __init__(self, max_entries=20000, live_ttl=60, name_ttl=24 * 3600, wait_timeout=60):
+        self.max_entries = max_entries
+        self.live_ttl = live_ttl
+        self.name_ttl = name_ttl
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.provider = YahooPriceProvider()
+        self.counters = {'hits': 0, 'misses': 0, 'fetches': 0, 'coalesced': 0, 'errors': 0}
+
+    def init_app(self, app):
+        """Read cache settings from the app config and build the price provider."""
+        self.max_entries = app.config.get('PRICE_CACHE_SIZE', self.max_entries)
+        self.live_ttl = app.config.get('PRICE_CACHE_LIVE_TTL', self.live_ttl)
+        self.provider = make_provider(
+            app.config.get('PRICE_PROVIDER', 'yahoo'),
+            app.config.get('PRICE_PROVIDER_CALLS_PER_MINUTE', 30)
+        )
+
+    # Cache primitives
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self.counters['misses'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return True, entry[1]
+
+    def _set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def live_ttl_now(self):
+        """TTL for today's prices: short in session, until the next open otherwise."""
+        wait = seconds_until_open()
+        return self.live_ttl if wait == 0 else max(wait, self.live_ttl)
+
+    def _single_flight(self, key, fetch):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+            else:
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            if not call.done.wait(timeout=self.wait_timeout):
+                raise PriceFetchTimeout(f'Timed out waiting for the in-flight fetch of {key[0]}')
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            with self._lock:
+                self.counters['fetches'] += 1
+            call.value = fetch()
+            return call.value
+        except Exception as e:
+            with self._lock:
+                self.counters['errors'] += 1
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    # Public API
+
+    def latest(self, symbol):
+        """
+        Most recent close (the live price during a session).
+
+        Returns:
+            dict with price and as_of (ISO date)
+
+        Raises:
+            PriceUnavailable: The provider has no recent data for symbol
+            PriceFetchTimeout: Another request's fetch of symbol didn't finish in time
+        """
+        found, quote = self._get((symbol, 'latest'))
+        if found:
+            return quote
+
+        def fetch():
+            prices = self.provider.latest_prices([symbol])
+            if symbol not in prices:
+                raise PriceUnavailable(f'No data available for {symbol}. The symbol may be invalid or delisted.')
+            return self.remember_quote(symbol, *prices[symbol])
+
+        return self._single_flight((symbol, 'latest'), fetch)
+
+    def remember_quote(self, symbol, as_of, price):
+        """Cache a quote fetched elsewhere (e.g. by the background refresher)."""
+        quote = {'price': price, 'as_of': as_of.isoformat()}
+        self._set((symbol, 'latest'), quote, self.live_ttl_now())
+        return quote
+
+    def name(self, symbol, default=None):
+        """Display name from the provider, falling back to default when it's unavailable."""
+        found, name = self._get((symbol, 'name'))
+        if found:
+            return name or default
+
+        def fetch():
+            try:
+                name = self.provider.display_name(symbol)
+            except Exception as info_error:
+                # Yahoo's info endpoint is the first to be rate limited; don't retry it for a while
+                print(f"Info fetch failed for {symbol}: {type(info_error).__name__}: {info_error}")
+                name = None
+            self._set((symbol, 'name'), name, self.name_ttl if name else self.live_ttl * 10)
+            return name
+
+        try:
+            return self._single_flight((symbol, 'name'), fetch) or default
+        except PriceFetchTimeout:
+            return default
+
+    def stats(self):
+        """Return hit/miss/fetch counters."""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Global instance
+stock_prices = StockPriceCache()
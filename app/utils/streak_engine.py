@@ -0,0 +1,152 @@
+"""
+Frequency-aware streak computation for many habits at once.
+
+One grouped query returns (habit_id, day, completed count) for every habit
+of a user; a single linear pass per habit then folds days into periods
+(days or Monday-based weeks) and measures runs of consecutive periods that
+meet the habit's target_count.
+
+Period rules:
+    daily  - a day counts when it has at least target_count completed logs
+    weekly - a week counts when it has at least target_count completed days
+    custom - treated like daily
+"""
+from datetime import datetime
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Habit, HabitLog
+from app.utils.helpers import as_date
+from app.utils.streak_state import COMPLETED_FILTER, streak_info
+
+
+EMPTY_STREAK = {
+    'current_streak': 0,
+    'longest_streak': 0,
+    'last_completed': None
+}
+
+
+def _period_index(day, weekly):
+    ordinal = day.toordinal()
+    # date(1, 1, 1) is a Monday, so (ordinal - 1) // 7 numbers ISO weeks
+    return (ordinal - 1) // 7 if weekly else ordinal
+
+
+def streak_from_day_counts(day_counts, frequency='daily', target_count=1, today=None):
+    """
+    Compute streak info from per-day completion counts.
+
+    Args:
+        day_counts: Iterable of (date, completed_count), ascending by date,
+            one entry per day
+        frequency: Habit frequency ('daily', 'weekly' or 'custom')
+        target_count: Completions required per period
+        today: Reference date (defaults to today, UTC)
+
+    Returns:
+        dict with current_streak, longest_streak, and last_completed
+    """
+    weekly = frequency == 'weekly'
+    target = int(target_count or 1)
+    today = today or datetime.utcnow().date()
+
+    longest = run = 0
+    last_qualified = None
+    last_qualified_day = None
+    period = None
+    period_total = 0
+    period_last_day = None
+
+    def close_period():
+        nonlocal longest, run, last_qualified, last_qualified_day
+        if period is None or period_total < target:
+            return
+        run = run + 1 if last_qualified == period - 1 else 1
+        longest = max(longest, run)
+        last_qualified = period
+        last_qualified_day = period_last_day
+
+    for day, count in day_counts:
+        index = _period_index(day, weekly)
+        if index != period:
+            close_period()
+            period = index
+            period_total = 0
+        period_last_day = day
+        # Weekly targets count distinct days, daily targets count logs
+        period_total += 1 if weekly else count
+    close_period()
+
+    if last_qualified_day is None:
+        return dict(EMPTY_STREAK)
+
+    current_period = _period_index(today, weekly)
+    current = run if last_qualified in (current_period, current_period - 1) else 0
+
+    return {
+        'current_streak': current,
+        'longest_streak': max(longest, current),
+        'last_completed': last_qualified_day.isoformat()
+    }
+
+
+def compute_user_streaks(user_id, habits=None, today=None):
+    """
+    Compute streaks for all of a user's habits with one grouped query.
+
+    Args:
+        user_id: Owner of the habits
+        habits: Optional list of Habit objects (loaded if not given)
+        today: Reference date (defaults to today, UTC)
+
+    Returns:
+        dict mapping habit_id to streak info
+    """
+    if habits is None:
+        habits = Habit.query.filter_by(user_id=user_id).all()
+    if not habits:
+        return {}
+
+    day = func.date(HabitLog.completed_at)
+    rows = db.session.query(HabitLog.habit_id, day, func.count(HabitLog.id)).join(
+        Habit, Habit.id == HabitLog.habit_id
+    ).filter(
+        Habit.user_id == user_id, COMPLETED_FILTER
+    ).group_by(HabitLog.habit_id, day).order_by(HabitLog.habit_id, day).all()
+
+    day_counts = {}
+    for habit_id, log_day, count in rows:
+        day_counts.setdefault(habit_id, []).append((as_date(log_day), count))
+
+    return {
+        habit.id: streak_from_day_counts(
+            day_counts.get(habit.id, ()), habit.frequency, habit.target_count, today
+        )
+        for habit in habits
+    }
+
+
+def uses_daily_state(habit):
+    """Return True if the persisted daily streak state applies to a habit."""
+    return habit.frequency != 'weekly' and int(habit.target_count or 1) == 1
+
+
+def habit_streak_info(habit):
+    """
+    Streak info for a single habit.
+
+    Plain daily habits read the incrementally maintained state; weekly
+    and multi-count habits go through the engine.
+    """
+    if uses_daily_state(habit):
+        return streak_info(habit.id)
+
+    day = func.date(HabitLog.completed_at)
+    rows = db.session.query(day, func.count(HabitLog.id)).filter(
+        HabitLog.habit_id == habit.id, COMPLETED_FILTER
+    ).group_by(day).order_by(day).all()
+    return streak_from_day_counts(
+        ((as_date(log_day), count) for log_day, count in rows), habit.frequency, habit.target_count
+    )
@@ -0,0 +1,218 @@
+"""
+Incrementally maintained habit streaks.
+
+Each habit keeps its completed days as a set of maximal runs
+(HabitStreakRun) plus a one-row summary (HabitStreak). Adding or removing a
+completed day touches at most two runs, so log writes no longer scan the
+habit's whole history.
+"""
+from datetime import datetime, timedelta, time
+
+from sqlalchemy import or_
+
+from app import db
+from app.models import HabitLog, HabitStreak, HabitStreakRun
+from app.utils.helpers import calculate_streak
+
+
+COMPLETED_FILTER = or_(HabitLog.status == 'completed', HabitLog.status.is_(None))
+
+
+def is_completed(log):
+    """Return True if a log counts towards streaks."""
+    return log.status in ['completed', None]
+
+
+def day_has_completion(habit_id, day, exclude_log_id=None):
+    """
+    Check whether a habit has any completed log on a given day.
+
+    Args:
+        habit_id: Habit ID
+        day: date to check
+        exclude_log_id: Optional log ID to ignore (e.g. the log being added)
+
+    Returns:
+        bool
+    """
+    start = datetime.combine(day, time.min)
+    query = HabitLog.query.filter(
+        HabitLog.habit_id == habit_id,
+        HabitLog.completed_at >= start,
+        HabitLog.completed_at < start + timedelta(days=1),
+        COMPLETED_FILTER
+    )
+    if exclude_log_id is not None:
+        query = query.filter(HabitLog.id != exclude_log_id)
+    return db.session.query(query.exists()).scalar()
+
+
+def completed_days(habit_id):
+    """Return the sorted distinct days with a completed log for a habit."""
+    rows = db.session.query(HabitLog.completed_at).filter(
+        HabitLog.habit_id == habit_id, COMPLETED_FILTER
+    ).all()
+    return sorted({row.completed_at.date() for row in rows})
+
+
+def rebuild_streak_state(habit_id):
+    """
+    Recompute a habit's runs and summary from its logs.
+
+    Args:
+        habit_id: Habit ID
+
+    Returns:
+        HabitStreak (added to the session, not committed)
+    """
+    HabitStreakRun.query.filter_by(habit_id=habit_id).delete(synchronize_session=False)
+
+    state = db.session.get(HabitStreak, habit_id)
+    if state is None:
+        state = HabitStreak(habit_id=habit_id)
+        db.session.add(state)
+    state.longest_streak = 0
+    state.last_completed = None
+    state.last_run_start = None
+
+    run_start = run_end = None
+    for day in completed_days(habit_id):
+        if run_end is not None and day == run_end + timedelta(days=1):
+            run_end = day
+            continue
+        if run_end is not None:
+            _add_run(state, habit_id, run_start, run_end)
+        run_start = run_end = day
+    if run_end is not None:
+        _add_run(state, habit_id, run_start, run_end)
+
+    return state
+
+
+def _add_run(state, habit_id, start, end):
+    db.session.add(HabitStreakRun(habit_id=habit_id, start_date=start, end_date=end))
+    state.longest_streak = max(state.longest_streak, (end - start).days + 1)
+    state.last_completed = end
+    state.last_run_start = start
+
+
+def get_streak_state(habit_id):
+    """Return the HabitStreak for a habit, building it on first use."""
+    state = db.session.get(HabitStreak, habit_id)
+    if state is None:
+        state = rebuild_streak_state(habit_id)
+        db.session.flush()
+    return state
+
+
+def streak_info(habit_id, today=None):
+    """Return streak info in the same shape as calculate_streak."""
+    return get_streak_state(habit_id).to_dict(today)
+
+
+def add_completed_day(habit_id, day):
+    """
+    Add a newly completed day to a habit's runs.
+
+    The caller must ensure the state exists and the day had no completed
+    log before.
+    """
+    state = db.session.get(HabitStreak, habit_id)
+    before = HabitStreakRun.query.filter_by(habit_id=habit_id, end_date=day - timedelta(days=1)).first()
+    after = HabitStreakRun.query.filter_by(habit_id=habit_id, start_date=day + timedelta(days=1)).first()
+
+    if before and after:
+        before.end_date = after.end_date
+        db.session.delete(after)
+        run = before
+    elif before:
+        before.end_date = day
+        run = before
+    elif after:
+        after.start_date = day
+        run = after
+    else:
+        run = HabitStreakRun(habit_id=habit_id, start_date=day, end_date=day)
+        db.session.add(run)
+
+    state.longest_streak = max(state.longest_streak, run.length)
+    if state.last_completed is None or run.end_date >= state.last_completed:
+        state.last_completed = run.end_date
+        state.last_run_start = run.start_date
+
+
+def remove_completed_day(habit_id, day):
+    """
+    Remove a day that no longer has any completed log from a habit's runs.
+
+    The caller must ensure the state exists.
+    """
+    state = db.session.get(HabitStreak, habit_id)
+    run = HabitStreakRun.query.filter(
+        HabitStreakRun.habit_id == habit_id,
+        HabitStreakRun.start_date <= day,
+        HabitStreakRun.end_date >= day
+    ).first()
+
+    if run is None:
+        # State drifted from the logs; fall back to a full rebuild
+        rebuild_streak_state(habit_id)
+        return
+
+    old_length = run.length
+    if run.start_date == run.end_date:
+        db.session.delete(run)
+    elif day == run.start_date:
+        run.start_date = day + timedelta(days=1)
+    elif day == run.end_date:
+        run.end_date = day - timedelta(days=1)
+    else:
+        db.session.add(HabitStreakRun(habit_id=habit_id, start_date=day + timedelta(days=1), end_date=run.end_date))
+        run.end_date = day - timedelta(days=1)
+    db.session.flush()
+
+    if old_length >= state.longest_streak:
+        runs = HabitStreakRun.query.filter_by(habit_id=habit_id).with_entities(
+            HabitStreakRun.start_date, HabitStreakRun.end_date
+        ).all()
+        state.longest_streak = max(((end - start).days + 1 for start, end in runs), default=0)
+
+    latest = HabitStreakRun.query.filter_by(habit_id=habit_id).order_by(HabitStreakRun.end_date.desc()).first()
+    state.last_completed = latest.end_date if latest else None
+    state.last_run_start = latest.start_date if latest else None
+
+
+def on_log_added(log):
+    """Update streak state after a HabitLog has been added to the session."""
+    if not is_completed(log):
+        return
+    db.session.flush()
+    if db.session.get(HabitStreak, log.habit_id) is None:
+        # First write since the state table was introduced; the rebuild sees this log
+        rebuild_streak_state(log.habit_id)
+    elif not day_has_completion(log.habit_id, log.completed_at.date(), exclude_log_id=log.id):
+        add_completed_day(log.habit_id, log.completed_at.date())
+
+
+def on_log_deleted(log):
+    """Update streak state after a HabitLog has been deleted from the session."""
+    if not is_completed(log):
+        return
+    db.session.flush()
+    if db.session.get(HabitStreak, log.habit_id) is None:
+        rebuild_streak_state(log.habit_id)
+    elif not day_has_completion(log.habit_id, log.completed_at.date()):
+        remove_completed_day(log.habit_id, log.completed_at.date())
+
+
+def check_streak_state(habit_id):
+    """
+    Compare the persisted state with calculate_streak over the full log.
+
+    Returns:
+        Tuple of (matches, persisted_info, recomputed_info)
+    """
+    persisted = streak_info(habit_id)
+    logs = HabitLog.query.filter_by(habit_id=habit_id).order_by(HabitLog.completed_at.desc()).all()
+    recomputed = calculate_streak(logs)
+    return persisted == recomputed, persisted, recomputed
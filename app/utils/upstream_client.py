@@ -0,0 +1,228 @@
+"""Keep-alive HTTP client with deadlines, retries and a circuit breaker for upstream APIs."""
+import http.client
+import queue
+import random
+import threading
+import time
+
+from app.utils.metrics import track_outbound
+
+
+# Statuses worth retrying; anything else is returned to the caller
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream call fails after its retries or deadline."""
+
+
+class CircuitOpen(UpstreamError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed    - calls pass; failure_threshold failures in a row open it
+    open      - calls fail fast until reset_timeout seconds have passed
+    half_open - a single trial call; success closes, failure reopens
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.opened_count = 0
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def _current_state(self):
+        if self._state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = 'half_open'
+            self._trial_running = False
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def allow(self):
+        """Return True if a call may go upstream now."""
+        with self._lock:
+            state = self._current_state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = 'closed'
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                if self._state != 'open':
+                    self.opened_count += 1
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+
+class PooledHTTPClient:
+    """
+    Thread-safe HTTP(S) client that reuses keep-alive connections to one host.
+
+    Every request runs against a deadline covering all attempts. Connection
+    errors, timeouts and RETRY_STATUSES are retried with full-jitter
+    exponential backoff while time remains, and each request's final
+    outcome feeds the circuit breaker. Request latency is recorded under
+    name (the host by default) in the outbound metrics.
+    """
+
+    def __init__(self, host, port=None, scheme='https', pool_size=4, timeout=5.0,
+                 retries=2, backoff=0.2, breaker=None, name=None):
+        self.host = host
+        self.name = name or host
+        self.port = port
+        self.scheme = scheme
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'failures': 0,
+            'short_circuited': 0,
+            'retries': 0,
+            'connections_opened': 0,
+            'connections_reused': 0
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _acquire(self, timeout):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            self._count('connections_opened')
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            return connection_class(self.host, self.port, timeout=timeout), False
+
+        self._count('connections_reused')
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn, response):
+        if response.will_close:
+            conn.close()
+            return
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method, path, headers=None, body=None, deadline=None):
+        """
+        Send a request, retrying transient failures until the deadline.
+
+        Args:
+            method: HTTP method
+            path: Request path including the query string
+            headers: Optional request headers
+            body: Optional request body
+            deadline: Seconds allowed for all attempts (defaults to timeout)
+
+        Returns:
+            (status, body bytes) of the first non-retryable response
+
+        Raises:
+            CircuitOpen: The breaker is open; upstream was not called
+            UpstreamError: Every attempt failed or the deadline passed
+        """
+        with track_outbound(self.name, method):
+            return self._send(method, path, headers, body, deadline)
+
+    def _send(self, method, path, headers, body, deadline):
+        expires = time.monotonic() + (self.timeout if deadline is None else deadline)
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpen(f'{self.host} circuit is open')
+        self._count('requests')
+
+        # Every outcome must reach the breaker, or a half-open trial that
+        # raised something unexpected would leave it short-circuiting forever
+        try:
+            status, data = self._attempt(method, path, headers, body, expires)
+        except BaseException:
+            self._count('failures')
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return status, data
+
+    def _attempt(self, method, path, headers, body, expires):
+        last_error = None
+        attempt = 0
+        while attempt <= self.retries:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                last_error = last_error or TimeoutError('deadline exceeded')
+                break
+
+            conn, reused = self._acquire(remaining)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                last_error = e
+                if reused and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)):
+                    # The server dropped an idle pooled connection; retry on a fresh one
+                    continue
+            else:
+                self._release(conn, response)
+                if response.status not in RETRY_STATUSES:
+                    return response.status, data
+                last_error = UpstreamError(f'status {response.status}')
+
+            attempt += 1
+            if attempt <= self.retries:
+                self._count('retries')
+                delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+                time.sleep(max(0, min(delay, expires - time.monotonic())))
+
+        raise UpstreamError(f'{method} {self.host}{path.split("?")[0]} failed: {last_error}')
+
+    def stats(self):
+        """Return request counters and the breaker state."""
+        with self._lock:
+            stats = dict(self.counters)
+        stats['idle_connections'] = self._pool.qsize()
+        stats['breaker_state'] = self.breaker.state
+        stats['breaker_opened'] = self.breaker.opened_count
+        return stats
+
+    def close(self):
+        """Close all idle pooled connections."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Backfill the local daily price store for every symbol held in investments.
+
+For each distinct Investment.symbol, downloads the bars between the
+earliest buy date (less a week, for weekend/holiday buy dates) and
+yesterday that aren't stored yet.
+
+Usage:
+    python backfill_prices.py                    # all held symbols
+    python backfill_prices.py --symbol TCS.NS    # one symbol
+    python backfill_prices.py --since 2020-01-01 # start no later than this date
+    python backfill_prices.py --config production # production profile (or set FLASK_ENV)
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from app import create_app, db
+from app.models import Investment
+from app.utils.price_history import price_history
+from app.utils.market_hours import market_now
+from app.utils.stock_prices import normalize_symbol
+from config import config
+
+
+def held_symbols():
+    """Map each normalized symbol to the earliest buy date across its lots."""
+    rows = db.session.query(Investment.symbol, func.min(Investment.buy_date)).filter(
+        Investment.symbol.isnot(None), Investment.symbol != ''
+    ).group_by(Investment.symbol).all()
+
+    symbols = {}
+    for symbol, first_buy in rows:
+        symbol = normalize_symbol(symbol)
+        symbols[symbol] = min(first_buy, symbols.get(symbol, first_buy))
+    return symbols
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill daily price bars for held symbols.')
+    parser.add_argument('--symbol', help='Only backfill this symbol')
+    parser.add_argument('--since', help='Backfill from this date (YYYY-MM-DD) even if no lot is that old')
+    parser.add_argument('--pause', type=float, default=1.0, help='Seconds to wait between symbols (rate limiting)')
+    parser.add_argument('--config', default=os.getenv('FLASK_ENV', 'development'), choices=sorted(config),
+                        help='App configuration, as for run.py (defaults to FLASK_ENV, else development)')
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context():
+        # Creates price_bars / price_coverage on databases that predate them
+        db.create_all()
+
+        symbols = held_symbols()
+        if args.symbol:
+            symbol = normalize_symbol(args.symbol)
+            symbols = {symbol: symbols.get(symbol, market_now().date())}
+        since = datetime.strptime(args.since, '%Y-%m-%d').date() if args.since else None
+
+        end = market_now().date() - timedelta(days=1)
+        failures = 0
+        for index, (symbol, first_buy) in enumerate(sorted(symbols.items())):
+            start = first_buy - timedelta(days=price_history.lookback_days)
+            if since:
+                start = min(start, since)
+            try:
+                downloaded = price_history.ensure_range(symbol, start, end)
+                db.session.commit()
+                print(f"  {symbol}: {downloaded} new bar(s) ({start} to {end})")
+            except Exception as e:
+                db.session.rollback()
+                price_history.forget(symbol)
+                failures += 1
+                print(f"  {symbol}: failed - {type(e).__name__}: {e}")
+            if args.pause and index < len(symbols) - 1:
+                time.sleep(args.pause)
+
+        print(f"Backfilled {len(symbols) - failures}/{len(symbols)} symbol(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+"""
+Benchmark: latency and throughput of the hot API endpoints.
+
+Seeds an in-memory database (create_app('testing')) with deterministic
+synthetic data - users x habits x years of daily HabitLogs, DietEntries
+and Investment lots - using bulk inserts, then drives each endpoint
+through the Flask test client and reports p50/p95/p99 latency,
+throughput and SQL statements per request:
+
+    dashboard          GET  /api/personal/dashboard
+    get_habit          GET  /api/personal/habits/<id>
+    diet_summary       GET  /api/personal/diet/summary
+    portfolio_summary  GET  /api/finance/portfolio/summary
+    log_habit          POST /api/personal/habits/<id>/log
+
+Results can be saved as a JSON baseline and later runs compared with it;
+an endpoint whose p50 or p95 grows by more than --threshold (and at least
+--min-delta-ms), or that runs more SQL per request, is flagged and the
+script exits with status 1.
+
+Usage:
+    python bench_endpoints.py [--users 20] [--habits 8] [--years 2] [--requests 300]
+    python bench_endpoints.py --save                # write the baseline
+    python bench_endpoints.py                       # compare with it
+"""
+import argparse
+import datetime
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import jwt
+
+from app import create_app, db
+from app.models import User, Habit, HabitLog, DietEntry, Investment, Quote
+from app.utils.diet_totals import rebuild_rollup
+from app.utils.ledger import migrate_investments
+from app.utils.metrics import metrics
+from app.utils.streak_state import rebuild_streak_state
+from config import Config
+
+FOODS = ['Oats', 'Eggs', 'Rice', 'Dal', 'Chicken curry', 'Salad', 'Apple', 'Yogurt', 'Paneer', 'Chapati']
+MEALS = ['breakfast', 'lunch', 'dinner', 'snack']
+INSTRUMENT_TYPES = ['stock', 'mutual_fund', 'fd', 'gold', 'crypto']
+CHUNK = 5000
+
+
+def insert(table, rows):
+    for offset in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[offset:offset + CHUNK])
+
+
+def seed(args):
+    """
+    Bulk-insert the synthetic dataset and build the derived tables.
+
+    Returns:
+        List of (user id, [habit ids]) tuples
+    """
+    rng = random.Random(args.seed)
+    today = datetime.date.today()
+    days = args.years * 365
+    first_day = today - datetime.timedelta(days=days - 1)
+    created = datetime.datetime.combine(first_day, datetime.time())
+
+    insert(User.__table__, [
+        {'username': f'bench{u}', 'email': f'bench{u}@example.com', 'password_hash': 'x',
+         'calorie_goal': 2000, 'created_at': created}
+        for u in range(args.users)
+    ])
+    user_ids = [row.id for row in db.session.query(User.id).order_by(User.id)]
+
+    insert(Habit.__table__, [
+        {'user_id': user_id, 'name': f'Habit {h}', 'acronym': f'H{h}', 'frequency': 'daily',
+         'target_count': 1, 'is_active': True, 'created_at': created, 'updated_at': created}
+        for user_id in user_ids for h in range(args.habits)
+    ])
+    habits = {}
+    for habit_id, user_id in db.session.query(Habit.id, Habit.user_id).order_by(Habit.id):
+        habits.setdefault(user_id, []).append(habit_id)
+
+    # One log per habit per day, mostly completed, with a few gaps
+    logs = []
+    for habit_ids in habits.values():
+        for habit_id in habit_ids:
+            for offset in range(days):
+                if rng.random() < 0.1:
+                    continue
+                logs.append({
+                    'habit_id': habit_id,
+                    'completed_at': created + datetime.timedelta(days=offset, minutes=rng.randint(360, 1320)),
+                    'notes': '',
+                    'status': 'completed' if rng.random() < 0.85 else 'failed'
+                })
+    insert(HabitLog.__table__, logs)
+
+    entries = []
+    for user_id in user_ids:
+        for offset in range(days):
+            for meal in range(args.meals):
+                calories = rng.randint(100, 800)
+                entry = {
+                    'user_id': user_id,
+                    'meal_type': MEALS[meal % len(MEALS)],
+                    'food_item': rng.choice(FOODS),
+                    'quantity': 1.0,
+                    'unit': 'serving',
+                    'consumed_at': created + datetime.timedelta(days=offset, hours=7 + meal * 4),
+                    'notes': ''
+                }
+                entry.update({field: rng.uniform(0, 30) for field in DietEntry.NUTRIENT_FIELDS})
+                entry['calories'] = calories
+                entries.append(entry)
+    insert(DietEntry.__table__, entries)
+
+    symbols = [f'SYM{i:03d}.NS' for i in range(100)]
+    insert(Quote.__table__, [
+        {'symbol': symbol, 'price': rng.uniform(50, 2000), 'as_of': today, 'updated_at': datetime.datetime.utcnow()}
+        for symbol in symbols
+    ])
+    lots = []
+    for user_id in user_ids:
+        for i in range(args.investments):
+            quantity = rng.randint(1, 100)
+            price = rng.uniform(50, 2000)
+            bought = first_day + datetime.timedelta(days=rng.randrange(days))
+            lots.append({
+                'user_id': user_id,
+                'instrument_type': INSTRUMENT_TYPES[i % len(INSTRUMENT_TYPES)],
+                'instrument_name': 'Bench lot',
+                'symbol': rng.choice(symbols) if i % 2 == 0 else f'LOT{user_id}-{i}',
+                'quantity': quantity,
+                'buy_price': price,
+                'buy_date': bought,
+                'total_invested': quantity * price,
+                'current_price': price * 1.1,
+                'current_value': quantity * price * 1.1,
+                'last_updated': datetime.datetime.combine(bought, datetime.time())
+            })
+    insert(Investment.__table__, lots)
+    db.session.commit()
+
+    rebuild_rollup()
+    for habit_ids in habits.values():
+        for habit_id in habit_ids:
+            rebuild_streak_state(habit_id)
+    migrate_investments()
+    db.session.commit()
+
+    print(f"Seeded {len(user_ids)} users, {len(user_ids) * args.habits} habits, {len(logs)} habit logs, "
+          f"{len(entries)} diet entries, {len(lots)} investment lots")
+    return [(user_id, habits[user_id]) for user_id in user_ids]
+
+
+def scenarios(today):
+    """(name, metrics endpoint, method, url(user, habit), body) per benchmarked endpoint."""
+    day = today.isoformat()
+    return [
+        ('dashboard', 'personal.get_dashboard', 'GET', lambda user, habit: f'/api/personal/dashboard?date={day}', None),
+        ('get_habit', 'personal.get_habit', 'GET', lambda user, habit: f'/api/personal/habits/{habit}', None),
+        ('diet_summary', 'personal.get_diet_summary', 'GET', lambda user, habit: f'/api/personal/diet/summary?date={day}', None),
+        ('portfolio_summary', 'finance.get_portfolio_summary', 'GET', lambda user, habit: '/api/finance/portfolio/summary', None),
+        # Writes last so they don't change what the reads see
+        ('log_habit', 'personal.log_habit', 'POST', lambda user, habit: f'/api/personal/habits/{habit}/log', {'notes': 'bench'}),
+    ]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(client, tokens, users, scenario, requests, warmup):
+    name, endpoint, method, url, body = scenario
+    rng = random.Random(name)
+    plan = []
+    for _ in range(warmup + requests):
+        user_id, habit_ids = users[rng.randrange(len(users))]
+        plan.append((tokens[user_id], url(user_id, rng.choice(habit_ids)), body))
+
+    for token, path, payload in plan[:warmup]:
+        client.open(path, method=method, json=payload, headers=token)
+
+    statements_before = metrics.request_statements.snapshot(endpoint)
+    samples, errors = [], 0
+    started = time.perf_counter()
+    for token, path, payload in plan[warmup:]:
+        start = time.perf_counter()
+        response = client.open(path, method=method, json=payload, headers=token)
+        samples.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    statements_after = metrics.request_statements.snapshot(endpoint)
+    counted = statements_after[0] - statements_before[0]
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'throughput_rps': round(requests / elapsed, 1),
+        'sql_per_request': round((statements_after[1] - statements_before[1]) / counted, 2) if counted else None
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Return {endpoint: [reasons]} for results that regressed against the baseline."""
+    regressions = {}
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        reasons = []
+        for key in ('p50_ms', 'p95_ms'):
+            if result[key] > previous[key] * (1 + threshold) and result[key] - previous[key] >= min_delta_ms:
+                reasons.append(f"{key} {previous[key]:.2f} -> {result[key]:.2f}")
+        if previous.get('sql_per_request') is not None and result['sql_per_request'] is not None \
+                and result['sql_per_request'] > previous['sql_per_request'] + 0.5:
+            reasons.append(f"sql/request {previous['sql_per_request']} -> {result['sql_per_request']}")
+        if result['errors']:
+            reasons.append(f"{result['errors']} error responses")
+        if reasons:
+            regressions[name] = reasons
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--habits', type=int, default=8, help='Habits per user')
+    parser.add_argument('--years', type=int, default=2, help='Years of daily logs and diet entries')
+    parser.add_argument('--meals', type=int, default=4, help='Diet entries per user per day')
+    parser.add_argument('--investments', type=int, default=40, help='Investment lots per user')
+    parser.add_argument('--requests', type=int, default=300, help='Timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=30, help='Untimed requests per endpoint')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', help='Comma-separated endpoint names to run')
+    parser.add_argument('--baseline', default='bench_baselines/endpoints.json')
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed relative p50/p95 growth')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='Ignore smaller latency changes')
+    args = parser.parse_args()
+
+    scale = {key: getattr(args, key) for key in ('users', 'habits', 'years', 'meals', 'investments', 'seed')}
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        users = seed(args)
+        print(f"  seeding took {time.perf_counter() - start:.1f} s")
+
+        now = datetime.datetime.utcnow()
+        tokens = {
+            user_id: {'Authorization': 'Bearer ' + jwt.encode(
+                {'user_id': user_id, 'iat': now, 'exp': now + datetime.timedelta(days=1)},
+                Config.SECRET_KEY, algorithm='HS256'
+            )}
+            for user_id, _ in users
+        }
+
+        selected = set(args.only.split(',')) if args.only else None
+        client = app.test_client()
+        results = {}
+        for scenario in scenarios(datetime.date.today()):
+            if selected is None or scenario[0] in selected:
+                results[scenario[0]] = run_scenario(client, tokens, users, scenario, args.requests, args.warmup)
+
+    baseline_path = Path(args.baseline)
+    baseline = None
+    if baseline_path.exists() and not args.save:
+        saved = json.loads(baseline_path.read_text())
+        if saved.get('scale') == scale:
+            baseline = saved['results']
+        else:
+            print(f"Baseline {baseline_path} was recorded at a different scale {saved.get('scale')}; not comparing")
+
+    print(f"\n{'endpoint':<18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'sql/req':>8} {'p95 vs base':>12}")
+    for name, result in results.items():
+        versus = ''
+        if baseline and name in baseline and baseline[name]['p95_ms']:
+            versus = f"{(result['p95_ms'] / baseline[name]['p95_ms'] - 1) * 100:+.0f}%"
+        sql = '-' if result['sql_per_request'] is None else f"{result['sql_per_request']:g}"
+        print(f"{name:<18} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['throughput_rps']:>8.0f} {sql:>8} {versus:>12}")
+
+    if args.save:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps({
+            'recorded_at': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': scale,
+            'requests': args.requests,
+            'results': results
+        }, indent=2) + '\n')
+        print(f"\nSaved baseline to {baseline_path}")
+        return 0
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    for name, reasons in regressions.items():
+        print(f"  REGRESSION {name}: {'; '.join(reasons)}")
+    if not regressions:
+        print("\nNo regressions against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
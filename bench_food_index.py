@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark: local food index lookups per second vs index size.
+
+Builds FoodIndex instances from the bundled foods padded with synthetic
+names, then times a mix of autocomplete prefixes, whole words and
+misspellings against each.
+
+Usage:
+    python bench_food_index.py [--sizes 100,1000,10000,100000] [--queries 20000]
+"""
+import argparse
+import random
+import time
+
+from app.utils.food_catalog import FoodIndex, load_bundled_foods
+
+
+WORDS = [
+    'chicken', 'rice', 'paneer', 'masala', 'grilled', 'roasted', 'curry', 'salad', 'spicy', 'sweet',
+    'brown', 'white', 'egg', 'oats', 'banana', 'almond', 'yogurt', 'lentil', 'bean', 'tofu',
+    'beef', 'salmon', 'tuna', 'pasta', 'bread', 'cheese', 'butter', 'milk', 'mango', 'apple',
+    'potato', 'spinach', 'tomato', 'garlic', 'lemon', 'honey', 'coconut', 'peanut', 'soup', 'wrap'
+]
+
+QUERIES = ['ri', 'chi', 'chicken', 'chiken', 'brown rice', 'panner', 'yog', 'banan', 'egg', 'sweet pot', 'xyzzy']
+
+
+def build_index(size, rng):
+    foods = load_bundled_foods()
+    index = FoodIndex()
+    for food in foods[:size]:
+        index.add(food)
+    while len(index) < size:
+        name = ' '.join(rng.sample(WORDS, rng.randint(2, 4))) + f' {rng.randint(1, 999)}'
+        index.add({'food_name': name}, rng.randint(0, 50))
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000,100000')
+    parser.add_argument('--queries', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'size':>8} {'build ms':>10} {'qps':>10} {'mean us':>9} {'p99 us':>9}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        start = time.perf_counter()
+        index = build_index(size, rng)
+        index.search('warm up')  # sorts the posting lists
+        build_ms = (time.perf_counter() - start) * 1000
+
+        timings = []
+        for i in range(args.queries):
+            query = QUERIES[i % len(QUERIES)]
+            start = time.perf_counter()
+            index.search(query)
+            timings.append(time.perf_counter() - start)
+
+        timings.sort()
+        total = sum(timings)
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        print(f"{size:>8} {build_ms:>10.1f} {len(timings) / total:>10.0f} "
+              f"{total / len(timings) * 1e6:>9.1f} {p99 * 1e6:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Benchmark a login storm against cheap authenticated reads.
+
+Runs the same workload with bcrypt hashed inline on the request thread and
+with the process-pool hasher, and reports login throughput plus the
+latency of /api/personal/profile requests made while logins are in flight.
+
+Usage:
+    python bench_login.py [--seconds 10] [--login-threads 16] [--read-threads 4] [--rounds 12]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+_db_dir = tempfile.mkdtemp(prefix='life_ledger_bench_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+from app import create_app, db
+from app.utils.password_hasher import password_hasher
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_storm(app, token, seconds, login_threads, read_threads):
+    stop = threading.Event()
+    logins = []
+    busy = []
+    read_latencies = []
+    lock = threading.Lock()
+
+    def login_worker():
+        client = app.test_client()
+        ok = rejected = 0
+        while not stop.is_set():
+            response = client.post('/api/auth/login', json={'username': 'bench', 'password': 'bench-password'})
+            if response.status_code == 200:
+                ok += 1
+            elif response.status_code == 503:
+                rejected += 1
+        with lock:
+            logins.append(ok)
+            busy.append(rejected)
+
+    def read_worker():
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        samples = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.get('/api/personal/profile', headers=headers)
+            samples.append((time.perf_counter() - start) * 1000)
+        with lock:
+            read_latencies.extend(samples)
+
+    threads = [threading.Thread(target=login_worker) for _ in range(login_threads)]
+    threads += [threading.Thread(target=read_worker) for _ in range(read_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'logins_per_sec': sum(logins) / seconds,
+        'rejected': sum(busy),
+        'reads': len(read_latencies),
+        'read_p50_ms': percentile(read_latencies, 50),
+        'read_p99_ms': percentile(read_latencies, 99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--read-threads', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    app = create_app('production')
+    app.config['BCRYPT_LOG_ROUNDS'] = args.rounds
+
+    with app.app_context():
+        db.create_all()
+        password_hasher.init_app(app)
+        client = app.test_client()
+        response = client.post('/api/auth/register', json={
+            'username': 'bench', 'email': 'bench@example.com', 'password': 'bench-password'
+        })
+        token = response.get_json()['token']
+
+    print(f"Login storm: {args.login_threads} login threads, {args.read_threads} reader threads, "
+          f"{args.seconds:.0f}s, bcrypt cost {args.rounds}\n")
+    print(f"{'mode':<16}{'logins/s':>10}{'503s':>8}{'reads':>9}{'read p50':>11}{'read p99':>11}")
+
+    for label, workers in (('inline', 0), (f'pool x{args.workers}', args.workers)):
+        app.config['PASSWORD_HASH_WORKERS'] = workers
+        password_hasher.init_app(app)
+        result = run_storm(app, token, args.seconds, args.login_threads, args.read_threads)
+        print(f"{label:<16}{result['logins_per_sec']:>10.1f}{result['rejected']:>8}{result['reads']:>9}"
+              f"{result['read_p50_ms']:>9.2f}ms{result['read_p99_ms']:>9.2f}ms")
+
+    password_hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
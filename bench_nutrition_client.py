@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Exercise NutritionAPI's upstream client against the local stub server.
+
+Scenarios:
+    healthy - sequential lookups; reports latency and connection reuse
+    slow    - upstream slower than the deadline; calls give up on time
+    flaky   - a share of requests fail; retries absorb most of them
+    outage  - every request fails; the breaker opens, calls fail fast and
+              previously cached foods are still served
+
+Usage:
+    python bench_nutrition_client.py [--requests 200]
+"""
+import argparse
+import os
+import time
+
+# Memory-only cache and a short deadline so the slow scenario is quick
+os.environ['NUTRITION_CACHE_PATH'] = ''
+os.environ.setdefault('NUTRITION_API_TIMEOUT', '0.5')
+os.environ.setdefault('NUTRITION_API_BREAKER_RESET', '2')
+
+from stub_nutrition_server import start_in_thread  # noqa: E402
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(int(len(values) * fraction) - 1, 0)] * 1000
+
+
+def timed(fn, count):
+    timings, failures = [], 0
+    for i in range(count):
+        start = time.perf_counter()
+        if not fn(i).get('success'):
+            failures += 1
+        timings.append(time.perf_counter() - start)
+    return timings, failures
+
+
+def report(name, timings, failures, api):
+    upstream = api.client.stats()
+    print(f"{name:8} n={len(timings):4} failed={failures:4} "
+          f"p50={percentile(timings, 0.5):8.2f}ms p99={percentile(timings, 0.99):8.2f}ms "
+          f"opened={upstream['connections_opened']} reused={upstream['connections_reused']} "
+          f"retries={upstream['retries']} short_circuited={upstream['short_circuited']} "
+          f"breaker={upstream['breaker_state']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_in_thread(latency=0.002)
+    os.environ['NUTRITION_API_URL'] = f'http://127.0.0.1:{server.server_port}'
+    from app.utils.nutrition_api import NutritionAPI
+
+    def fresh_api():
+        return NutritionAPI()
+
+    # Distinct queries so every call reaches the upstream
+    api = fresh_api()
+    timings, failures = timed(lambda i: api.search_food(f'healthy {i}'), args.requests)
+    report('healthy', timings, failures, api)
+
+    server.latency = 2.0
+    api = fresh_api()
+    timings, failures = timed(lambda i: api.search_food(f'slow {i}'), 3)
+    report('slow', timings, failures, api)
+
+    server.latency = 0.002
+    server.error_rate = 0.3
+    api = fresh_api()
+    timings, failures = timed(lambda i: api.search_food(f'flaky {i}'), args.requests)
+    report('flaky', timings, failures, api)
+
+    server.error_rate = 0
+    api = fresh_api()
+    api.search_food('rice')
+    # Expire the cached copy so only a stale entry remains
+    api.cache._memory['rice'] = (0, api.cache._memory['rice'][1])
+    server.error_rate = 1.0
+    timings, failures = timed(lambda i: api.search_food(f'outage {i}'), args.requests)
+    report('outage', timings, failures, api)
+    stale = api.search_food('rice')
+    print(f"stale 'rice' during outage: success={stale.get('success')} results={len(stale.get('results', []))}")
+
+    server.error_rate = 0
+    time.sleep(api.client.breaker.reset_timeout)
+    recovered = api.search_food('recovered')
+    print(f"after reset timeout: success={recovered.get('success')} breaker={api.client.breaker.state}")
+    print(f"stub received {server.requests} request(s)")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
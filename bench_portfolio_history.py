@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Benchmark: portfolio valuation history over a multi-year daily range.
+
+Seeds one user with --holdings lots over --symbols symbols (bought across
+the range) using the fake price provider, backfills the local price
+store, then times portfolio_history for each interval.
+
+Usage:
+    python bench_portfolio_history.py [--holdings 500] [--symbols 100] [--years 5]
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from app import create_app, db
+from app.models import User, Investment
+from app.utils.ledger import migrate_investments
+from app.utils.portfolio_history import INTERVALS, portfolio_history
+from app.utils.price_refresher import backfill_bars
+
+
+def seed(user, holdings, symbol_count, start, end):
+    rng = random.Random(11)
+    symbols = [f'SYM{i:04d}.NS' for i in range(symbol_count)]
+    span = (end - start).days
+    rows = []
+    for _ in range(holdings):
+        quantity = rng.randint(1, 100)
+        price = rng.uniform(50, 2000)
+        rows.append({
+            'user_id': user.id,
+            'instrument_type': 'stock',
+            'instrument_name': 'Bench lot',
+            'symbol': rng.choice(symbols),
+            'quantity': quantity,
+            'buy_price': price,
+            'buy_date': start + timedelta(days=rng.randint(0, span)),
+            'total_invested': quantity * price
+        })
+    db.session.execute(Investment.__table__.insert(), rows)
+    migrate_investments()
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--holdings', type=int, default=500)
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        end = date.today()
+        start = end - timedelta(days=365 * args.years)
+        seed(user, args.holdings, args.symbols, start, end)
+
+        began = time.perf_counter()
+        backfill_bars()
+        print(f"{args.holdings} holdings, {args.symbols} symbols, {args.years} years")
+        print(f"  backfill bars: {(time.perf_counter() - began) * 1000:9.1f} ms")
+
+        began = time.perf_counter()
+        portfolio_history(user.id, start, end)
+        print(f"  cold (loads stored closes): {(time.perf_counter() - began) * 1000:9.1f} ms")
+
+        for interval in INTERVALS:
+            samples = []
+            for _ in range(args.repeat):
+                began = time.perf_counter()
+                history = portfolio_history(user.id, start, end, interval)
+                samples.append((time.perf_counter() - began) * 1000)
+            print(f"  {interval:>5}: {len(history['points']):5} points  median {statistics.median(samples):7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
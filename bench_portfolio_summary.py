@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Benchmark: portfolio summary latency as holdings grow.
+
+For each holding count, seeds one user with that many lots (a third of
+them quoted) and times:
+
+    python - load every Investment and sum in Python (the old route)
+    sql    - summarize_portfolio: one GROUP BY instrument_type query
+    cached - portfolio_cache.get after the first call
+
+Usage:
+    python bench_portfolio_summary.py [--sizes 100,1000,10000] [--repeat 50]
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, datetime
+
+from app import create_app, db
+from app.models import User, Investment, Quote
+from app.utils.ledger import migrate_investments
+from app.utils.portfolio_summary import portfolio_cache, summarize_portfolio
+
+TYPES = ['stock', 'mutual_fund', 'fd', 'gold', 'crypto']
+
+
+def seed(user, size):
+    rng = random.Random(size)
+    symbols = [f'SYM{i:04d}.NS' for i in range(200)]
+    db.session.execute(Quote.__table__.insert(), [
+        {'symbol': symbol, 'price': rng.uniform(50, 2000), 'as_of': date.today(), 'updated_at': datetime.utcnow()}
+        for symbol in symbols
+    ])
+    rows = []
+    for i in range(size):
+        quantity = rng.randint(1, 100)
+        price = rng.uniform(50, 2000)
+        rows.append({
+            'user_id': user.id,
+            'instrument_type': TYPES[i % len(TYPES)],
+            'instrument_name': 'Bench lot',
+            'symbol': rng.choice(symbols) if i % 3 == 0 else f'LOT{i}',
+            'quantity': quantity,
+            'buy_price': price,
+            'buy_date': date(2024, 1, 1),
+            'total_invested': quantity * price,
+            'current_price': price * 1.1,
+            'current_value': quantity * price * 1.1,
+            'last_updated': datetime(2024, 1, 1)
+        })
+    db.session.execute(Investment.__table__.insert(), rows)
+    migrate_investments()
+    db.session.commit()
+
+
+def python_summary(user_id):
+    investments = Investment.query.filter_by(user_id=user_id).all()
+    totals = {}
+    for inv in investments:
+        entry = totals.setdefault(inv.instrument_type, [0, 0, 0])
+        entry[0] += inv.total_invested
+        entry[1] += inv.market_value or inv.total_invested
+        entry[2] += 1
+    db.session.expunge_all()
+    return totals
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'holdings':>9} {'python ms':>10} {'sql ms':>8} {'cached ms':>10}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        app = create_app('testing')
+        with app.app_context():
+            db.create_all()
+            user = User(username='bench', email='bench@example.com', password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+            seed(user, size)
+
+            python_ms = timed(lambda: python_summary(user.id), max(3, args.repeat // 10))
+            sql_ms = timed(lambda: summarize_portfolio(user.id), args.repeat)
+            portfolio_cache.get(user.id)
+            cached_ms = timed(lambda: portfolio_cache.get(user.id), args.repeat)
+            portfolio_cache.clear()
+            print(f"{size:>9} {python_ms:>10.2f} {sql_ms:>8.2f} {cached_ms:>10.4f}")
+
+
+if __name__ == '__main__':
+    main()
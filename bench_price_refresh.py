@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Benchmark: per-lot price updates vs the batched quote refresher.
+
+Seeds an in-memory database with --lots investments spread over
+--symbols symbols, then prices them with a FakePriceProvider that sleeps
+--latency seconds per call (standing in for the network):
+
+    per-lot - one provider call and one row written per investment
+    batched - refresh_prices: one call per batch of symbols and one
+              quotes row written per symbol
+
+Usage:
+    python bench_price_refresh.py [--lots 5000] [--symbols 200] [--latency 0.02]
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from app import create_app, db
+from app.models import User, Investment
+from app.utils.ledger import migrate_investments
+from app.utils.price_providers import FakePriceProvider
+from app.utils.price_refresher import refresh_prices
+from app.utils.stock_prices import normalize_symbol
+
+
+def seed(lot_count, symbol_count):
+    rng = random.Random(7)
+    users = [User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash='x') for i in range(50)]
+    db.session.add_all(users)
+    db.session.flush()
+
+    symbols = [f'SYM{i:04d}.NS' for i in range(symbol_count)]
+    rows = []
+    for _ in range(lot_count):
+        quantity = rng.randint(1, 100)
+        price = rng.uniform(50, 2000)
+        rows.append({
+            'user_id': rng.choice(users).id,
+            'instrument_type': 'stock',
+            'instrument_name': 'Bench lot',
+            'symbol': rng.choice(symbols),
+            'quantity': quantity,
+            'buy_price': price,
+            'buy_date': date(2024, 1, 1) + timedelta(days=rng.randint(0, 600)),
+            'total_invested': quantity * price
+        })
+    db.session.execute(Investment.__table__.insert(), rows)
+    migrate_investments()
+    db.session.commit()
+
+
+def per_lot(provider):
+    for investment in Investment.query.all():
+        prices = provider.latest_prices([normalize_symbol(investment.symbol)])
+        _, price = prices[normalize_symbol(investment.symbol)]
+        investment.current_price = price
+        investment.current_value = investment.quantity * price
+    db.session.commit()
+
+
+def snapshot():
+    return {investment.id: investment.market_value for investment in Investment.query.all()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lots', type=int, default=5000)
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds per provider call')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed(args.lots, args.symbols)
+
+        provider = FakePriceProvider(latency=args.latency)
+        start = time.perf_counter()
+        per_lot(provider)
+        per_lot_s = time.perf_counter() - start
+        per_lot_calls = provider.calls
+        expected = snapshot()
+
+        db.session.execute(Investment.__table__.update().values(current_price=None, current_value=None))
+        db.session.commit()
+
+        provider = FakePriceProvider(latency=args.latency)
+        start = time.perf_counter()
+        result = refresh_prices(provider)
+        batched_s = time.perf_counter() - start
+        db.session.expire_all()
+
+        print(f"{args.lots} lots over {args.symbols} symbols, {args.latency * 1000:.0f} ms per provider call")
+        print(f"  per-lot: {per_lot_s:8.2f} s  {per_lot_calls:6} provider calls  {args.lots:6} rows written")
+        print(f"  batched: {batched_s:8.2f} s  {provider.calls:6} provider calls  {result['updated']:6} rows written")
+        print(f"  speedup: {per_lot_s / batched_s:.1f}x")
+        print(f"  values match: {snapshot() == expected}")
+
+
+if __name__ == '__main__':
+    main()
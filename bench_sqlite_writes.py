@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""
+Benchmark: write throughput with concurrent writers on a SQLite file.
+
+Seeds a fresh database file per profile, then runs --processes x --threads
+writers, each with its own test client, alternating
+POST /api/personal/habits/<id>/log and POST /api/personal/diet:
+
+    default     driver defaults (rollback journal, synchronous=FULL,
+                no write serialization, no busy retries)
+    wal         ProductionConfig pragmas and pool, without serialization
+    production  ProductionConfig as shipped (pragmas, pool, serialized
+                writes, SQLITE_BUSY retries)
+
+Reports successful writes per second, failed requests (500/503, mostly
+"database is locked") and write latency percentiles.
+
+Usage:
+    python bench_sqlite_writes.py [--threads 16] [--processes 1] [--writes 100]
+"""
+import argparse
+import datetime
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+import jwt
+
+from app import create_app, db
+from app.models import User, Habit
+from config import Config, ProductionConfig, TestingConfig, config
+
+PROFILES = {
+    'default': {'SQLITE_PRAGMAS': {}, 'SQLITE_SERIALIZE_WRITES': False, 'SQLITE_BUSY_RETRIES': 0,
+                'SQLALCHEMY_ENGINE_OPTIONS': {}},
+    'wal': {'SQLITE_PRAGMAS': ProductionConfig.SQLITE_PRAGMAS, 'SQLITE_SERIALIZE_WRITES': False,
+            'SQLITE_BUSY_RETRIES': ProductionConfig.SQLITE_BUSY_RETRIES,
+            'SQLALCHEMY_ENGINE_OPTIONS': ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS},
+    'production': {'SQLITE_PRAGMAS': ProductionConfig.SQLITE_PRAGMAS,
+                   'SQLITE_SERIALIZE_WRITES': ProductionConfig.SQLITE_SERIALIZE_WRITES,
+                   'SQLITE_BUSY_RETRIES': ProductionConfig.SQLITE_BUSY_RETRIES,
+                   'SQLALCHEMY_ENGINE_OPTIONS': ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS},
+}
+
+
+def make_app(profile, path):
+    name = f'bench-{profile}'
+    config[name] = type(f'Bench{profile.title()}Config', (TestingConfig,), dict(
+        PROFILES[profile], SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', METRICS_ENABLED=False
+    ))
+    return create_app(name)
+
+
+def seed(app, writers):
+    """One user and habit per writer; returns [(auth headers, habit id)]."""
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f'writer{i}', email=f'writer{i}@example.com', password_hash='x') for i in range(writers)]
+        db.session.add_all(users)
+        db.session.flush()
+        habits = [Habit(user_id=user.id, name='Bench habit', frequency='daily', target_count=1) for user in users]
+        db.session.add_all(habits)
+        db.session.commit()
+
+        now = datetime.datetime.utcnow()
+        return [
+            ({'Authorization': 'Bearer ' + jwt.encode(
+                {'user_id': user.id, 'iat': now, 'exp': now + datetime.timedelta(days=1)},
+                Config.SECRET_KEY, algorithm='HS256'
+            )}, habit.id)
+            for user, habit in zip(users, habits)
+        ]
+
+
+def write_loop(app, headers, habit_id, writes, results):
+    client = app.test_client()
+    samples, failures = [], 0
+    for i in range(writes):
+        start = time.perf_counter()
+        if i % 2:
+            response = client.post('/api/personal/diet', headers=headers, json={
+                'food_item': 'Bench meal', 'meal_type': 'lunch', 'calories': 400,
+                'protein': 20, 'carbs': 50, 'fats': 10
+            })
+        else:
+            response = client.post(f'/api/personal/habits/{habit_id}/log', headers=headers, json={'notes': 'bench'})
+        samples.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            failures += 1
+    results.append((samples, failures))
+
+
+def run_process(profile, path, writers, writes, queue=None):
+    """Run one thread per writer against a fresh app; returns [(samples, failures)]."""
+    app = make_app(profile, path)
+    results = []
+    threads = [threading.Thread(target=write_loop, args=(app, headers, habit_id, writes, results))
+               for headers, habit_id in writers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if queue is None:
+        return results
+    queue.put(results)
+
+
+def bench(profile, threads, processes, writes):
+    directory = tempfile.mkdtemp(prefix='bench_sqlite_')
+    path = os.path.join(directory, 'bench.db')
+    try:
+        writers = seed(make_app(profile, path), threads * processes)
+        groups = [writers[i * threads:(i + 1) * threads] for i in range(processes)]
+
+        start = time.perf_counter()
+        if processes == 1:
+            results = run_process(profile, path, groups[0], writes)
+        else:
+            context = multiprocessing.get_context('fork')
+            queue = context.Queue()
+            children = [context.Process(target=run_process, args=(profile, path, group, writes, queue)) for group in groups]
+            for child in children:
+                child.start()
+            results = [result for _ in children for result in queue.get()]
+            for child in children:
+                child.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    samples = sorted(sample for batch, _ in results for sample in batch)
+    failures = sum(failed for _, failed in results)
+    return {
+        'writes_per_second': (len(samples) - failures) / elapsed,
+        'failures': failures,
+        'p50_ms': statistics.median(samples),
+        'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16, help='Writer threads per process')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--writes', type=int, default=100, help='Requests per writer')
+    parser.add_argument('--profiles', default='default,wal,production')
+    args = parser.parse_args()
+
+    print(f"{args.processes} process(es) x {args.threads} writers x {args.writes} writes")
+    print(f"{'profile':<11} {'writes/s':>9} {'failed':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for profile in args.profiles.split(','):
+        result = bench(profile, args.threads, args.processes, args.writes)
+        print(f"{profile:<11} {result['writes_per_second']:>9.0f} {result['failures']:>7} "
+              f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
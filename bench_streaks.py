@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark: calculate_streak vs the grouped streak engine.
+
+Seeds an in-memory database with one user whose habits each have
+--logs completed logs, then times:
+    helper - load every HabitLog per habit and call calculate_streak
+    engine - compute_user_streaks (one GROUP BY query + linear pass)
+
+Usage:
+    python bench_streaks.py [--habits 10] [--logs 10000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import create_app, db
+from app.models import User, Habit, HabitLog
+from app.utils.helpers import calculate_streak
+from app.utils.streak_engine import compute_user_streaks
+
+
+def seed(habit_count, logs_per_habit):
+    user = User(username='bench', email='bench@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+
+    habits = [Habit(user_id=user.id, name=f'Habit {i}', frequency='daily', target_count=1) for i in range(habit_count)]
+    db.session.add_all(habits)
+    db.session.flush()
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    rows = []
+    for habit in habits:
+        for _ in range(logs_per_habit):
+            rows.append({
+                'habit_id': habit.id,
+                'completed_at': now - timedelta(days=rng.randint(0, logs_per_habit), hours=rng.randint(0, 23)),
+                'notes': '',
+                'status': 'completed' if rng.random() < 0.9 else 'failed'
+            })
+    db.session.execute(HabitLog.__table__.insert(), rows)
+    db.session.commit()
+    return user, habits
+
+
+def best_of(repeat, fn):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--habits', type=int, default=10)
+    parser.add_argument('--logs', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        user, habits = seed(args.habits, args.logs)
+
+        def helper():
+            db.session.expire_all()
+            return {
+                habit.id: calculate_streak(
+                    HabitLog.query.filter_by(habit_id=habit.id).order_by(HabitLog.completed_at.desc()).all()
+                )
+                for habit in habits
+            }
+
+        def engine():
+            return compute_user_streaks(user.id, habits)
+
+        helper_ms, helper_result = best_of(args.repeat, helper)
+        engine_ms, engine_result = best_of(args.repeat, engine)
+
+        print(f"{args.habits} habits x {args.logs} logs (best of {args.repeat})")
+        print(f"  helper (load logs + calculate_streak): {helper_ms:9.1f} ms")
+        print(f"  engine (GROUP BY + linear pass):       {engine_ms:9.1f} ms")
+        print(f"  speedup: {helper_ms / engine_ms:.1f}x")
+        print(f"  results match: {helper_result == engine_result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Benchmark: batched XIRR solver vs one-series-at-a-time Newton.
+
+Generates --series random cash-flow series (monthly-ish contributions over
+a few years, then a terminal value) and solves them with:
+
+    scalar  - plain Python Newton with bisection fallback, per series
+    batched - app.utils.returns.xirr over padded (series x flows) arrays
+
+Usage:
+    python bench_xirr.py [--series 10000] [--max-flows 36]
+"""
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+from app.utils.returns import DAYS_PER_YEAR, LOG_RATE_BOUND, xirr
+
+
+def make_series(count, max_flows, seed=5):
+    rng = random.Random(seed)
+    series = []
+    for _ in range(count):
+        flows = rng.randint(1, max_flows)
+        day = 738000
+        cash = []
+        invested = 0
+        for _ in range(flows):
+            amount = rng.uniform(100, 10000)
+            cash.append((day, -amount))
+            invested += amount
+            day += rng.randint(7, 60)
+        growth = rng.uniform(0.5, 2.5)
+        cash.append((day + rng.randint(30, 720), invested * growth))
+        series.append(cash)
+    return series
+
+
+def scalar_xirr(cash, tol=1e-9, max_iter=100):
+    origin = cash[0][0]
+    flows = [((day - origin) / DAYS_PER_YEAR, amount) for day, amount in cash]
+
+    def npv(x):
+        total = slope = 0.0
+        for years, amount in flows:
+            discounted = amount * math.exp(-years * x)
+            total += discounted
+            slope -= years * discounted
+        return total, slope
+
+    lo, hi = -LOG_RATE_BOUND, LOG_RATE_BOUND
+    f_lo = npv(lo)[0]
+    if f_lo * npv(hi)[0] >= 0:
+        return float('nan')
+    x = 0.0
+    for _ in range(max_iter):
+        f, df = npv(x)
+        if f == 0:
+            break
+        if (f > 0) == (f_lo > 0):
+            lo, f_lo = x, f
+        else:
+            hi = x
+        step = x - f / df if df else float('nan')
+        nxt = step if lo < step < hi else (lo + hi) / 2
+        if abs(nxt - x) < tol or hi - lo < tol:
+            x = nxt
+            break
+        x = nxt
+    return math.expm1(x)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--series', type=int, default=10000)
+    parser.add_argument('--max-flows', type=int, default=36)
+    args = parser.parse_args()
+
+    series = make_series(args.series, args.max_flows)
+    width = max(len(cash) for cash in series)
+    amounts = np.zeros((len(series), width))
+    days = np.zeros((len(series), width))
+    for row, cash in enumerate(series):
+        for column, (day, amount) in enumerate(cash):
+            amounts[row, column] = amount
+            days[row, column] = day
+
+    start = time.perf_counter()
+    expected = np.array([scalar_xirr(cash) for cash in series])
+    scalar_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rates = xirr(amounts, days)
+    batched_s = time.perf_counter() - start
+
+    print(f"{args.series} series, up to {width} flows each")
+    print(f"  scalar:  {scalar_s * 1000:9.1f} ms")
+    print(f"  batched: {batched_s * 1000:9.1f} ms  ({scalar_s / batched_s:.1f}x)")
+    print(f"  max abs difference: {np.nanmax(np.abs(rates - expected)):.2e}  unsolved: {int(np.isnan(rates).sum())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Check that the hot per-user time-series queries use their indexes.
+
+Seeds a small in-memory database, calls each endpoint through the test
+client while recording the SELECTs it runs, and asks SQLite for the
+EXPLAIN QUERY PLAN of each one. An endpoint fails if any plan scans a
+time-series table (SCAN habit_logs, SCAN diet_entries, ...) or if the
+index it is expected to use never appears.
+
+Usage:
+    python check_query_plans.py             # exit status 1 on any failure
+    python check_query_plans.py --verbose   # also print every plan
+"""
+import argparse
+import datetime
+import re
+import sys
+from argparse import Namespace
+
+import jwt
+from sqlalchemy import event
+
+from app import create_app, db
+from bench_endpoints import seed
+from config import Config
+
+TIME_SERIES_TABLES = ('habits', 'habit_logs', 'diet_entries', 'investments', 'investment_transactions')
+FULL_SCAN = re.compile(r'\bSCAN (%s)\b' % '|'.join(TIME_SERIES_TABLES))
+
+
+def checks(habit_id, today):
+    """(method, path, indexes that must appear in the plans) per hot query path."""
+    day = today.isoformat()
+    return [
+        ('GET', '/api/personal/habits', ['ix_habits_user_created']),
+        ('GET', '/api/personal/habits?streaks=true', ['ix_habits_user_created', 'ix_habit_logs_habit_completed']),
+        ('GET', f'/api/personal/habits/{habit_id}', ['ix_habit_logs_habit_completed']),
+        ('GET', f'/api/personal/habits/calendar?year={today.year}&month={today.month}', ['ix_habit_logs_habit_completed']),
+        ('POST', f'/api/personal/habits/{habit_id}/log', ['ix_habit_logs_habit_completed']),
+        ('GET', f'/api/personal/diet?date={day}', ['ix_diet_entries_user_consumed']),
+        ('GET', f'/api/personal/diet/summary?date={day}', []),
+        ('GET', '/api/personal/diet/summary/range', []),
+        ('GET', f'/api/personal/dashboard?date={day}', ['ix_habit_logs_habit_completed', 'ix_diet_entries_user_consumed']),
+        ('GET', '/api/finance/investments', ['ix_investments_user_buy_date']),
+        ('GET', '/api/finance/transactions', ['ix_investment_transactions_user_date']),
+        ('GET', '/api/finance/portfolio/history?interval=month', ['ix_investment_transactions_user_date']),
+        ('GET', '/api/finance/portfolio/returns', ['ix_investment_transactions_user_date']),
+    ]
+
+
+def query_plans(connection, statements):
+    """EXPLAIN QUERY PLAN detail lines for each recorded SELECT."""
+    plans = []
+    for statement, parameters in statements:
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+        plans.append((statement, [row[-1] for row in rows]))
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        users = seed(Namespace(users=2, habits=3, years=1, meals=3, investments=10, seed=1))
+        user_id, habit_ids = users[0]
+        now = datetime.datetime.utcnow()
+        token = jwt.encode({'user_id': user_id, 'iat': now, 'exp': now + datetime.timedelta(days=1)},
+                           Config.SECRET_KEY, algorithm='HS256')
+        headers = {'Authorization': f'Bearer {token}'}
+
+        recorded = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(('SELECT', 'WITH')) and not executemany:
+                recorded.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        client = app.test_client()
+        failures = 0
+        for method, path, expected in checks(habit_ids[0], datetime.date.today()):
+            recorded.clear()
+            response = client.open(path, method=method, json={} if method == 'POST' else None, headers=headers)
+            statements = list(recorded)
+            with db.engine.connect() as connection:
+                plans = query_plans(connection, statements)
+
+            problems = []
+            if response.status_code >= 400:
+                problems.append(f'status {response.status_code}')
+            details = [line for _, lines in plans for line in lines]
+            problems += [f'full scan: {line}' for line in details if FULL_SCAN.search(line)]
+            problems += [f'{name} not used' for name in expected if not any(name in line for line in details)]
+
+            status = 'FAIL' if problems else 'ok'
+            print(f"{status:<5} {method:<4} {path} ({len(statements)} queries)")
+            for problem in problems:
+                print(f"        {problem}")
+            if args.verbose:
+                for statement, lines in plans:
+                    print(f"        {' '.join(statement.split())[:100]}")
+                    for line in lines:
+                        print(f"          {line}")
+            failures += bool(problems)
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    print(f"\n{failures} endpoint(s) with query plan problems")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
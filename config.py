@@ -17,6 +17,47 @@ class Config:
     # Pagination
     ITEMS_PER_PAGE = 20
 
+    # Authenticated-user cache used by token_required
+    PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 1024))
+    PRINCIPAL_CACHE_TTL = int(os.environ.get('PRINCIPAL_CACHE_TTL', 300))  # seconds
+
+    # Password hashing (bcrypt work factor and worker pool)
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))  # 0 = hash inline
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 32))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2.0))  # seconds
+
+    # Stock price cache for /api/finance/stock/price
+    PRICE_CACHE_SIZE = int(os.environ.get('PRICE_CACHE_SIZE', 20000))
+    PRICE_CACHE_LIVE_TTL = int(os.environ.get('PRICE_CACHE_LIVE_TTL', 60))  # seconds, while the market is open
+
+    # Market data provider ('yahoo' or 'fake') and its call budget
+    PRICE_PROVIDER = os.environ.get('PRICE_PROVIDER', 'yahoo')
+    # Per process: each web worker and refresh_prices.py has its own budget, so
+    # the upstream can see up to (processes x this) calls per minute
+    PRICE_PROVIDER_CALLS_PER_MINUTE = int(os.environ.get('PRICE_PROVIDER_CALLS_PER_MINUTE', 30))
+    PRICE_REFRESH_INTERVAL = int(os.environ.get('PRICE_REFRESH_INTERVAL', 300))  # seconds between refresh_prices.py --loop runs
+
+    # Per-user cache for /api/finance/portfolio/summary
+    PORTFOLIO_CACHE_SIZE = int(os.environ.get('PORTFOLIO_CACHE_SIZE', 4096))  # 0 = no caching
+    PORTFOLIO_CACHE_TTL = int(os.environ.get('PORTFOLIO_CACHE_TTL', 300))  # seconds
+    PORTFOLIO_CACHE_QUOTES_CHECK = int(os.environ.get('PORTFOLIO_CACHE_QUOTES_CHECK', 5))  # seconds between checks for quotes refreshed elsewhere
+
+    # SQLite connection profile (app/utils/sqlite_profile.py); ignored for other databases
+    SQLITE_PRAGMAS = {}  # applied to every new connection
+    SQLITE_SERIALIZE_WRITES = False  # queue this process's writers on a lock
+    SQLITE_BUSY_RETRIES = 0  # re-runs of a @retry_on_busy view that hit "database is locked"
+
+    # Read-only bind for GET requests (app/utils/read_routing.py)
+    READ_REPLICA_URL = os.environ.get('READ_REPLICA_URL')  # e.g. a Postgres streaming replica
+    READ_SNAPSHOT_INTERVAL = int(os.environ.get('READ_SNAPSHOT_INTERVAL', 0))  # seconds; SQLite snapshots, 0 = off
+    READ_SNAPSHOT_DIR = os.environ.get('READ_SNAPSHOT_DIR')  # defaults to the system temp directory
+    READ_STICKY_SECONDS = float(os.environ.get('READ_STICKY_SECONDS', 5))  # replica lag allowed for after a user's write
+
+    # Prometheus metrics on /metrics (request latency, SQL and outbound call timing)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'  # opt in; /metrics shows route and SQL timings
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # if set, scrapers must send Authorization: Bearer <token>
+
     # Flask-Mail settings (update these for your SMTP provider)
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
@@ -36,12 +77,33 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     """Production configuration."""
     DEBUG = False
+    
+    # WAL lets readers run alongside the writer; synchronous=NORMAL skips the
+    # per-commit fsync (a power loss can drop the last commits, never corrupt)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # ms
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # bytes
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 64000)),  # negative = KiB
+        'temp_store': 'MEMORY'
+    }
+    SQLITE_SERIALIZE_WRITES = True
+    SQLITE_BUSY_RETRIES = int(os.environ.get('SQLITE_BUSY_RETRIES', 3))
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_POOL_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds
+    }
 
 
 class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    BCRYPT_LOG_ROUNDS = 4
+    PASSWORD_HASH_WORKERS = 0
+    PRICE_PROVIDER = 'fake'
 
 
 config = {
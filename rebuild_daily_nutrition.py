@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Rebuild or verify the daily_nutrition rollup from diet_entries.
+
+Usage:
+    python rebuild_daily_nutrition.py                  # rebuild for every user
+    python rebuild_daily_nutrition.py --user 3         # rebuild one user
+    python rebuild_daily_nutrition.py --check          # report drift without writing
+"""
+import argparse
+import sys
+
+from app import create_app, db
+from app.utils.diet_totals import rebuild_rollup, verify_rollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild or verify the daily_nutrition rollup.')
+    parser.add_argument('--user', type=int, help='Only process this user id')
+    parser.add_argument('--check', action='store_true', help='Compare the rollup with diet_entries')
+    args = parser.parse_args()
+
+    app = create_app('development')
+    with app.app_context():
+        # Creates daily_nutrition on databases that predate it
+        db.create_all()
+
+        if args.check:
+            mismatches = verify_rollup(args.user)
+            for user_id, day, have, want in mismatches:
+                print(f"  MISMATCH user {user_id} on {day}: rollup={have} entries={want}")
+            print(f"Checked rollup, {len(mismatches)} mismatch(es)")
+            return 1 if mismatches else 0
+
+        count = rebuild_rollup(args.user)
+        db.session.commit()
+        print(f"Rebuilt {count} daily_nutrition row(s)")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""
+Rebuild the local food catalog used for diet autocomplete.
+
+Merges the bundled dataset (app/data/foods.json), results cached from the
+nutrition API and foods users have logged in diet_entries.
+
+Usage:
+    python rebuild_food_catalog.py              # rebuild the catalog
+    python rebuild_food_catalog.py --no-api     # skip cached API results
+"""
+import argparse
+
+from app import create_app, db
+from app.utils.food_catalog import rebuild_catalog
+from app.utils.nutrition_api import nutrition_api
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the local food catalog.')
+    parser.add_argument('--no-api', action='store_true', help='Ignore results cached from the nutrition API')
+    args = parser.parse_args()
+
+    app = create_app('development')
+    with app.app_context():
+        # Creates food_catalog on databases that predate it
+        db.create_all()
+
+        api_results = () if args.no_api else nutrition_api.cache.cached_results()
+        counts = rebuild_catalog(api_results)
+        db.session.commit()
+        print(f"Rebuilt food catalog with {sum(counts.values())} food(s): "
+              f"{counts['bundled']} bundled, {counts['api']} from the API, {counts['history']} from diet history")
+
+
+if __name__ == '__main__':
+    main()
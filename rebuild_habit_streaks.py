@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Rebuild or verify the persisted habit streak state.
+
+Usage:
+    python rebuild_habit_streaks.py            # rebuild state for every habit
+    python rebuild_habit_streaks.py --check    # compare state with calculate_streak
+"""
+import sys
+
+from app import create_app, db
+from app.models import Habit
+from app.utils.streak_state import rebuild_streak_state, check_streak_state
+
+
+def rebuild_all():
+    """Recompute streak runs and summaries for every habit."""
+    habit_ids = [row.id for row in db.session.query(Habit.id).all()]
+    for index, habit_id in enumerate(habit_ids, start=1):
+        rebuild_streak_state(habit_id)
+        if index % 500 == 0:
+            db.session.commit()
+            print(f"  rebuilt {index}/{len(habit_ids)} habits")
+    db.session.commit()
+    print(f"Rebuilt streak state for {len(habit_ids)} habits")
+
+
+def check_all():
+    """Report habits whose persisted streak differs from a full recomputation."""
+    mismatches = 0
+    habits = db.session.query(Habit.id, Habit.name).all()
+    for habit_id, name in habits:
+        matches, persisted, recomputed = check_streak_state(habit_id)
+        if not matches:
+            mismatches += 1
+            print(f"  MISMATCH habit {habit_id} ({name}): state={persisted} logs={recomputed}")
+    # check_streak_state builds missing state on demand
+    db.session.commit()
+    print(f"Checked {len(habits)} habits, {mismatches} mismatch(es)")
+    return mismatches
+
+
+if __name__ == '__main__':
+    app = create_app('development')
+    with app.app_context():
+        # Creates habit_streaks / habit_streak_runs on databases that predate them
+        db.create_all()
+        if '--check' in sys.argv:
+            sys.exit(1 if check_all() else 0)
+        rebuild_all()
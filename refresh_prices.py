@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Refresh current prices for every held symbol.
+
+This is the only place prices are refreshed and held symbols' daily bars
+are backfilled. Run one instance (from cron, or with --loop under a
+process supervisor) however many web workers serve the app.
+
+Usage:
+    python refresh_prices.py                       # one refresh
+    python refresh_prices.py --loop                # every PRICE_REFRESH_INTERVAL seconds
+    python refresh_prices.py --loop --interval 300 # keep refreshing
+    python refresh_prices.py --provider fake       # offline prices
+    python refresh_prices.py --config production   # production profile (or set FLASK_ENV)
+"""
+import argparse
+import os
+import time
+
+from app import create_app, db
+from app.utils.price_providers import make_provider
+from app.utils.price_refresher import price_refresher
+from app.utils.stock_prices import stock_prices
+from config import config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh investment prices.')
+    parser.add_argument('--provider', help='Price provider (defaults to PRICE_PROVIDER)')
+    parser.add_argument('--loop', action='store_true', help='Keep refreshing until interrupted')
+    parser.add_argument('--interval', type=int, help='Seconds between refreshes with --loop (defaults to PRICE_REFRESH_INTERVAL)')
+    parser.add_argument('--config', default=os.getenv('FLASK_ENV', 'development'), choices=sorted(config),
+                        help='App configuration, as for run.py (defaults to FLASK_ENV, else development)')
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    interval = args.interval or app.config['PRICE_REFRESH_INTERVAL']
+    with app.app_context():
+        if args.provider:
+            stock_prices.provider = make_provider(args.provider, app.config['PRICE_PROVIDER_CALLS_PER_MINUTE'])
+
+        while True:
+            if price_refresher.due():
+                started = time.perf_counter()
+                previous_backfill = price_refresher.last_backfill
+                result = price_refresher.run_once()
+                if result:
+                    print(f"Refreshed {result['updated']}/{result['symbols']} symbol(s) in {result['batches']} batch(es), "
+                          f"{result['failed']} failed ({time.perf_counter() - started:.1f}s)")
+                backfill = price_refresher.last_backfill
+                if backfill is not previous_backfill:
+                    print(f"Backfilled bars for {backfill['symbols'] - backfill['failed']}/{backfill['symbols']} symbol(s), "
+                          f"{backfill['downloaded']} new bar(s)")
+                db.session.remove()
+            if not args.loop:
+                break
+            time.sleep(interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the BonAppetee search API.
+
+Answers GET /search?value=<food> in the upstream's response shape, with
+configurable latency and error injection, so NutritionAPI's client can be
+exercised without RapidAPI.
+
+Usage:
+    python stub_nutrition_server.py [--port 8089] [--latency 0.05] [--error-rate 0.2]
+
+Then point the app at it:
+    NUTRITION_API_URL=http://127.0.0.1:8089 python run.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves canned search results; keep-alive like the real upstream."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(server.error_status, {'message': 'injected error'})
+            return
+
+        url = urlsplit(self.path)
+        if url.path != '/search':
+            self._send(404, {'message': 'not found'})
+            return
+
+        query = parse_qs(url.query).get('value', [''])[0]
+        items = [
+            {
+                'food_id': index,
+                'food_unique_id': f'stub-{index}',
+                'food_name': f'{query.title()} {variant}'.strip(),
+                'basic_unit_measure': 100,
+                'nutrients': {'calories': 120 + index * 10, 'protein': 4.0, 'carbs': 20.0, 'fats': 3.0}
+            }
+            for index, variant in enumerate(('', 'Salad', 'Curry'))
+        ] if query else []
+        self._send(200, {'items': items, 'results': len(items), 'page': 1, 'pages': 1})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that hit their deadline hang up mid-response; that's expected
+        pass
+
+
+def make_server(port=0, latency=0.0, error_rate=0.0, error_status=503):
+    """
+    Create a stub server on 127.0.0.1 (port 0 picks a free port).
+
+    latency, error_rate and error_status are attributes of the returned
+    server and can be changed while it runs.
+    """
+    server = StubServer(('127.0.0.1', port), StubHandler)
+    server.latency = latency
+    server.error_rate = error_rate
+    server.error_status = error_status
+    server.requests = 0
+    server.lock = threading.Lock()
+    return server
+
+
+def start_in_thread(**options):
+    """Start a stub server on a background thread and return it."""
+    server = make_server(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub BonAppetee search API.')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.latency, args.error_rate, args.error_status)
+    print(f"Stub nutrition API on http://127.0.0.1:{server.server_port} "
+          f"(latency {args.latency}s, error rate {args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
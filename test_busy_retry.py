@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Test that write views marked @retry_on_busy are re-run after SQLITE_BUSY.
+
+Forces one "database is locked" error on the first ledger insert of a
+POST /api/finance/transactions and checks the view runs again and succeeds.
+
+Usage:
+    python test_busy_retry.py
+"""
+import datetime
+import sqlite3
+import sys
+
+import jwt
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from app.models import User
+from app.utils.sqlite_profile import sqlite_profile
+from config import Config, TestingConfig, config
+
+
+class BusyRetryConfig(TestingConfig):
+    SQLITE_BUSY_RETRIES = 3
+    SQLITE_BUSY_BACKOFF = 0.001
+
+
+def test_transaction_retried_after_busy():
+    config['busy_retry'] = BusyRetryConfig
+    app = create_app('busy_retry')
+    with app.app_context():
+        db.create_all()
+        user = User(username='busy', email='busy@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        now = datetime.datetime.utcnow()
+        token = jwt.encode({'user_id': user.id, 'iat': now, 'exp': now + datetime.timedelta(days=1)},
+                           Config.SECRET_KEY, algorithm='HS256')
+
+        attempts = []
+
+        def lock_first_insert(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO investment_transactions'):
+                attempts.append(statement)
+                if len(attempts) == 1:
+                    raise OperationalError(statement, parameters, sqlite3.OperationalError('database is locked'))
+
+        event.listen(db.engine, 'before_cursor_execute', lock_first_insert)
+        try:
+            retries_before = sqlite_profile.stats()['busy_retries']
+            response = app.test_client().post('/api/finance/transactions', headers={'Authorization': f'Bearer {token}'}, json={
+                'instrument_type': 'stock', 'symbol': 'TCS', 'kind': 'buy',
+                'trade_date': '2025-01-02', 'quantity': 1, 'price': 100
+            })
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', lock_first_insert)
+
+        assert response.status_code == 201, (response.status_code, response.get_data(as_text=True))
+        assert len(attempts) == 2, f'expected 2 attempts, got {len(attempts)}'
+        assert sqlite_profile.stats()['busy_retries'] == retries_before + 1
+
+
+if __name__ == '__main__':
+    try:
+        test_transaction_retried_after_busy()
+    except AssertionError as e:
+        print(f"✗ Busy retry failed: {e}")
+        sys.exit(1)
+    print("✓ POST /api/finance/transactions was retried after SQLITE_BUSY")